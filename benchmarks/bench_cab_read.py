@@ -0,0 +1,99 @@
+"""
+benchmark reading compressed vs uncompressed transaction entries
+
+Publishes a synthetic PDB file twice, once uncompressed and once
+compressed, and reports the throughput of reading the entry's data
+with TransactionEntry.open(). The compressed entry is also read from a
+LZX compressed cabinet, with the same contents.
+
+Run from the repository root with:
+
+    $ python -m benchmarks.bench_cab_read [FILE_SIZE_MB]
+"""
+import sys
+import time
+import shutil
+import tempfile
+from os import path
+import symstore
+from symstore import lzx
+from symstore import cab
+from symstore import cabfile
+from tests import synth
+from benchmarks.bench_compress_pool import _payload
+
+DEFAULT_FILE_SIZE_MB = 16
+
+# read chunk size
+CHUNK_SIZE = 64 * 1024
+
+
+def _read(open_func):
+    start = time.perf_counter()
+    size = 0
+    with open_func() as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            size += len(chunk)
+
+    return size, time.perf_counter() - start
+
+
+def _publish(store_dir, pdb_path, compress):
+    store = symstore.Store(store_dir)
+    transaction = store.new_transaction("bench", "1.0", "")
+    transaction.add_entry(transaction.new_entry(pdb_path, compress))
+    store.commit(transaction)
+
+    return transaction.entries[0]
+
+
+def _lzx_cab(data, cab_path):
+    frames = synth.lzx_compress(data, 21, lzx.BLOCKTYPE_VERBATIM)
+    sizes = [min(cabfile.BLOCK_SIZE, len(data) - i)
+             for i in range(0, len(data), cabfile.BLOCK_SIZE)]
+
+    with open(cab_path, "wb") as f:
+        f.write(synth.cab_file("bench.pdb", len(data),
+                               list(zip(frames, sizes)),
+                               cabfile.COMPRESS_LZX | (21 << 8)))
+
+
+def main():
+    file_size_mb = DEFAULT_FILE_SIZE_MB
+    if len(sys.argv) > 1:
+        file_size_mb = int(sys.argv[1])
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        pdb_path = path.join(temp_dir, "bench.pdb")
+        streams = [b"", synth.pdb_stream(0, 0, 0, b"\0" * 8, age=1), b"",
+                   synth.dbi_stream(1),
+                   _payload(file_size_mb * 1024 * 1024, 0)]
+        data = synth.msf_file(streams)
+        with open(pdb_path, "wb") as f:
+            f.write(data)
+
+        readers = [("uncompressed",
+                    _publish(path.join(temp_dir, "plain"),
+                             pdb_path, False).open)]
+
+        if cab.compress is not None:
+            entry = _publish(path.join(temp_dir, "compressed"),
+                             pdb_path, True)
+            readers.append(("MSZIP", entry.open))
+
+        lzx_path = path.join(temp_dir, "bench.pd_")
+        _lzx_cab(data, lzx_path)
+        readers.append(("LZX", lambda: cabfile.open_cab(lzx_path)))
+
+        for name, open_func in readers:
+            size, elapsed = _read(open_func)
+            mb = size / (1024 * 1024)
+            print("%-13s %.2fs  %.1f MiB/s" %
+                  (name + ":", elapsed, mb / elapsed))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
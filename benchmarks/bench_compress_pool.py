@@ -0,0 +1,104 @@
+"""
+benchmark compressing files in thread pool vs process pool
+
+Publishes a transaction with many large synthetic PDB files with
+compression enabled, once compressing in the publishing threads and
+once compressing in a pool of worker processes, and reports the
+throughput of both.
+
+Run from the repository root with:
+
+    $ python -m benchmarks.bench_compress_pool [NUM_FILES [FILE_SIZE_MB]]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from os import path
+import symstore
+from symstore import cab
+from tests import synth
+
+DEFAULT_NUM_FILES = 16
+DEFAULT_FILE_SIZE_MB = 32
+
+
+def _payload(size, seed):
+    """
+    generate moderately compressible data, similar to debug information
+    """
+    rnd = random.Random(seed)
+    words = [bytes(rnd.getrandbits(8) for _ in range(rnd.randint(4, 16)))
+             for _ in range(512)]
+
+    chunks = []
+    total = 0
+    while total < size:
+        chunk = b"".join(rnd.choice(words) for _ in range(256))
+        chunks.append(chunk)
+        total += len(chunk)
+
+    return b"".join(chunks)[:size]
+
+
+def _make_pdbs(dir_path, num_files, file_size):
+    files = []
+    for i in range(num_files):
+        guid = (i, 0, 0, b"\0" * 8)
+        streams = [b"", synth.pdb_stream(*guid, age=1), b"",
+                   synth.dbi_stream(1), _payload(file_size, i)]
+
+        file_path = path.join(dir_path, "bench%d.pdb" % i)
+        with open(file_path, "wb") as f:
+            f.write(synth.msf_file(streams))
+
+        files.append(file_path)
+
+    return files
+
+
+def _publish(files, options):
+    store_dir = tempfile.mkdtemp()
+    try:
+        store = symstore.Store(store_dir)
+        start = time.perf_counter()
+        store.add_files(files, "bench", "1.0", "", compress=True,
+                        options=options)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(store_dir)
+
+
+def main():
+    num_files = DEFAULT_NUM_FILES
+    file_size_mb = DEFAULT_FILE_SIZE_MB
+    if len(sys.argv) > 1:
+        num_files = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        file_size_mb = int(sys.argv[2])
+
+    if cab.compress is None:
+        print("compression not supported on this system")
+        sys.exit(1)
+
+    files_dir = tempfile.mkdtemp()
+    try:
+        files = _make_pdbs(files_dir, num_files, file_size_mb * 1024 * 1024)
+        total_mb = sum(os.stat(f).st_size for f in files) / (1024 * 1024)
+
+        print("%d files, %.1f MiB total" % (num_files, total_mb))
+        for name, options in [
+                ("thread pool", symstore.PublishOptions()),
+                ("process pool", symstore.PublishOptions(
+                    compress_processes=os.cpu_count()))]:
+            elapsed = _publish(files, options)
+            print("%-13s %.2fs  %.1f MiB/s" %
+                  (name + ":", elapsed, total_mb / elapsed))
+    finally:
+        shutil.rmtree(files_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+benchmark compression methods and levels
+
+Compresses a corpus of PE and PDB files with each compression method and
+level supported by the available CAB backends, and reports the
+throughput and the compression ratio of each setting.
+
+By default, the sample files from the test suite are used as the corpus.
+Run from the repository root with:
+
+    $ python -m benchmarks.bench_compression [PATH...]
+
+where PATH are files or directories with PE/PDB files to use instead.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+from os import path
+from symstore import cab
+from symstore import symstore
+from tests.cli import util
+
+# compress the corpus repeatedly, until this much time is spent
+MIN_TIME = 0.5
+
+
+def _corpus(paths):
+    files = []
+    for file_path, _ in symstore._walk_files(paths):
+        try:
+            symstore._probe_file_hash(file_path)
+        except Exception:
+            # not a PE or PDB file
+            continue
+        files.append(file_path)
+
+    return files
+
+
+def _settings(backend_name):
+    """
+    compression settings to benchmark for a backend
+    """
+    settings = [None]
+    for method, levels in sorted(cab._backend_methods[backend_name].items()):
+        settings.append(cab.Compression(method))
+        if levels is not None:
+            for level in (levels[0], levels[len(levels) // 2], levels[-1]):
+                settings.append(cab.Compression(method, level))
+
+    return settings
+
+
+def _run(backend_name, compression, files, dest_dir):
+    """
+    :return: (uncompressed bytes, compressed bytes, elapsed time) tuple
+    """
+    dest = path.join(dest_dir, "bench.cab")
+    size = compressed_size = 0
+    start = time.perf_counter()
+    while True:
+        for file_path in files:
+            cab.compress_file(file_path, dest, backend_name, compression)
+            size += os.stat(file_path).st_size
+            compressed_size += os.stat(dest).st_size
+
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            return size, compressed_size, elapsed
+
+
+def main():
+    paths = sys.argv[1:] or [util.SYMFILES_DIR]
+    files = _corpus(paths)
+    if not files:
+        print("no PE or PDB files found")
+        sys.exit(1)
+
+    total_mb = sum(os.stat(f).st_size for f in files) / (1024 * 1024)
+    print("%d files, %.2f MiB total" % (len(files), total_mb))
+
+    dest_dir = tempfile.mkdtemp()
+    try:
+        for backend_name in sorted(cab.backends):
+            for compression in _settings(backend_name):
+                size, compressed_size, elapsed = \
+                    _run(backend_name, compression, files, dest_dir)
+                name = "%s %s" % (backend_name, compression or "default")
+                print("%-20s %8.1f MiB/s  ratio %.2f" %
+                      (name, size / (1024 * 1024) / elapsed,
+                       size / compressed_size))
+    finally:
+        shutil.rmtree(dest_dir)
+
+
+if __name__ == "__main__":
+    main()
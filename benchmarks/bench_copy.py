@@ -0,0 +1,77 @@
+"""
+benchmark copying uncompressed files into the store
+
+Compares the throughput of shutil.copy() with fileio.copy_file(),
+which copies the data with copy_file_range() or sendfile() system calls,
+when available, and with fileio.copy_file() copying the file in chunks
+concurrently.
+
+Run from the repository root with:
+
+    $ python -m benchmarks.bench_copy [FILE_SIZE_MB] [DEST_DIR]
+
+where DEST_DIR is a directory to copy the file to, e.g. on a different
+file system than the temporary directory.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+from os import path
+from symstore import fileio
+
+DEFAULT_FILE_SIZE_MB = 256
+
+# number of times each copy function is run, best time is reported
+RUNS = 3
+
+
+def _write_file(file_path, size):
+    chunk = os.urandom(1024 * 1024)
+    with open(file_path, "wb") as f:
+        for _ in range(size // len(chunk)):
+            f.write(chunk)
+
+
+def _best_time(copy_func, src, dest):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        copy_func(src, dest)
+        times.append(time.perf_counter() - start)
+        os.unlink(dest)
+
+    return min(times)
+
+
+def main():
+    file_size_mb = DEFAULT_FILE_SIZE_MB
+    if len(sys.argv) > 1:
+        file_size_mb = int(sys.argv[1])
+
+    temp_dir = tempfile.mkdtemp()
+    dest_dir = sys.argv[2] if len(sys.argv) > 2 else temp_dir
+    try:
+        src = path.join(temp_dir, "bench.pdb")
+        dest = path.join(dest_dir, "bench-copy.pdb")
+        _write_file(src, file_size_mb * 1024 * 1024)
+
+        print("copy methods: %s" %
+              ", ".join(m.__name__ for m in fileio._copy_methods()))
+
+        def parallel_copy(src, dest):
+            fileio.copy_file(src, dest, fileio.ParallelCopy(0))
+
+        for name, copy_func in [("shutil.copy", shutil.copy),
+                                ("fileio.copy_file", fileio.copy_file),
+                                ("parallel copy", parallel_copy)]:
+            elapsed = _best_time(copy_func, src, dest)
+            print("%-17s %.2fs  %.1f MiB/s" %
+                  (name + ":", elapsed, file_size_mb / elapsed))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
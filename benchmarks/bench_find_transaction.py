@@ -0,0 +1,60 @@
+"""
+benchmark looking up a transaction in a large server.txt file
+
+Writes a server.txt file with many transactions, and compares looking
+up a transaction with Transactions.find(), with parsing the whole file.
+
+Run from the repository root with:
+
+    $ python -m benchmarks.bench_find_transaction [NUM_TRANSACTIONS]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import symstore
+
+DEFAULT_NUM_TRANSACTIONS = 500000
+
+# number of lookups to time
+LOOKUPS = 100
+
+
+def _write_server_file(store, num):
+    os.makedirs(store._admin_dir)
+    with open(store._server_file, "w") as f:
+        for i in range(1, num + 1):
+            f.write("%.10d,add,file,01/02/2017,10:11:12,"
+                    "\"prod\",\"%d\",\"comment\",\n" % (i, i))
+
+
+def main():
+    num = DEFAULT_NUM_TRANSACTIONS
+    if len(sys.argv) > 1:
+        num = int(sys.argv[1])
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        store = symstore.Store(temp_dir)
+        _write_server_file(store, num)
+        ids = ["%.10d" % (1 + i * (num - 1) // (LOOKUPS - 1))
+               for i in range(LOOKUPS)]
+
+        start = time.perf_counter()
+        symstore.Transactions(store).items()
+        parse_time = time.perf_counter() - start
+        print("parse all:  %.3fs" % parse_time)
+
+        start = time.perf_counter()
+        for transaction_id in ids:
+            assert symstore.Transactions(store).find(transaction_id)
+        find_time = (time.perf_counter() - start) / LOOKUPS
+        print("find:       %.6fs per lookup, %.0fx faster" %
+              (find_time, parse_time / find_time))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+benchmark loading the transactions of a large store
+
+Writes a server.txt file with many transactions, and compares the time
+and memory used to load all transactions, as lazily decoded transaction
+records, and as fully decoded transactions. The memory used by the
+records after their fields are accessed is measured as well.
+
+Run from the repository root with:
+
+    $ python -m benchmarks.bench_load_transactions [NUM_TRANSACTIONS]
+"""
+import gc
+import os
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+import symstore
+from symstore.symstore import parse_transaction_line
+
+DEFAULT_NUM_TRANSACTIONS = 1000000
+
+
+def _write_server_file(store, num):
+    os.makedirs(store._admin_dir)
+    with open(store._server_file, "w") as f:
+        for i in range(1, num + 1):
+            f.write("%.10d,add,file,01/02/2017,10:11:%.2d,"
+                    "\"prod\",\"%d\",\"comment\",\n" % (i, i % 60, i))
+
+
+def _load_records(store):
+    return dict(symstore.Transactions(store).items())
+
+
+def _load_accessed(store):
+    """
+    load the transaction records, and access the fields of each one
+    """
+    transactions = _load_records(store)
+    for transaction in transactions.values():
+        transaction.product
+
+    return transactions
+
+
+def _load_decoded(store):
+    """
+    load the transactions, decoding all fields up front
+    """
+    transactions = {}
+    with open(store._server_file) as f:
+        for line in f:
+            transaction = symstore.Transaction(
+                store, **parse_transaction_line(line))
+            transactions[transaction.id] = transaction
+
+    return transactions
+
+
+def _measure(load, store):
+    """
+    :return: (load time, memory used by the loaded transactions) tuple
+    """
+    gc.collect()
+    start = time.perf_counter()
+    transactions = load(store)
+    elapsed = time.perf_counter() - start
+    del transactions
+
+    gc.collect()
+    tracemalloc.start()
+    transactions = load(store)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del transactions
+
+    return elapsed, memory
+
+
+def main():
+    num = DEFAULT_NUM_TRANSACTIONS
+    if len(sys.argv) > 1:
+        num = int(sys.argv[1])
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        store = symstore.Store(temp_dir)
+        _write_server_file(store, num)
+        print("%d transactions" % num)
+
+        decoded_time, decoded_memory = _measure(_load_decoded, store)
+        records_time, records_memory = _measure(_load_records, store)
+        accessed_time, accessed_memory = _measure(_load_accessed, store)
+
+        for name, elapsed, memory in (
+                ("decoded", decoded_time, decoded_memory),
+                ("records", records_time, records_memory),
+                ("accessed", accessed_time, accessed_memory)):
+            print("%-8s %.3fs  %7.1f MiB  %4d bytes per transaction" %
+                  (name, elapsed, memory / (1024 * 1024), memory / num))
+
+        print("records are %.1fx faster to load, and use %.1fx less memory" %
+              (decoded_time / records_time, decoded_memory / records_memory))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
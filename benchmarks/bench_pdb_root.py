@@ -0,0 +1,84 @@
+"""
+benchmark PDB stream directory decoding
+
+Builds a synthetic PDB file with a large stream directory and measures
+the time to look up page lists of all streams, using the prefix-summed
+directory tables of pdb.Root, compared to the per-stream directory walk.
+
+Run from the repository root with:
+
+    $ python -m benchmarks.bench_pdb_root [NUM_STREAMS]
+"""
+import os
+import sys
+import time
+import struct
+import tempfile
+from symstore import pdb
+from tests import synth
+
+DEFAULT_NUM_STREAMS = 4000
+
+
+class WalkingRoot(pdb.Root):
+    """
+    root stream parser which finds stream's page list by walking
+    all preceding streams, the way it was done before directory caching
+    """
+    def num_streams(self):
+        return struct.unpack("<I", self.read(0, 4))[0]
+
+    def stream_size(self, stream_index):
+        return struct.unpack("<I", self.read(stream_index * 4 + 4, 4))[0]
+
+    def stream_pages(self, stream_index):
+        pages_offset = 4 + 4 * self.num_streams()
+
+        for sidx in range(stream_index):
+            pages_offset += \
+                pdb._stream_pages_num(self.stream_size(sidx),
+                                      self.page_size) * 4
+
+        num_pages = pdb._stream_pages_num(self.stream_size(stream_index),
+                                          self.page_size)
+        return pdb._u32_array(self.read(pages_offset, 4*num_pages))
+
+
+def _walk_streams(root_class, pdb_path):
+    with open(pdb_path, "rb") as f:
+        data = f.read()
+        page_size, _, _, root_dir_size, _ = \
+            struct.unpack_from("<IIIII", data, len(pdb.SIGNATURE))
+        root = root_class(data, page_size, root_dir_size)
+
+        start = time.perf_counter()
+        for i in range(root.num_streams()):
+            root.stream_pages(i)
+
+        return time.perf_counter() - start
+
+
+def main():
+    num_streams = DEFAULT_NUM_STREAMS
+    if len(sys.argv) > 1:
+        num_streams = int(sys.argv[1])
+
+    fd, pdb_path = tempfile.mkstemp(suffix=".pdb")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(synth.pdb_file(extra_streams=num_streams,
+                                   page_size=512))
+
+        walking = _walk_streams(WalkingRoot, pdb_path)
+        cached = _walk_streams(pdb.Root, pdb_path)
+    finally:
+        os.remove(pdb_path)
+
+    print("streams: %d" % num_streams)
+    print("walking directory:  %.3fs" % walking)
+    print("cached directory:   %.3fs" % cached)
+    print("speedup:            %.1fx" % (walking / cached))
+
+
+if __name__ == "__main__":
+    main()
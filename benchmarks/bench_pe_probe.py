@@ -0,0 +1,136 @@
+"""
+benchmark PE header probing
+
+Counts the I/O system calls made while parsing PE headers with
+pe.PEFile, compared to reading each header field with a separate
+seek and read, and measures the parse time of both approaches.
+
+The calls are counted both for buffered file objects, as returned by
+fileio.open_rb(), and for unbuffered file objects, which model
+file systems where each read turns into a network round trip.
+
+Run from the repository root with:
+
+    $ python -m benchmarks.bench_pe_probe [PE_FILE...]
+"""
+import io
+import os
+import sys
+import time
+import struct
+from unittest import mock
+from symstore import pe
+from symstore import fileio
+from tests.cli import util
+
+ROUNDS = 2000
+
+
+class CountingFileIO(io.FileIO):
+    """
+    raw file object, that counts the read and seek system calls
+    """
+    counts = {"read": 0, "seek": 0, "fstat": 0}
+
+    def read(self, size=-1):
+        CountingFileIO.counts["read"] += 1
+        return super().read(size)
+
+    def readinto(self, b):
+        CountingFileIO.counts["read"] += 1
+        return super().readinto(b)
+
+    def readall(self):
+        CountingFileIO.counts["read"] += 1
+        return super().readall()
+
+    def seek(self, *args):
+        CountingFileIO.counts["seek"] += 1
+        return super().seek(*args)
+
+
+def _open_counting(filepath):
+    return io.BufferedReader(CountingFileIO(filepath))
+
+
+def _open_counting_unbuffered(filepath):
+    return CountingFileIO(filepath)
+
+
+def _fstat_counting(fd, orig_fstat=os.fstat):
+    CountingFileIO.counts["fstat"] += 1
+    return orig_fstat(fd)
+
+
+def _read_u32(f, size, offset):
+    if offset + 4 > size:
+        raise pe.PEFormatError()
+
+    f.seek(offset)
+    return struct.unpack("<I", f.read(4))[0]
+
+
+def field_reads_probe(filepath):
+    """
+    parse the headers, reading each field with separate seek and read
+    """
+    with fileio.open_rb(filepath) as f:
+        fsize = os.fstat(f.fileno()).st_size
+        pe_sig_offset = _read_u32(f, fsize, pe.PE_SIGNATURE_POINTER)
+
+        f.seek(pe_sig_offset)
+        if f.read(4) != pe.PE_SIGNATURE:
+            raise pe.PESignatureNotFoundError()
+
+        return (_read_u32(f, fsize, pe_sig_offset+pe.TIME_DATE_STAMP_OFFSET),
+                _read_u32(f, fsize, pe_sig_offset +
+                          pe.OPTIONAL_HEADER_OFFSET +
+                          pe.SIZE_OF_IMAGE_OFFSET))
+
+
+def headers_probe(filepath):
+    pefile = pe.PEFile(filepath)
+    return pefile.TimeDateStamp, pefile.SizeOfImage
+
+
+def _measure(probe, filepath, open_func):
+    for key in CountingFileIO.counts:
+        CountingFileIO.counts[key] = 0
+
+    with mock.patch("symstore.fileio.open_rb", open_func), \
+            mock.patch("os.fstat", _fstat_counting):
+        probe(filepath)
+
+    counts = dict(CountingFileIO.counts)
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        probe(filepath)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+
+    return counts, elapsed
+
+
+def _format(counts):
+    return "read %(read)d, seek %(seek)d, fstat %(fstat)d" % counts
+
+
+def main():
+    files = sys.argv[1:]
+    if not files:
+        files = [util.symfile_path(f)
+                 for f in ("dummylib.dll", "dummyprog.exe", "u32_test.dll")]
+
+    for filepath in files:
+        print(os.path.basename(filepath))
+        for mode, open_func in (("buffered", _open_counting),
+                                ("unbuffered", _open_counting_unbuffered)):
+            for name, probe in (("field reads", field_reads_probe),
+                                ("headers probe", headers_probe)):
+                counts, elapsed = _measure(probe, filepath, open_func)
+                print("  %-11s %-14s %s  %.1fus" %
+                      (mode, name + ":", _format(counts), elapsed * 1e6))
+
+
+if __name__ == "__main__":
+    main()
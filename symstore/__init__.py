@@ -6,11 +6,20 @@ from symstore.symstore import Transactions
 from symstore.symstore import History
 from symstore.symstore import Transaction
 from symstore.symstore import TransactionEntry
+from symstore.symstore import PublishOptions
+from symstore.symstore import register_file_format
+from symstore.symstore import hash_files
+from symstore.symstore import file_key
+from symstore.hashcache import HashCache
+from symstore.policy import AdaptiveCompression
+from symstore.retention import RetentionPolicy
+from symstore.retention import RetentionRule
 from symstore.errs import FileFormatError
 from symstore.errs import UnknownFileType
 from symstore.errs import FileNotFound
 from symstore.errs import TransactionNotFound
 from symstore.errs import CabCompressionError
+from symstore.errs import FileErrors
 
 __version__ = "0.dev0"
 
@@ -20,9 +29,18 @@ __all__ = [
     "History",
     "Transaction",
     "TransactionEntry",
+    "PublishOptions",
+    "register_file_format",
+    "hash_files",
+    "file_key",
+    "HashCache",
+    "AdaptiveCompression",
+    "RetentionPolicy",
+    "RetentionRule",
     "FileFormatError",
     "UnknownFileType",
     "FileNotFound",
     "TransactionNotFound",
     "CabCompressionError",
+    "FileErrors",
 ]
@@ -1,20 +1,176 @@
 import os
+import zlib
 from symstore import errs
+from symstore import cabfile
 
 # 'points' to suitable cab compression function,
-# as initialized on module import
-# None if compression is not supported
+# as initialized on module import, or selected with select_backend()
 compress = None
 
+# the name of the backend 'compress' points to
+backend = None
 
-def _compress_gcab(src_path, dest_path):
+# available cab compression functions, by backend name
+backends = {}
+
+# compression methods
+NONE = "none"
+MSZIP = "mszip"
+LZX = "lzx"
+
+# the compression methods supported by each backend, and
+# the range of supported levels, None if levels are not supported
+_backend_methods = {
+    "builtin": {NONE: None, MSZIP: range(1, 10)},
+    "gcab": {NONE: None, MSZIP: None},
+    "makecab": {NONE: None, MSZIP: None, LZX: range(15, 22)},
+}
+
+
+class Compression:
+    """
+    Specifies the compression method, and optionally the level,
+    to use when creating CAB files.
+
+    The meaning of the level depends on the method. For MSZIP it
+    is the zlib compression level, 1-9. For LZX it is the window size,
+    as power of 2, 15-21.
+
+    :param method: one of NONE, MSZIP or LZX
+    :param level: compression level, None for backend's default
+    """
+    def __init__(self, method, level=None):
+        if method not in (NONE, MSZIP, LZX):
+            raise ValueError("unknown compression method '%s'" % method)
+
+        self.method = method
+        self.level = level
+
+    @classmethod
+    def parse(cls, text):
+        """
+        parse compression specification in 'METHOD[:LEVEL]' format,
+        for example 'mszip:9' or 'lzx'
+        """
+        method, sep, level = text.lower().partition(":")
+        if not sep:
+            return cls(method)
+
+        try:
+            level = int(level)
+        except ValueError:
+            raise ValueError("invalid compression level '%s'" % level)
+
+        return cls(method, level)
+
+    def __str__(self):
+        if self.level is None:
+            return self.method
+
+        return "%s:%s" % (self.method, self.level)
+
+
+def check_compression(compression, backend_name=None):
+    """
+    check that a backend supports specified compression
+
+    :param compression: Compression object, None for backend's default
+    :param backend_name: the backend to check, None for the current one
+
+    :raises symstore.CabCompressionError: if compression not supported
+    """
+    if compression is None:
+        return
+
+    if backend_name is None:
+        backend_name = backend
+
+    methods = _backend_methods.get(backend_name, {})
+    if compression.method not in methods:
+        raise errs.CabCompressionError(
+            "%s compression not supported by '%s' backend" %
+            (compression.method, backend_name))
+
+    if compression.level is None:
+        return
+
+    levels = methods[compression.method]
+    if levels is None:
+        raise errs.CabCompressionError(
+            "%s compression level not supported by '%s' backend" %
+            (compression.method, backend_name))
+
+    if compression.level not in levels:
+        raise errs.CabCompressionError(
+            "invalid %s compression level %s, must be %s-%s" %
+            (compression.method, compression.level,
+             levels[0], levels[-1]))
+
+
+def select_backend(name):
+    """
+    select the cab compression backend to use
+
+    :param name: one of the names in the 'backends' dictionary
+    """
+    global compress, backend
+
+    if name not in backends:
+        raise ValueError("unknown cab compression backend '%s'" % name)
+
+    compress = backends[name]
+    backend = name
+
+
+def compress_file(src_path, dest_path, backend_name=None,
+                  compression=None):
+    """
+    compress a file with the available compression function
+
+    This is a picklable wrapper around compress(), suitable for
+    running in a worker process.
+
+    :param backend_name: compression backend to use,
+                         None for the default one
+    :param compression: Compression object, None for backend's default
+    """
+    if backend_name is not None:
+        select_backend(backend_name)
+
+    compress(src_path, dest_path, compression)
+
+
+def _compress_builtin(src_path, dest_path, compression=None):
+    """
+    compress using built-in pure python CAB writer
+    """
+    check_compression(compression, "builtin")
+
+    if compression is None:
+        cabfile.write_cab(src_path, dest_path)
+    elif compression.method == NONE:
+        cabfile.write_cab(src_path, dest_path, cabfile.COMPRESS_NONE)
+    else:
+        level = compression.level
+        if level is None:
+            level = zlib.Z_DEFAULT_COMPRESSION
+        cabfile.write_cab(src_path, dest_path, cabfile.COMPRESS_MSZIP, level)
+
+
+def _compress_gcab(src_path, dest_path, compression=None):
     """
     compress using GCab library
     """
+    check_compression(compression, "gcab")
+
     cab_file = GCab.File.new_with_file(os.path.basename(src_path),
                                        Gio.File.new_for_path(src_path))
 
-    cab_folder = GCab.Folder.new(GCab.Compression.MSZIP)
+    cab_compression = GCab.Compression.MSZIP
+    if compression is not None and compression.method == NONE:
+        cab_compression = GCab.Compression.NONE
+
+    cab_folder = GCab.Folder.new(cab_compression)
     cab_folder.add_file(cab_file, False)
 
     cab = GCab.Cabinet.new()
@@ -28,12 +184,32 @@ def _compress_gcab(src_path, dest_path):
                          None))
 
 
-def _compress_makecab(src_path, dest_path):
+def _makecab_options(compression):
+    if compression is None:
+        compression = Compression(LZX)
+
+    if compression.method == NONE:
+        return ["/D", "Compress=off"]
+
+    if compression.method == MSZIP:
+        return ["/D", "CompressionType=MSZIP"]
+
+    memory = compression.level
+    if memory is None:
+        memory = 21
+
+    return ["/D", "CompressionType=LZX",
+            "/D", "CompressionMemory=%s" % memory]
+
+
+def _compress_makecab(src_path, dest_path, compression=None):
     """
     compress by running 'makecab.exe' utility
     """
-    args = ["makecab.exe", "/D", "CompressionType=LZX",
-            "/D", "CompressionMemory=21", src_path, dest_path]
+    check_compression(compression, "makecab")
+
+    args = ["makecab.exe"] + _makecab_options(compression) + \
+        [src_path, dest_path]
 
     # use Popen() API to launch makecab.exe,
     # as this is the only suitable API available in python 2.7 and 3.4
@@ -46,10 +222,13 @@ def _compress_makecab(src_path, dest_path):
         raise errs.CabCompressionError("%s" % out.decode())
 
 
+backends["builtin"] = _compress_builtin
+
 if os.name != "nt":
     #
     # For non-windows systems, check if GCab library is available,
-    # and use gcab based compression if it's available
+    # and use gcab based compression if it's available,
+    # otherwise fall back to built-in compression
     #
     try:
         import gi
@@ -57,14 +236,16 @@ if os.name != "nt":
         from gi.repository import GCab
         from gi.repository import Gio
 
-        compress = _compress_gcab
+        backends["gcab"] = _compress_gcab
+        select_backend("gcab")
     except ValueError:
-        pass
+        select_backend("builtin")
     except ImportError:
-        pass
+        select_backend("builtin")
 else:
     #
     # On windows systems, use built-in 'makecab' based compression
     #
     import subprocess
-    compress = _compress_makecab
+    backends["makecab"] = _compress_makecab
+    select_backend("makecab")
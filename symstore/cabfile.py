@@ -0,0 +1,518 @@
+"""
+a minimal, pure python, implementation of CAB archive format
+
+Supports writing single file cabinets, with the file data compressed
+using MSZIP method, and reading files stored uncompressed, MSZIP or
+LZX compressed. The MSZIP compression is implemented with zlib, the LZX
+decompression is implemented by the lzx module.
+
+The file data is processed one CFDATA block at a time, so that
+the whole file is never loaded into memory.
+
+See [MS-CAB] Cabinet File Format specification for details.
+"""
+import io
+import os
+import zlib
+import struct
+import time
+from os import path
+from collections import deque
+from symstore import errs
+from symstore import lzx
+from symstore import fileio
+
+
+class CabFormatError(errs.FileFormatError):
+    format_name = "CAB"
+
+
+SIGNATURE = b"MSCF"
+
+# CAB format version, 1.3
+VERSION_MINOR = 3
+VERSION_MAJOR = 1
+
+# compression type values
+COMPRESS_NONE = 0
+COMPRESS_MSZIP = 1
+COMPRESS_QUANTUM = 2
+COMPRESS_LZX = 3
+
+# the bits of folder's compression type field that specify the method
+COMPRESS_MASK = 0x000F
+
+# the bits of folder's compression type field that specify LZX window size
+LZX_WINDOW_MASK = 0x1F00
+LZX_WINDOW_SHIFT = 8
+
+COMPRESS_NAMES = {
+    COMPRESS_NONE: "none",
+    COMPRESS_MSZIP: "MSZIP",
+    COMPRESS_QUANTUM: "Quantum",
+    COMPRESS_LZX: "LZX",
+}
+
+# the signature of MSZIP compressed data blocks
+MSZIP_SIGNATURE = b"CK"
+
+# maximum amount of uncompressed data stored in one CFDATA block
+BLOCK_SIZE = 32768
+
+# maximum number of CFDATA blocks in a folder
+MAX_BLOCKS = 0xFFFF
+
+# file attributes, the file has been modified since last backup
+# and file name is UTF-8 encoded
+ATTRIB_ARCH = 0x20
+ATTRIB_NAME_IS_UTF = 0x80
+
+# cabinet header flags
+FLAG_PREV_CABINET = 0x0001
+FLAG_NEXT_CABINET = 0x0002
+FLAG_RESERVE_PRESENT = 0x0004
+
+CFHEADER_FMT = "<4sIIIIIBBHHHHH"
+CFFOLDER_FMT = "<IHH"
+CFFILE_FMT = "<IIHHHH"
+CFDATA_FMT = "<IHH"
+
+CFHEADER_SIZE = struct.calcsize(CFHEADER_FMT)
+CFFOLDER_SIZE = struct.calcsize(CFFOLDER_FMT)
+CFFILE_SIZE = struct.calcsize(CFFILE_FMT)
+CFDATA_SIZE = struct.calcsize(CFDATA_FMT)
+
+
+def _xor_fold(data):
+    """
+    XOR all complete little-endian 32-bit words of data together
+    """
+    num_words = len(data) // 4
+    if num_words == 0:
+        return 0
+
+    # fold the data as one big integer, halving it until we are left with
+    # one word, the number of words is padded to a power of two with
+    # zero words, which does not change the result
+    width = 1 << (num_words - 1).bit_length()
+    value = int.from_bytes(data[:num_words * 4], "little")
+
+    while width > 1:
+        width //= 2
+        bits = width * 32
+        value = (value >> bits) ^ (value & ((1 << bits) - 1))
+
+    return value
+
+
+def checksum(data, seed=0):
+    """
+    calculate CAB checksum of the data, as specified by [MS-CAB]
+    """
+    csum = seed ^ _xor_fold(data)
+
+    # the trailing bytes are combined in reversed order
+    tail = 0
+    for byte in data[len(data) - len(data) % 4:]:
+        tail = (tail << 8) | byte
+
+    return csum ^ tail
+
+
+def _dos_date_time(timestamp):
+    """
+    convert timestamp to the MS-DOS date and time values
+    """
+    tm = time.localtime(timestamp)
+    year = max(tm.tm_year, 1980)
+
+    date = ((year - 1980) << 9) | (tm.tm_mon << 5) | tm.tm_mday
+    dos_time = (tm.tm_hour << 11) | (tm.tm_min << 5) | (tm.tm_sec // 2)
+
+    return date, dos_time
+
+
+def _mszip_block(data, level):
+    """
+    compress one block of data with MSZIP method
+
+    Each block is compressed as a complete deflate stream, thus
+    does not reference any data of the previous blocks.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return MSZIP_SIGNATURE + compressor.compress(data) + compressor.flush()
+
+
+def _data_block(data, compress_type, level):
+    """
+    encode CFDATA block, including the block header
+    """
+    if compress_type == COMPRESS_MSZIP:
+        comp_data = _mszip_block(data, level)
+    else:
+        comp_data = data
+
+    sizes = struct.pack("<HH", len(comp_data), len(data))
+    csum = checksum(sizes, checksum(comp_data))
+
+    return struct.pack(CFDATA_FMT, csum, len(comp_data), len(data)) + \
+        comp_data
+
+
+def blocks_needed(size):
+    """
+    number of CFDATA blocks needed to store specified number of bytes
+    """
+    return (size + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+
+def write_cab(src_path, dest_path, compress_type=COMPRESS_MSZIP,
+              level=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    create a cabinet file containing one file
+
+    The file is stored in the cabinet under it's base name.
+
+    :param src_path: the file to store
+    :param dest_path: cabinet file to write
+    :param compress_type: COMPRESS_MSZIP or COMPRESS_NONE
+    :param level: zlib compression level, used for MSZIP compression
+
+    :raises symstore.CabCompressionError: if the file is too large
+                                          to be stored in a cabinet
+    """
+    file_name = path.basename(src_path).encode("utf-8") + b"\0"
+    attribs = ATTRIB_ARCH
+    if max(file_name) >= 0x80:
+        attribs |= ATTRIB_NAME_IS_UTF
+    files_offset = CFHEADER_SIZE + CFFOLDER_SIZE
+    data_offset = files_offset + CFFILE_SIZE + len(file_name)
+
+    with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+        st = os.fstat(src.fileno())
+        if blocks_needed(st.st_size) > MAX_BLOCKS:
+            raise errs.CabCompressionError(
+                "%s: file too large for a cabinet" % src_path)
+
+        # reserve the space for headers,
+        # they are written once all data blocks are written
+        dest.write(b"\0" * data_offset)
+
+        num_blocks = 0
+        file_size = 0
+        while True:
+            data = src.read(BLOCK_SIZE)
+            if not data:
+                break
+
+            num_blocks += 1
+            file_size += len(data)
+            if num_blocks > MAX_BLOCKS:
+                raise errs.CabCompressionError(
+                    "%s: file too large for a cabinet" % src_path)
+
+            dest.write(_data_block(data, compress_type, level))
+
+        cab_size = dest.tell()
+        date, dos_time = _dos_date_time(st.st_mtime)
+
+        dest.seek(0)
+        dest.write(struct.pack(CFHEADER_FMT,
+                               SIGNATURE, 0, cab_size, 0, files_offset, 0,
+                               VERSION_MINOR, VERSION_MAJOR,
+                               1,  # number of folders
+                               1,  # number of files
+                               0,  # flags
+                               0,  # set ID
+                               0))  # cabinet number in set
+        dest.write(struct.pack(CFFOLDER_FMT,
+                               data_offset, num_blocks, compress_type))
+        dest.write(struct.pack(CFFILE_FMT,
+                               file_size,
+                               0,  # offset in the folder
+                               0,  # folder index
+                               date, dos_time, attribs))
+        dest.write(file_name)
+
+
+def _read_exact(fp, size):
+    data = fp.read(size)
+    if len(data) != size:
+        raise CabFormatError("unexpected end of file")
+
+    return data
+
+
+def _read_struct(fp, fmt):
+    return struct.unpack(fmt, _read_exact(fp, struct.calcsize(fmt)))
+
+
+def _read_cstring(fp):
+    chars = []
+    while True:
+        ch = _read_exact(fp, 1)
+        if ch == b"\0":
+            return b"".join(chars)
+        chars.append(ch)
+
+
+class CabFile:
+    """
+    Parses the headers of a cabinet file, and provides access to the
+    files stored in the cabinet.
+
+    Only single cabinet archives are supported, e.g. cabinets
+    that are not part of a cabinet set.
+
+    The stored files are listed in the 'files' member, as a list of
+    (name, size, folder index, offset in folder) tuples.
+
+    :param fp: opened cabinet file object, must be seekable
+    """
+    def __init__(self, fp):
+        self.fp = fp
+        self._parse_headers()
+
+    def _parse_headers(self):
+        self.fp.seek(0)
+
+        (sig, _, _, _, files_offset, _, _, major,
+         num_folders, num_files, flags, _, _) = \
+            _read_struct(self.fp, CFHEADER_FMT)
+
+        if sig != SIGNATURE:
+            raise CabFormatError("invalid signature")
+
+        if major != VERSION_MAJOR:
+            raise CabFormatError("unsupported format version %s" % major)
+
+        if flags & (FLAG_PREV_CABINET | FLAG_NEXT_CABINET):
+            raise CabFormatError("multi-cabinet archives not supported")
+
+        header_reserve = folder_reserve = data_reserve = 0
+        if flags & FLAG_RESERVE_PRESENT:
+            header_reserve, folder_reserve, data_reserve = \
+                _read_struct(self.fp, "<HBB")
+            self.fp.seek(header_reserve, os.SEEK_CUR)
+
+        self.data_reserve = data_reserve
+
+        self.folders = []
+        for _ in range(num_folders):
+            self.folders.append(_read_struct(self.fp, CFFOLDER_FMT))
+            self.fp.seek(folder_reserve, os.SEEK_CUR)
+
+        self.fp.seek(files_offset)
+        self.files = []
+        for _ in range(num_files):
+            size, folder_offset, folder, _, _, attribs = \
+                _read_struct(self.fp, CFFILE_FMT)
+            name = _read_cstring(self.fp)
+            encoding = "utf-8" if attribs & ATTRIB_NAME_IS_UTF else "latin-1"
+            self.files.append((name.decode(encoding),
+                               size, folder, folder_offset))
+
+    def open(self, name=None, close_fp=False):
+        """
+        open a stored file for reading
+
+        :param name: the name of the file, None for the first file
+        :param close_fp: close the cabinet file object, when the returned
+                         file-like object is closed
+
+        :return: a file-like object, decompressing the data as it's read
+        """
+        for file_name, size, folder, folder_offset in self.files:
+            if name is None or name == file_name:
+                break
+        else:
+            raise KeyError("no file '%s' in the cabinet" % name)
+
+        if folder >= len(self.folders):
+            raise CabFormatError("invalid folder index %s" % folder)
+
+        data_offset, num_blocks, type_compress = self.folders[folder]
+        compress_type = type_compress & COMPRESS_MASK
+        if compress_type not in (COMPRESS_NONE, COMPRESS_MSZIP,
+                                 COMPRESS_LZX):
+            raise NotImplementedError(
+                "reading %s compressed data not supported" %
+                COMPRESS_NAMES.get(compress_type, "unknown"))
+
+        blocks = _FolderBlocks(self.fp, data_offset, num_blocks,
+                               type_compress, self.data_reserve)
+
+        fp = self.fp if close_fp else None
+        return io.BufferedReader(_FileReader(blocks, folder_offset, size, fp))
+
+
+class _FolderBlocks:
+    """
+    iterates over the uncompressed data of folder's CFDATA blocks
+    """
+    def __init__(self, fp, data_offset, num_blocks, type_compress,
+                 data_reserve):
+        self.fp = fp
+        self.offset = data_offset
+        self.blocks_left = num_blocks
+        self.compress_type = type_compress & COMPRESS_MASK
+        self.data_reserve = data_reserve
+        self.history = b""
+
+        if self.compress_type == COMPRESS_LZX:
+            window_bits = \
+                (type_compress & LZX_WINDOW_MASK) >> LZX_WINDOW_SHIFT
+            try:
+                self.lzx = lzx.LZXDecoder(window_bits, self._lzx_input)
+            except lzx.LZXError as e:
+                raise CabFormatError(str(e))
+            # uncompressed sizes of the blocks read by the LZX decoder
+            self.lzx_sizes = deque()
+
+    def _decompress(self, data):
+        if data[:len(MSZIP_SIGNATURE)] != MSZIP_SIGNATURE:
+            raise CabFormatError("invalid MSZIP block signature")
+
+        # MSZIP blocks may refer to the data of the previous block,
+        # use it as the dictionary
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS,
+                                          zdict=self.history)
+        try:
+            data = decompressor.decompress(data[len(MSZIP_SIGNATURE):])
+            data += decompressor.flush()
+        except zlib.error as e:
+            raise CabFormatError("error decompressing MSZIP block: %s" % e)
+
+        self.history = data[-BLOCK_SIZE:]
+        return data
+
+    def _read_block(self):
+        """
+        read next CFDATA block
+
+        :return: (compressed data, uncompressed size) tuple,
+                 or None when there are no more blocks
+        """
+        if self.blocks_left == 0:
+            return None
+
+        self.fp.seek(self.offset)
+        _, comp_size, size = _read_struct(self.fp, CFDATA_FMT)
+        self.fp.seek(self.data_reserve, os.SEEK_CUR)
+        data = _read_exact(self.fp, comp_size)
+
+        self.offset += CFDATA_SIZE + self.data_reserve + comp_size
+        self.blocks_left -= 1
+
+        return data, size
+
+    def _lzx_input(self):
+        # LZX bitstream continues across the blocks,
+        # the decoder may need to read ahead into the next block
+        block = self._read_block()
+        if block is None:
+            return b""
+
+        data, size = block
+        self.lzx_sizes.append(size)
+        return data
+
+    def _lzx_next(self):
+        if not self.lzx_sizes:
+            block = self._read_block()
+            if block is None:
+                return None
+            data, size = block
+            self.lzx.feed(data)
+        else:
+            size = self.lzx_sizes.popleft()
+
+        try:
+            return self.lzx.decompress(size)
+        except lzx.LZXError as e:
+            raise CabFormatError("error decompressing LZX data: %s" % e)
+
+    def next(self):
+        """
+        get the data of the next block
+
+        :return: uncompressed data, or None when there are no more blocks
+        """
+        if self.compress_type == COMPRESS_LZX:
+            return self._lzx_next()
+
+        block = self._read_block()
+        if block is None:
+            return None
+
+        data, size = block
+        if self.compress_type == COMPRESS_MSZIP:
+            data = self._decompress(data)
+
+        if len(data) != size:
+            raise CabFormatError("unexpected uncompressed block size")
+
+        return data
+
+
+class _FileReader(io.RawIOBase):
+    """
+    raw file object, reading a file stored in a cabinet folder
+
+    :param fp: cabinet file object to close when this object is closed,
+               None to leave it open
+    """
+    def __init__(self, blocks, folder_offset, size, fp=None):
+        self.blocks = blocks
+        self.skip = folder_offset
+        self.left = size
+        self.buffer = b""
+        self.fp = fp
+
+    def readable(self):
+        return True
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+        super().close()
+
+    def readinto(self, b):
+        while not self.buffer and self.left > 0:
+            data = self.blocks.next()
+            if data is None:
+                raise CabFormatError("unexpected end of folder data")
+
+            if self.skip > 0:
+                # skip the data of files stored before this one
+                skipped = min(self.skip, len(data))
+                data = data[skipped:]
+                self.skip -= skipped
+
+            self.buffer = memoryview(data[:self.left])
+
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        self.left -= size
+
+        return size
+
+
+def open_cab(cab_path, name=None):
+    """
+    open a file stored inside a cabinet file for reading
+
+    :param cab_path: cabinet file path
+    :param name: the name of the stored file, None for the first file
+
+    :return: a file-like object, closing it closes the cabinet file
+    """
+    fp = fileio.open_rb(cab_path)
+    try:
+        return CabFile(fp).open(name, close_fp=True)
+    except BaseException:
+        fp.close()
+        raise
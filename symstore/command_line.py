@@ -1,22 +1,70 @@
 #!/usr/bin/env python
 
+import os
 import sys
+import csv
+import json
+import logging
 import argparse
 import symstore
+from symstore import cab
+from symstore import policy
+from symstore import fileio
+from symstore import retention
 from pathlib import Path
 
 
+# environment variable specifying hash cache file location
+HASH_CACHE_ENV = "SYMSTORE_HASH_CACHE"
+
+# the first argument that selects 'hash' mode
+HASH_COMMAND = "hash"
+
+
 class CompressionNotSupported(Exception):
     pass
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
-        description="publish windows debugging files")
+        description="publish windows debugging files",
+        epilog="Run '%(prog)s " + HASH_COMMAND + " --help' for details on "
+               "computing symbols store keys without publishing files. "
+               "To publish to a new store in a directory named '" +
+               HASH_COMMAND + "', specify it as './" + HASH_COMMAND + "'.")
 
     parser.add_argument("-d", "--delete",
-                        metavar="TRANSACTION_ID",
-                        help="Delete transaction.")
+                        type=_transaction_ids_arg,
+                        metavar="TRANSACTION_IDS",
+                        help="Delete transactions. Specify comma separated "
+                             "list of IDs and ID ranges, e.g. '1-10,15', "
+                             "or @FILE to read the IDs from FILE, one per "
+                             "line.")
+
+    parser.add_argument("--retention",
+                        metavar="RULES_FILE",
+                        help="Delete the transactions, that are not kept "
+                             "by the retention rules in the JSON file "
+                             "RULES_FILE.")
+
+    parser.add_argument("-n", "--dry-run",
+                        action="store_true",
+                        help="With --retention, list the transactions "
+                             "that would be deleted, without deleting "
+                             "them.")
+
+    parser.add_argument("--rebuild-index",
+                        action="store_true",
+                        help="Rebuild the index of the files referenced "
+                             "by transactions, used when deleting "
+                             "transactions. Needed for stores created or "
+                             "modified by other tools.")
+
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="Finish publishing the transaction, which "
+                             "commit was interrupted. Only the files "
+                             "that were not published are published.")
 
     parser.add_argument("-z", "--compress",
                         action="store_true",
@@ -27,6 +75,75 @@ def parse_args():
                         help="Specifies maximum size of files to compress. "
                              "File above the limit are published uncompressed.")
 
+    parser.add_argument("--min-compress-ratio",
+                        type=float, default=None, metavar="RATIO",
+                        help="Only compress files with estimated "
+                             "compression ratio of at least RATIO. "
+                             "The ratio is estimated by compressing "
+                             "a sample of each file's data.")
+
+    parser.add_argument("--compression",
+                        type=_compression_arg, default=None,
+                        metavar="METHOD[:LEVEL]",
+                        help="Compression method to use, 'none', 'mszip' "
+                             "or 'lzx', optionally followed by the "
+                             "compression level. The level is zlib level "
+                             "1-9 for 'mszip', and window size 15-21 for "
+                             "'lzx'. Supported methods and levels depend "
+                             "on the CAB backend.")
+
+    parser.add_argument("--cab-backend",
+                        choices=sorted(cab.backends), default=None,
+                        help="CAB compression implementation to use. "
+                             "Defaults to '%s' on this system." % cab.backend)
+
+    parser.add_argument("--compress-processes",
+                        type=_positive_int, default=None, metavar="N",
+                        help="Compress files in N worker processes, "
+                             "instead of the publishing threads.")
+
+    parser.add_argument("--cpu-workers",
+                        type=_positive_int, default=None, metavar="N",
+                        help="Number of threads used for compressing "
+                             "files. Defaults to the number of CPUs.")
+
+    parser.add_argument("--io-workers",
+                        type=_positive_int, default=None, metavar="N",
+                        help="Number of threads used for copying files "
+                             "into the store.")
+
+    parser.add_argument("--link-mode",
+                        choices=fileio.LINK_MODES, default=fileio.COPY,
+                        help="How uncompressed files are published. "
+                             "Files are copied, hard linked or reflinked "
+                             "(copy-on-write clone) into the store. The "
+                             "'auto' mode tries reflink, then hard link, "
+                             "and falls back to copying. "
+                             "Default is '%s'." % fileio.COPY)
+
+    parser.add_argument("--parallel-copy",
+                        type=int, default=None, metavar="SIZE",
+                        help="Copy files of at least SIZE bytes in "
+                             "chunks, using several concurrent reads "
+                             "and writes. Speeds up publishing large "
+                             "files to network file systems.")
+
+    parser.add_argument("--copy-chunk-size",
+                        type=_positive_int,
+                        default=fileio.PARALLEL_COPY_CHUNK_SIZE,
+                        metavar="BYTES",
+                        help="Size of the chunks for --parallel-copy. "
+                             "Default is %s." %
+                             fileio.PARALLEL_COPY_CHUNK_SIZE)
+
+    parser.add_argument("--copy-concurrency",
+                        type=_positive_int,
+                        default=fileio.PARALLEL_COPY_CONCURRENCY,
+                        metavar="N",
+                        help="Number of chunks copied at the same time "
+                             "for --parallel-copy. Default is %s." %
+                             fileio.PARALLEL_COPY_CONCURRENCY)
+
     parser.add_argument("-p", "--product-name", default="",
                         help="Name of the product.")
 
@@ -43,6 +160,25 @@ def parse_args():
                              "transaction.  Uses file's hash to check if it's "
                              "already exists in the store.")
 
+    parser.add_argument("--checksums",
+                        action="store_true",
+                        help="Write a SHA-256 checksum file next to each "
+                             "published file. With --skip-published, "
+                             "files are only skipped if the published "
+                             "file's size and checksum match.")
+
+    parser.add_argument("-w", "--workers",
+                        type=int, default=None,
+                        help="Maximum number of threads used to "
+                             "process files.")
+
+    _add_hash_cache_arg(parser)
+
+    parser.add_argument("-v", "--verbose",
+                        action="store_true",
+                        help="Log details, such as compression decisions "
+                             "made for each file, and hash cache hits.")
+
     parser.add_argument("--version",
                         action="version",
                         version="symstore %s" % symstore.__version__,
@@ -55,7 +191,108 @@ def parse_args():
     parser.add_argument("files", metavar="FILE", type=str, nargs="*",
                         help="PDB or PE file(s) to publish.")
 
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    # when resuming, files are compressed as requested by the
+    # interrupted commit
+    if args.compression is not None and not (args.compress or args.resume):
+        parser.error("--compression requires -z/--compress")
+
+    return args
+
+
+def _compression_arg(text):
+    try:
+        return cab.Compression.parse(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError("%s" % e)
+
+
+def _transaction_ids(text):
+    """
+    parse transaction IDs and ID ranges
+
+    :return: list of (transaction ID, in range) tuples, where 'in range'
+             is True for the IDs specified with a range
+    """
+    ids = []
+    for item in text.replace(",", " ").split():
+        if item.startswith("@"):
+            ids += _transaction_ids(fileio.read_all(item[1:]))
+            continue
+
+        first, sep, last = item.partition("-")
+        first = int(first)
+        last = int(last) if sep else first
+        if first > last:
+            raise ValueError("invalid range '%s'" % item)
+
+        ids += [("%.010d" % i, bool(sep)) for i in range(first, last + 1)]
+
+    return ids
+
+
+def _transaction_ids_arg(text):
+    try:
+        return _transaction_ids(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid transaction IDs '%s'" %
+                                         text)
+    except OSError as e:
+        raise argparse.ArgumentTypeError("can't read %s: %s" %
+                                         (e.filename, e.strerror))
+
+
+def _positive_int(text):
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+
+    if value <= 0:
+        raise argparse.ArgumentTypeError("invalid positive integer '%s'" %
+                                         text)
+    return value
+
+
+def _add_hash_cache_arg(parser):
+    parser.add_argument("--hash-cache",
+                        metavar="CACHE_FILE",
+                        default=os.environ.get(HASH_CACHE_ENV),
+                        help="Cache files hashes in specified file, "
+                             "unchanged files are not re-parsed on later "
+                             "runs. Defaults to the value of the %s "
+                             "environment variable." % HASH_CACHE_ENV)
+
+
+def parse_hash_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="symstore %s" % HASH_COMMAND,
+        description="compute symbols store keys of windows debugging "
+                    "files, without publishing them")
+
+    parser.add_argument("-f", "--format",
+                        choices=["jsonl", "csv"], default="jsonl",
+                        help="Output format, JSON lines or CSV. "
+                             "Default is jsonl.")
+
+    parser.add_argument("-w", "--workers",
+                        type=int, default=None,
+                        help="Maximum number of threads used to "
+                             "process files.")
+
+    _add_hash_cache_arg(parser)
+
+    parser.add_argument("-v", "--verbose",
+                        action="store_true",
+                        help="Log details, such as the number of hash "
+                             "cache hits and misses.")
+
+    parser.add_argument("paths", metavar="PATH", type=str, nargs="+",
+                        help="PDB or PE file(s), or directories "
+                             "to search for such files.")
+
+    return parser.parse_args(argv)
 
 
 def err_exit(error_msg):
@@ -73,16 +310,94 @@ def check_compression_support(compress_flag):
         raise CompressionNotSupported()
 
 
-def delete_action(sym_store, transaction_id):
+def delete_action(sym_store, transaction_ids):
+    # ranges may include IDs of delete transactions, and of
+    # transactions deleted before, skip such IDs
+    skipped = []
+    if any(in_range for _, in_range in transaction_ids):
+        existing = {t for t, _ in sym_store.transactions.items()}
+        skipped = [t for t, in_range in transaction_ids
+                   if in_range and t not in existing]
+
+    if skipped:
+        sys.stderr.write("skipping IDs not found: %s\n" % ", ".join(skipped))
+
+    skipped = set(skipped)
+    try:
+        sym_store.delete_transactions([t for t, _ in transaction_ids
+                                       if t not in skipped])
+    except symstore.TransactionNotFound as e:
+        err_exit("no transaction with id '%s' found" % e.args[0])
+
+
+def retention_action(sym_store, rules_file, dry_run):
     try:
-        sym_store.delete_transaction(transaction_id)
-    except symstore.TransactionNotFound:
-        err_exit("no transaction with id '%s' found" % transaction_id)
+        retention_policy = retention.RetentionPolicy.load(rules_file)
+    except OSError as e:
+        err_exit("%s: %s" % (rules_file, e.strerror))
+    except ValueError as e:
+        err_exit("invalid retention rules %s" % e)
+
+    plan = retention_policy.plan(sym_store)
+
+    if dry_run:
+        for transaction in plan.transactions:
+            print("%s %s %s %s" % (transaction.id,
+                                   transaction.timestamp.isoformat(" "),
+                                   transaction.product,
+                                   transaction.version))
+    else:
+        plan.execute(sym_store)
+
+    print("%s %s transactions, keeping %s, %s files, %s bytes reclaimed" %
+          ("would delete" if dry_run else "deleted",
+           len(plan.transactions), plan.kept, len(plan.files), plan.size))
+
+
+def _error_text(error):
+    """
+    describe why a file failed to be processed
+    """
+    if isinstance(error, symstore.UnknownFileType):
+        return "can't figure out file type"
+
+    if isinstance(error, symstore.FileFormatError):
+        return "invalid %s file: %s" % (error.format_name, error)
+
+    if isinstance(error, symstore.FileNotFound):
+        return "no such file"
+
+    return "%s" % error
+
+
+def resume_action(sym_store, options):
+    try:
+        transaction = sym_store.resume(options)
+    except symstore.CabCompressionError as e:
+        err_exit("Error creating CAB\n%s" % e)
+
+    if transaction is None:
+        err_exit("no interrupted transaction to resume")
+
+
+def _file_error_msg(file, error):
+    """
+    format error message for a file that failed to be processed
+    """
+    if isinstance(error, symstore.FileNotFound):
+        return "No such file: %s" % error.filename
+
+    return "%s: %s" % (file, _error_text(error))
 
 
 def add_action(sym_store, files,
                product_name, product_version, comment,
-               compress, max_compress, skip_published):
+               compress, max_compress, skip_published, workers,
+               options, min_compress_ratio=None):
+
+    adaptive = None
+    if min_compress_ratio is not None:
+        adaptive = policy.AdaptiveCompression(min_compress_ratio)
 
     def _compress_file(file):
         """
@@ -93,61 +408,189 @@ def add_action(sym_store, files,
             # compression is disabled for this transaction
             return False
 
-        if max_compress is None:
-            # compression is enabled,
-            # but there is no file size specified
-            return True
+        if max_compress is not None:
+            # only compress if the file is inside
+            # the compression file size limit
+            file_size = Path(file).stat().st_size
+            if file_size > max_compress:
+                return False
+
+        if adaptive is not None:
+            # only compress if the file compresses well enough
+            return adaptive(file)
 
-        # only compress if the file is inside
-        # the compression file size limit
-        file_size = Path(file).stat().st_size
-        return file_size <= max_compress
+        return True
 
     try:
         # error-out if no compression
         check_compression_support(compress)
-
-        # create new add transaction, add all specified files
-        transaction = sym_store.new_transaction(product_name, product_version,
-                                                comment)
-        for file in files:
-            entry = transaction.new_entry(file, _compress_file(file))
-
-            if skip_published and entry.exists():
-                # 'skip published' mode is on and this file
-                # have already been published, skip it skipper
-                continue
-
-            transaction.add_entry(entry)
-
-        if len(transaction.entries) == 0:
+        if compress:
+            cab.check_compression(options.compression)
+
+        # publish all specified files in a new transaction
+        transaction = sym_store.add_files(files,
+                                          product_name, product_version,
+                                          comment,
+                                          compress=_compress_file,
+                                          skip_published=skip_published,
+                                          workers=workers,
+                                          options=options)
+        if transaction is None:
             err_exit("no new files to publish")
-
-        # commit the transaction to the store
-        sym_store.commit(transaction)
-    except symstore.UnknownFileType:
-        err_exit("%s: can't figure out file type" % file)
-    except symstore.FileFormatError as e:
-        err_exit("%s: invalid %s file: %s" % (file, e.format_name, e))
+    except symstore.FileErrors as e:
+        err_exit("\n".join(
+            [_file_error_msg(file, error) for file, error in e.errors]))
     except CompressionNotSupported:
         err_exit("gcab module not available, compression not supported")
-    except symstore.FileNotFound as e:
-        err_exit("No such file: %s" % e.filename)
     except symstore.CabCompressionError as e:
         err_exit("Error creating CAB\n%s" % e)
+    finally:
+        if adaptive is not None:
+            adaptive.log_summary()
+
+
+class _JsonLinesWriter:
+    def __init__(self, out):
+        self.out = out
+
+    def write(self, file_path, key, error):
+        record = dict(path=file_path)
+        if error is None:
+            record["key"] = key
+        else:
+            record["error"] = _error_text(error)
+
+        self.out.write("%s\n" % json.dumps(record))
+
+
+class _CsvWriter:
+    def __init__(self, out):
+        self.writer = csv.writer(out, lineterminator="\n")
+        self.writer.writerow(["path", "key", "error"])
+
+    def write(self, file_path, key, error):
+        if error is None:
+            self.writer.writerow([file_path, key, ""])
+        else:
+            self.writer.writerow([file_path, "", _error_text(error)])
+
+
+def hash_action(paths, output_format, workers, hash_cache):
+    """
+    write keys of specified files to stdout, as they are computed
+
+    exits with error code if any of the files failed to be hashed
+    """
+    writer_class = _CsvWriter if output_format == "csv" else _JsonLinesWriter
+    writer = writer_class(sys.stdout)
+
+    failed = False
+    for file_path, key, error in symstore.hash_files(paths, workers,
+                                                     hash_cache):
+        writer.write(file_path, key, error)
+        sys.stdout.flush()
+        failed = failed or error is not None
+
+    if failed:
+        sys.exit(1)
+
+
+def _hash_cache(cache_path):
+    if cache_path is None:
+        return None
+
+    return symstore.HashCache(cache_path)
+
+
+def _save_hash_cache(hash_cache):
+    if hash_cache is None:
+        return
+
+    hash_cache.log_summary()
+    hash_cache.save()
+
+
+def hash_main(argv):
+    args = parse_hash_args(argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    hash_cache = _hash_cache(args.hash_cache)
+    try:
+        hash_action(args.paths, args.format, args.workers, hash_cache)
+    finally:
+        _save_hash_cache(hash_cache)
+
+
+def _is_hash_command(argv):
+    """
+    check if the command line arguments select 'hash' mode
+
+    An existing symbol store in a directory named as the 'hash'
+    command is published to, rather than selecting 'hash' mode.
+    """
+    if argv[:1] != [HASH_COMMAND]:
+        return False
+
+    return not os.path.isdir(os.path.join(HASH_COMMAND,
+                                          symstore.symstore.ADMIN_DIR))
 
 
 def main():
+    if _is_hash_command(sys.argv[1:]):
+        hash_main(sys.argv[2:])
+        return
+
     args = parse_args()
 
-    sym_store = symstore.Store(args.store_path)
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
 
     if args.delete is not None:
-        delete_action(sym_store, args.delete)
+        delete_action(symstore.Store(args.store_path), args.delete)
+        return
+
+    if args.retention is not None:
+        retention_action(symstore.Store(args.store_path),
+                         args.retention, args.dry_run)
+        return
+
+    if args.rebuild_index:
+        symstore.Store(args.store_path).rebuild_refcount_index()
         return
 
     # otherwise this is an 'add' action
-    add_action(sym_store, args.files, args.product_name,
-               args.product_version, args.comment,
-               args.compress, args.max_compress,
-               args.skip_published)
+    hash_cache = _hash_cache(args.hash_cache)
+    sym_store = symstore.Store(args.store_path, hash_cache)
+
+    if args.cab_backend is not None:
+        cab.select_backend(args.cab_backend)
+
+    parallel_copy = None
+    if args.parallel_copy is not None:
+        parallel_copy = fileio.ParallelCopy(args.parallel_copy,
+                                            args.copy_chunk_size,
+                                            args.copy_concurrency)
+
+    options = symstore.PublishOptions(
+        compress_processes=args.compress_processes,
+        cpu_workers=args.cpu_workers,
+        io_workers=args.io_workers,
+        compression=args.compression,
+        link_mode=args.link_mode,
+        parallel_copy=parallel_copy,
+        checksums=args.checksums)
+
+    if args.resume:
+        resume_action(sym_store, options)
+        return
+
+    try:
+        add_action(sym_store, args.files, args.product_name,
+                   args.product_version, args.comment,
+                   args.compress, args.max_compress,
+                   args.skip_published, args.workers,
+                   options, args.min_compress_ratio)
+    finally:
+        _save_hash_cache(hash_cache)
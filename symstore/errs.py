@@ -24,3 +24,14 @@ class CabCompressionError(Exception):
     """
     raised on error creating CAB archive
     """
+
+
+class FileErrors(Exception):
+    """
+    raised when processing some of the files failed
+
+    The 'errors' member contains a list of (file path, exception) tuples,
+    one for each failed file.
+    """
+    def __init__(self, errors):
+        self.errors = errors
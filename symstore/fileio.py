@@ -1,6 +1,54 @@
+import os
+import sys
+import mmap
 import errno
+import hashlib
+import itertools
+from os import path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from symstore import errs
 
+try:
+    import fcntl
+except ImportError:
+    # not available on windows
+    fcntl = None
+
+# file publishing modes
+COPY = "copy"
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+AUTO = "auto"
+
+LINK_MODES = (COPY, HARDLINK, REFLINK, AUTO)
+
+# the FICLONE ioctl request, for creating reflinks on linux
+FICLONE = 0x40049409
+
+# amount of data copied at a time, after each chunk the
+# source file's pages are dropped from the page cache
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# size of the buffer used when copying via user space
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# defaults for parallel copying of large files
+PARALLEL_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+PARALLEL_COPY_CONCURRENCY = 4
+
+# suffix of the checksum sidecar files
+CHECKSUM_SUFFIX = ".sha256"
+
+# errors from copy_file_range() and sendfile() on which
+# we fall back to a slower copy method
+_COPY_FALLBACK_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                         errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+# errors from posix_fallocate() on which we fall back to ftruncate()
+_PREALLOCATE_FALLBACK_ERRORS = {errno.ENOSYS, errno.EINVAL,
+                                errno.EOPNOTSUPP, errno.ENOTSUP}
+
 
 def read_all(fname, mode=None):
     """
@@ -30,3 +78,499 @@ def open_rb(filepath):
             raise errs.FileNotFound(e.filename)
         # unexpected error
         raise e
+
+
+# makes temporary file names unique inside the process
+_temp_counter = itertools.count()
+
+
+def _temp_name(dest):
+    """
+    temporary file name, in the same directory as the destination file
+    """
+    return path.join(path.dirname(dest), ".%s.%s.%s.tmp" %
+                     (path.basename(dest), os.getpid(), next(_temp_counter)))
+
+
+def _replace(dest, create):
+    """
+    create a file with 'create' function at a temporary path,
+    and then atomically replace the destination file with it
+    """
+    temp_path = _temp_name(dest)
+    try:
+        create(temp_path)
+        os.replace(temp_path, dest)
+    except BaseException:
+        if path.lexists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def create_temp(dest):
+    """
+    create an empty temporary file, in the same directory as the
+    destination file
+
+    Unlike tempfile.mkstemp(), the file is created with default
+    permissions, as set by the umask, thus it can be renamed into
+    place as a published file.
+
+    :return: path to the created file
+    """
+    temp_path = _temp_name(dest)
+    os.close(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+
+    return temp_path
+
+
+def hardlink(src, dest):
+    """
+    create a hard link to the source file at the destination path,
+    replacing existing file
+    """
+    _replace(dest, lambda temp_path: os.link(src, temp_path))
+
+
+def _ficlone(src, dest):
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+
+
+def reflink(src, dest):
+    """
+    create a copy-on-write clone of the source file, replacing existing
+    file at the destination path
+
+    Only supported on linux, on file systems with reflink support,
+    for example btrfs and xfs.
+
+    :raises OSError: if reflinks are not supported
+    """
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP,
+                      "reflinks are not supported on this system")
+
+    _replace(dest, lambda temp_path: _ficlone(src, temp_path))
+
+
+def _fadvise(fd, offset, length, advice):
+    """
+    give file access pattern advice to the kernel, if supported
+
+    :param advice: name of the advice constant, e.g. 'POSIX_FADV_DONTNEED'
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+    except OSError:
+        # the advice is only a hint, ignore if it's not supported
+        pass
+
+
+def _preallocate(fd, size):
+    """
+    set file's size, allocating the disk space up front if supported
+
+    The space is allocated with posix_fallocate(), so that running out
+    of disk space is detected before copying, and the file is less
+    fragmented. On systems or file systems that don't support it, the
+    file is extended with ftruncate().
+    """
+    if size > 0 and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            if e.errno not in _PREALLOCATE_FALLBACK_ERRORS:
+                raise
+
+    os.ftruncate(fd, size)
+
+
+def _copy_file_range(src_file, dest_file, offset):
+    return os.copy_file_range(src_file.fileno(), dest_file.fileno(),
+                              COPY_CHUNK_SIZE, offset, offset)
+
+
+def _sendfile(src_file, dest_file, offset):
+    dest_file.seek(offset)
+    return os.sendfile(dest_file.fileno(), src_file.fileno(),
+                       offset, COPY_CHUNK_SIZE)
+
+
+class _BufferedCopy:
+    """
+    copies data via a page aligned buffer in user space
+
+    :param hasher: Hasher object, updated with the copied data, or None
+    """
+    def __init__(self, hasher=None):
+        self.hasher = hasher
+        self.buffer = mmap.mmap(-1, COPY_BUFFER_SIZE)
+        self.view = memoryview(self.buffer)
+
+    def close(self):
+        self.view.release()
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __call__(self, src_file, dest_file, offset):
+        src_file.seek(offset)
+        read = src_file.readinto(self.view)
+
+        if self.hasher is not None:
+            self.hasher.update(self.view[:read])
+
+        dest_file.seek(offset)
+        written = 0
+        while written < read:
+            written += dest_file.write(self.view[written:read])
+
+        return read
+
+
+def _copy_methods():
+    """
+    the kernel assisted copy functions supported on this system,
+    fastest first
+    """
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append(_copy_file_range)
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        methods.append(_sendfile)
+
+    return methods
+
+
+def _copy_data(src_file, dest_file, hasher=None):
+    """
+    copy the contents of a file
+
+    Uses copy_file_range() or sendfile() system calls if available,
+    which copy the data inside the kernel, falling back to copying
+    via a large page aligned buffer. When the data needs to be hashed,
+    it's always copied via the buffer.
+
+    :param src_file: source file, opened unbuffered for reading
+    :param dest_file: destination file, opened unbuffered for writing
+    :param hasher: Hasher object, updated with the copied data, or None
+    """
+    methods = _copy_methods() if hasher is None else []
+    src_fd = src_file.fileno()
+
+    _fadvise(src_fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+
+    offset = 0
+    try:
+        while True:
+            if not methods:
+                methods.append(_BufferedCopy(hasher))
+            copy = methods[0]
+
+            try:
+                copied = copy(src_file, dest_file, offset)
+            except OSError as e:
+                if isinstance(copy, _BufferedCopy) or \
+                        e.errno not in _COPY_FALLBACK_ERRORS:
+                    raise
+                # method not supported for these files, try the next one
+                methods.pop(0)
+                continue
+
+            if copied == 0:
+                if not isinstance(copy, _BufferedCopy):
+                    # kernel copy can stop early on some file systems,
+                    # e.g. FUSE and network file systems, or on
+                    # procfs-like files, make sure it's the end of the
+                    # file by reading it
+                    methods.clear()
+                    continue
+
+                if offset < os.fstat(src_fd).st_size:
+                    raise OSError(errno.EIO,
+                                  "unexpected end of file at offset %s" %
+                                  offset)
+                break
+
+            # the copied data will not be read again, don't keep it cached
+            _fadvise(src_fd, offset, copied, "POSIX_FADV_DONTNEED")
+            offset += copied
+    finally:
+        for method in methods:
+            if isinstance(method, _BufferedCopy):
+                method.close()
+
+    _fadvise(dest_file.fileno(), 0, 0, "POSIX_FADV_DONTNEED")
+
+
+class ParallelCopy:
+    """
+    Settings for copying large files in chunks, concurrently.
+
+    Files of at least 'threshold' bytes are split into chunks of
+    'chunk_size' bytes, which are copied by 'concurrency' threads with
+    pread() and pwrite() calls. This allows to use several concurrent
+    I/O requests when copying a single large file, which speeds up
+    copying to network file systems, such as NFS. On systems without
+    pread() and pwrite() calls, e.g. windows, files are always copied
+    sequentially.
+
+    :param threshold: minimal size of files to copy in parallel
+    :param chunk_size: size of the byte ranges copied by each thread
+    :param concurrency: number of chunks copied at the same time
+    """
+    def __init__(self, threshold, chunk_size=PARALLEL_COPY_CHUNK_SIZE,
+                 concurrency=PARALLEL_COPY_CONCURRENCY):
+        if chunk_size <= 0:
+            raise ValueError("invalid chunk size %s" % chunk_size)
+        if concurrency <= 0:
+            raise ValueError("invalid concurrency %s" % concurrency)
+
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+
+    def chunks(self, size):
+        """
+        split file of specified size into chunks
+
+        :return: list of (offset, length) tuples
+        """
+        return [(offset, min(self.chunk_size, size - offset))
+                for offset in range(0, size, self.chunk_size)]
+
+
+def _parallel_copy_supported():
+    """
+    check if files can be copied in parallel on this system, the
+    pread() and pwrite() calls are not available on windows
+    """
+    return hasattr(os, "pread") and hasattr(os, "pwrite")
+
+
+def _copy_range(src_fd, dest_fd, offset, length, keep_data):
+    """
+    copy a byte range between files with pread() and pwrite() calls,
+    which don't use the shared file position, and thus can be used
+    from multiple threads on the same file descriptors
+
+    :param keep_data: if True, return the copied data
+    :return: list of copied data blocks, if 'keep_data' is True
+    """
+    blocks = []
+    end = offset + length
+    pos = offset
+    while pos < end:
+        data = os.pread(src_fd, min(COPY_BUFFER_SIZE, end - pos), pos)
+        if not data:
+            raise OSError(errno.EIO, "unexpected end of file at offset %s" %
+                          pos)
+        if keep_data:
+            blocks.append(data)
+
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(dest_fd, view, pos)
+            view = view[written:]
+            pos += written
+
+    _fadvise(src_fd, offset, length, "POSIX_FADV_DONTNEED")
+
+    return blocks
+
+
+def _parallel_copy_data(src_file, dest_file, size, parallel, hasher=None):
+    """
+    copy file's contents in chunks, concurrently
+
+    The destination file's space is preallocated before copying. At
+    most 'concurrency' chunks are copied at a time. When hashing, the
+    chunks' data is hashed in order, as the chunks are copied.
+
+    :param src_file: source file, opened for reading
+    :param dest_file: destination file, opened for writing
+    :param size: size of the source file
+    :param parallel: ParallelCopy object
+    :param hasher: Hasher object, updated with the copied data, or None
+    """
+    src_fd = src_file.fileno()
+    dest_fd = dest_file.fileno()
+
+    # set the final size up front, so that the chunks can be written
+    # in any order, without the file being extended by each write
+    _preallocate(dest_fd, size)
+
+    def _finish(future):
+        # re-raises errors from the copying threads
+        for data in future.result():
+            hasher.update(data)
+
+    keep_data = hasher is not None
+    with ThreadPoolExecutor(parallel.concurrency) as e:
+        pending = deque()
+        for offset, length in parallel.chunks(size):
+            if len(pending) >= parallel.concurrency:
+                _finish(pending.popleft())
+            pending.append(e.submit(_copy_range, src_fd, dest_fd,
+                                    offset, length, keep_data))
+
+        while pending:
+            _finish(pending.popleft())
+
+    _fadvise(dest_fd, 0, 0, "POSIX_FADV_DONTNEED")
+
+
+def copy_file(src, dest, parallel=None, hasher=None):
+    """
+    copy file's contents, replacing existing file at the destination path
+
+    Unlike shutil.copy(), the permission bits are not copied. Copied data
+    is dropped from the page cache, so that copying large amounts of
+    data does not evict other cached data.
+
+    :param parallel: ParallelCopy object, specifying how large files are
+                     copied concurrently, None to always copy sequentially
+    :param hasher: Hasher object, updated with the copied data, or None
+    """
+    def _copy(temp_path):
+        with open(src, "rb", buffering=0) as src_file, \
+                open(temp_path, "wb", buffering=0) as dest_file:
+            size = os.fstat(src_file.fileno()).st_size
+            if parallel is not None and size >= parallel.threshold and \
+                    _parallel_copy_supported():
+                _parallel_copy_data(src_file, dest_file, size, parallel,
+                                    hasher)
+            else:
+                _copy_data(src_file, dest_file, hasher)
+
+    _replace(dest, _copy)
+
+
+def publish_file(src, dest, link_mode=COPY, parallel=None, hasher=None):
+    """
+    publish a file by copying or linking it to the destination path
+
+    In 'auto' mode, a reflink is tried first, then a hard link, falling
+    back to copying the file when neither can be created, for example
+    when the files are on different file systems.
+
+    :param link_mode: one of LINK_MODES
+    :param parallel: ParallelCopy object, used when the file is copied
+    :param hasher: Hasher object, updated with the file's contents, or None
+    :return: the method used, COPY, HARDLINK or REFLINK
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError("unknown link mode '%s'" % link_mode)
+
+    method = _publish(src, dest, link_mode, parallel, hasher)
+    if hasher is not None and method != COPY:
+        # the data was not copied, and thus not hashed
+        hasher.update_from_file(src)
+
+    return method
+
+
+def _publish(src, dest, link_mode, parallel, hasher):
+    if link_mode == HARDLINK:
+        hardlink(src, dest)
+        return HARDLINK
+
+    if link_mode == REFLINK:
+        reflink(src, dest)
+        return REFLINK
+
+    if link_mode == AUTO:
+        for method, func in ((REFLINK, reflink), (HARDLINK, hardlink)):
+            try:
+                func(src, dest)
+                return method
+            except OSError:
+                pass
+
+    copy_file(src, dest, parallel, hasher)
+    return COPY
+
+
+class Checksum:
+    """
+    SHA-256 digest and size of a file's contents
+
+    Checksums are stored in sidecar files, as a single line with the
+    hex digest and the size, separated by a space.
+    """
+    def __init__(self, sha256, size):
+        self.sha256 = sha256
+        self.size = size
+
+    @classmethod
+    def of_file(cls, file):
+        """
+        compute the checksum of a file's contents
+        """
+        hasher = Hasher()
+        hasher.update_from_file(file)
+
+        return hasher.checksum()
+
+    @classmethod
+    def load(cls, file):
+        """
+        load checksum from a sidecar file
+
+        :return: the loaded checksum, or None if the sidecar file does not
+                 exist or is malformed
+        """
+        try:
+            sha256, size = read_all(file).split()
+            return cls(sha256, int(size))
+        except (OSError, ValueError):
+            return None
+
+    def save(self, file):
+        """
+        atomically write the checksum to a sidecar file
+        """
+        def _write(temp_path):
+            with open(temp_path, "w") as f:
+                f.write("%s %s\n" % (self.sha256, self.size))
+
+        _replace(file, _write)
+
+    def __eq__(self, other):
+        return isinstance(other, Checksum) and \
+            (self.sha256, self.size) == (other.sha256, other.size)
+
+    def __repr__(self):
+        return "Checksum(%r, %r)" % (self.sha256, self.size)
+
+
+class Hasher:
+    """
+    computes a Checksum of the data, as it's being read or copied
+    """
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self._size = 0
+
+    def update(self, data):
+        self._sha256.update(data)
+        self._size += len(data)
+
+    def update_from_file(self, file):
+        with open(file, "rb", buffering=0) as f:
+            buffer = bytearray(COPY_BUFFER_SIZE)
+            view = memoryview(buffer)
+            for read in iter(lambda: f.readinto(view), 0):
+                self.update(view[:read])
+
+    def checksum(self):
+        return Checksum(self._sha256.hexdigest(), self._size)
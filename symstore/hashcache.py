@@ -0,0 +1,167 @@
+"""
+persistent cache of files symstore hashes
+"""
+import os
+import json
+import logging
+import tempfile
+import threading
+from os import path
+from collections import OrderedDict
+from symstore import errs
+
+log = logging.getLogger(__name__)
+
+# default maximum number of files to keep in the cache
+DEFAULT_MAX_ENTRIES = 100000
+
+# cache file format version
+FORMAT_VERSION = 1
+
+
+def _file_key(fname):
+    """
+    get the cache key for a file
+
+    The key is made of the file's device, inode, size, modification
+    time and absolute path, so that any modification of the file,
+    or replacing it with another file, gives a new key.
+
+    :raises symstore.FileNotFound: if specified file does not exist
+    """
+    try:
+        st = os.stat(fname)
+    except FileNotFoundError as e:
+        raise errs.FileNotFound(e.filename)
+
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns,
+            path.abspath(fname))
+
+
+class HashCache:
+    """
+    On-disk cache of files hashes, used to avoid parsing files
+    that have not changed since the last time they were hashed.
+
+    The cache keeps up to max_entries files, evicting least recently
+    used files when it grows larger. The cache is loaded from disk on
+    first access, and must be explicitly written back with save().
+    It can also be used as a context manager, which saves the cache
+    on exit.
+
+    The number of cache hits and misses are available via 'hits' and
+    'misses' members, and can be logged with log_summary().
+
+    :param cache_path: the cache file path
+    :param max_entries: maximum number of files to keep in the cache
+    """
+    def __init__(self, cache_path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.save()
+
+    def _load(self):
+        entries = OrderedDict()
+
+        try:
+            with open(self.cache_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return entries
+        except ValueError:
+            # corrupt cache file, start from scratch
+            return entries
+
+        if not isinstance(data, dict) or \
+                data.get("version") != FORMAT_VERSION:
+            return entries
+
+        try:
+            for dev, ino, size, mtime_ns, fpath, file_hash in \
+                    data["entries"]:
+                entries[(dev, ino, size, mtime_ns, fpath)] = file_hash
+        except (KeyError, TypeError, ValueError):
+            # corrupt cache file, start from scratch
+            return OrderedDict()
+
+        return entries
+
+    def _get_entries(self):
+        if self._entries is None:
+            self._entries = self._load()
+
+        return self._entries
+
+    def file_hash(self, fname, hash_func):
+        """
+        get file's hash
+
+        Looks up file's hash in the cache, if it's not cached
+        the hash is calculated with hash_func and stored in the cache.
+
+        :param fname: file path
+        :param hash_func: function calculating the hash, invoked with
+                          the file path as argument
+        """
+        key = _file_key(fname)
+
+        with self._lock:
+            entries = self._get_entries()
+            file_hash = entries.get(key)
+            if file_hash is not None:
+                self.hits += 1
+                entries.move_to_end(key)
+                return file_hash
+
+            self.misses += 1
+
+        file_hash = hash_func(fname)
+
+        with self._lock:
+            entries[key] = file_hash
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+        return file_hash
+
+    def log_summary(self):
+        """
+        log the number of cache hits and misses
+        """
+        log.info("hash cache: %s hits, %s misses", self.hits, self.misses)
+
+    def save(self):
+        """
+        write the cache to disk
+        """
+        with self._lock:
+            if self._entries is None:
+                # cache was never used, nothing to save
+                return
+
+            data = dict(version=FORMAT_VERSION,
+                        entries=[list(key) + [file_hash]
+                                 for key, file_hash in self._entries.items()])
+
+        cache_dir = path.dirname(path.abspath(self.cache_path))
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # write to a temporary file and rename it over the cache file,
+        # so that cache is not corrupted by interrupted writes
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.cache_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
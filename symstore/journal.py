@@ -0,0 +1,150 @@
+"""
+journal of the transaction being committed, used to resume interrupted
+commits
+"""
+import os
+import json
+import time
+from os import path
+
+
+class PublishJournal:
+    """
+    Records the entries of the transaction being committed, and which of
+    them have been published.
+
+    The journal is a JSON lines file. The first line describes the
+    transaction, followed by one line for each entry. As the entries are
+    published, lines marking them as done are appended.
+
+    The lines marking entries as done are written to the file right away,
+    so that the journal survives the process being killed in the middle
+    of a commit. To avoid waiting for the disk on each published entry,
+    they are flushed to disk after every 'sync_entries' entries or
+    'sync_interval' seconds, and when the journal is closed. Thus, if the
+    system crashes, the last few entries may be published again.
+
+    :param file_path: journal file path
+    """
+    sync_entries = 64
+    sync_interval = 1.0
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        # the indexes of the published entries
+        self.done = set()
+        # file the 'done' lines are appended to
+        self._file = None
+        self._unsynced = 0
+        self._synced_at = 0.0
+
+    def exists(self):
+        return path.isfile(self.file_path)
+
+    def _write(self, mode, records):
+        with open(self.file_path, mode) as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def create(self, transaction_id, transaction):
+        """
+        start a new journal, listing transaction's entries as not published
+
+        Replaces any existing journal.
+        """
+        header = dict(id=transaction_id,
+                      product=transaction.product,
+                      version=transaction.version,
+                      comment=transaction.comment,
+                      entries=len(transaction.entries))
+        entries = [dict(file_name=entry.file_name,
+                        file_hash=entry.file_hash,
+                        source_file=path.abspath(entry.source_file),
+                        compressed=entry.compressed)
+                   for entry in transaction.entries]
+
+        self.close()
+        self.done = set()
+        self._write("w", [header] + entries)
+
+    def load(self):
+        """
+        load the journal from disk
+
+        Sets the 'done' member to the indexes of the published entries.
+
+        :return: (transaction record, list of entry records) tuple, where
+                 the records are dictionaries, or None if there is no
+                 journal, or it was not completely written
+        """
+        if not self.exists():
+            return None
+
+        with open(self.file_path) as f:
+            lines = f.readlines()
+
+        try:
+            header = json.loads(lines[0])
+            num_entries = header["entries"]
+            entries = [json.loads(line) for line in lines[1:num_entries + 1]]
+        except (IndexError, KeyError, ValueError):
+            return None
+
+        if len(entries) != num_entries:
+            # the journal was not completely written
+            return None
+
+        done = set()
+        for line in lines[num_entries + 1:]:
+            try:
+                done.add(json.loads(line)["done"])
+            except (KeyError, ValueError):
+                # the last line was not completely written,
+                # the entry will be published again
+                break
+
+        self.done = done
+        return header, entries
+
+    def mark_done(self, index):
+        """
+        record that the entry with the index have been published
+        """
+        if self._file is None:
+            self._file = open(self.file_path, "a")
+            self._synced_at = time.monotonic()
+
+        self._file.write(json.dumps(dict(done=index)) + "\n")
+        self._file.flush()
+        self.done.add(index)
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_entries or \
+                time.monotonic() - self._synced_at >= self.sync_interval:
+            self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        """
+        flush the entries marked as done to disk, and close the file
+        """
+        if self._file is None:
+            return
+
+        try:
+            if self._unsynced > 0:
+                self._sync()
+        finally:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if self.exists():
+            os.remove(self.file_path)
@@ -0,0 +1,174 @@
+"""
+reading lines of append-only text files, like the history file,
+without loading the whole file
+"""
+import os
+
+# the size of the blocks to read, when reading the lines backwards
+BLOCK_SIZE = 64 * 1024
+
+# by default, index every this many lines
+INDEX_STEP = 1024
+
+
+def _strip(line):
+    return line.rstrip(b"\r\n")
+
+
+def iter_lines(file, offset=0):
+    """
+    read lines forward, starting from the offset
+
+    Empty lines are skipped.
+
+    :param file: seekable file object, opened in binary mode
+    :param offset: the offset of the first line to read
+    :return: iterator of (offset, line) tuples, where the lines are
+             bytes without line terminators
+    """
+    file.seek(offset)
+    for line in file:
+        stripped = _strip(line)
+        if stripped:
+            yield offset, stripped
+        offset += len(line)
+
+
+def iter_lines_reversed(file):
+    """
+    read lines backwards, starting from the end of the file
+
+    The file is read in blocks, from the end. Empty lines are skipped.
+
+    :param file: seekable file object, opened in binary mode
+    :return: iterator of lines, as bytes without line terminators
+    """
+    pos = file.seek(0, os.SEEK_END)
+    # the beginning of the line, which start is not read yet
+    head = b""
+    while pos > 0:
+        size = min(BLOCK_SIZE, pos)
+        pos -= size
+        file.seek(pos)
+
+        lines = (file.read(size) + head).split(b"\n")
+        head = lines[0]
+        for line in reversed(lines[1:]):
+            stripped = _strip(line)
+            if stripped:
+                yield stripped
+
+    stripped = _strip(head)
+    if stripped:
+        yield stripped
+
+
+def bisect_lines(file, key):
+    """
+    find the first line with key greater than the specified key, in
+    lines sorted by their keys
+
+    The key of a line is the text up to the first comma. The lines are
+    binary searched, only reading the lines on the search path.
+
+    :param file: seekable file object, opened in binary mode
+    :param key: the key, as bytes
+    :return: the offset of the line, or the file size if all lines
+             have keys less than or equal to the key
+    """
+    # 'lo' is a line start, all lines starting before 'lo' have keys less
+    # or equal to the key, lines starting at 'hi' or later have keys
+    # greater than the key
+    lo = 0
+    hi = file.seek(0, os.SEEK_END)
+    while lo < hi:
+        mid = (lo + hi) // 2
+
+        # skip to the first line starting at 'mid' or later
+        file.seek(max(mid - 1, 0))
+        if mid > 0:
+            file.readline()
+        start = file.tell()
+
+        if start >= hi:
+            hi = mid
+            continue
+
+        line = file.readline()
+        if _strip(line).split(b",", 1)[0] <= key:
+            lo = start + len(line)
+        else:
+            hi = start
+
+    return lo
+
+
+class SparseLineIndex:
+    """
+    The offsets of every 'step'-th non-empty line of an append-only file.
+
+    Allows to locate a line by it's number, by reading at most 'step'
+    lines. The index is built by reading the file once, and is then
+    extended with the lines appended to the file. If the file shrinks,
+    it's assumed to be rewritten and is indexed again.
+
+    :param step: index every this many lines
+    """
+    def __init__(self, step=INDEX_STEP):
+        self.step = step
+        self._reset()
+
+    def _reset(self):
+        # the offsets of lines 0, step, 2 * step, ...
+        self._offsets = []
+        # the number of indexed lines
+        self._num_lines = 0
+        # the end of the last indexed line
+        self._end = 0
+        # the number of the lines after the last indexed line,
+        # e.g. the last line, which is not terminated yet
+        self._num_partial = 0
+
+    def update(self, file):
+        """
+        index the lines appended to the file since last update
+
+        :param file: seekable file object, opened in binary mode
+        """
+        size = file.seek(0, os.SEEK_END)
+        if size < self._end:
+            self._reset()
+
+        self._num_partial = 0
+        offset = self._end
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b"\n"):
+                # the last line may get more data appended to it,
+                # only index complete lines
+                self._num_partial = 1 if _strip(line) else 0
+                break
+
+            if _strip(line):
+                if self._num_lines % self.step == 0:
+                    self._offsets.append(offset)
+                self._num_lines += 1
+
+            offset += len(line)
+            self._end = offset
+
+    def __len__(self):
+        return self._num_lines + self._num_partial
+
+    def locate(self, line_num):
+        """
+        locate a line by it's number
+
+        :return: (offset, skip) tuple, where the line is the 'skip'-th
+                 non-empty line, following the offset
+        """
+        block = line_num // self.step
+        if block < len(self._offsets):
+            return self._offsets[block], line_num % self.step
+
+        return self._end, line_num - self._num_lines
@@ -0,0 +1,519 @@
+"""
+pure python LZX decompression, as used in CAB archives
+
+The decoder follows the LZX format, as described in [MS-PATCH] LZX DELTA
+compression and decompression specification, and as implemented by
+libmspack. Delta compression and reset intervals are not supported, as
+they are not used by CAB archives.
+
+The compressed data is decoded one 32 KiB frame at a time, only the
+window of previously decoded data is kept in memory.
+"""
+from collections import deque
+
+MIN_MATCH = 2
+NUM_CHARS = 256
+NUM_PRIMARY_LENGTHS = 7
+NUM_SECONDARY_LENGTHS = 249
+PRETREE_NUM_ELEMENTS = 20
+ALIGNED_NUM_ELEMENTS = 8
+
+# amount of uncompressed data in each frame
+FRAME_SIZE = 32768
+
+# translation of E8 call instructions is only done in the first
+# 32768 frames of the data
+MAX_E8_FRAMES = 32768
+
+BLOCKTYPE_VERBATIM = 1
+BLOCKTYPE_ALIGNED = 2
+BLOCKTYPE_UNCOMPRESSED = 3
+
+# number of position slots, for each supported window size
+POSITION_SLOTS = {
+    15: 30,
+    16: 32,
+    17: 34,
+    18: 36,
+    19: 38,
+    20: 42,
+    21: 50,
+}
+
+# number of extra bits and the base position of each position slot
+EXTRA_BITS = [min(max(i // 2 - 1, 0), 17) for i in range(51)]
+POSITION_BASE = [0]
+for _bits in EXTRA_BITS[:-1]:
+    POSITION_BASE.append(POSITION_BASE[-1] + (1 << _bits))
+
+# maximum number of bytes to load into bit buffer at once
+PREFETCH_SIZE = 64
+
+# allowed number of zero bytes to pad the input with, when the
+# decoder reads beyond the end of the input
+MAX_INPUT_PADDING = 2
+
+
+class LZXError(Exception):
+    """
+    raised on errors in the compressed data
+    """
+
+
+def _make_table(lengths):
+    """
+    build the lookup table for decoding canonical Huffman codes
+
+    The table is indexed with the next 'bits' bits of the input, and
+    contains (symbol, code length) tuples.
+
+    :param lengths: code lengths of all symbols, 0 for unused symbols
+    :return: (table, bits) tuple, the table is None when no
+             symbols are used
+    """
+    bits = max(lengths)
+    if bits == 0:
+        return None, 0
+
+    table = [None] * (1 << bits)
+
+    code = 0
+    prev_length = 0
+    symbols = sorted((length, sym)
+                     for sym, length in enumerate(lengths) if length > 0)
+    for length, sym in symbols:
+        code <<= length - prev_length
+        prev_length = length
+
+        span = 1 << (bits - length)
+        start = code << (bits - length)
+        if start + span > len(table):
+            raise LZXError("invalid Huffman code lengths")
+
+        table[start:start + span] = [(sym, length)] * span
+        code += 1
+
+    return table, bits
+
+
+class _BitReader:
+    """
+    reads the LZX bitstream, which is made of 16-bit little-endian words,
+    where the bits are read starting from the most significant bit
+
+    :param read_input: function returning next chunk of input data,
+                       or empty bytes at the end of the input
+    """
+    def __init__(self, read_input):
+        self.read_input = read_input
+        self.chunks = deque()
+        self.data = b""
+        self.pos = 0
+        self.padding = 0
+        self.bitbuf = 0
+        self.bitcount = 0
+
+    def feed(self, data):
+        self.chunks.append(data)
+
+    def _fill(self, size):
+        """
+        make sure there are at least 'size' bytes of input available
+        """
+        while len(self.data) - self.pos < size:
+            chunk = self.chunks.popleft() if self.chunks \
+                else self.read_input()
+
+            if not chunk:
+                # pad the end of input with zeros
+                self.padding += size
+                if self.padding > MAX_INPUT_PADDING:
+                    raise LZXError("unexpected end of compressed data")
+                chunk = b"\0" * size
+
+            # keep the bytes loaded into the bit buffer,
+            # in case we need to rewind to them
+            keep = max(0, self.pos - (self.bitcount + 15) // 16 * 2)
+            self.data = self.data[keep:] + chunk
+            self.pos -= keep
+
+    def ensure(self, num_bits):
+        while self.bitcount < num_bits:
+            # load up to PREFETCH_SIZE bytes of already available input
+            size = min(len(self.data) - self.pos, PREFETCH_SIZE) & ~1
+            if size == 0:
+                self._fill(2)
+                size = 2
+
+            pos = self.pos
+            words = self.data[pos:pos + size]
+            swapped = bytearray(size)
+            swapped[0::2] = words[1::2]
+            swapped[1::2] = words[0::2]
+
+            # drop the already consumed bits, as the bits are not
+            # masked out when removed from the buffer
+            self.bitbuf = \
+                ((self.bitbuf & ((1 << self.bitcount) - 1)) << (size * 8)) | \
+                int.from_bytes(swapped, "big")
+            self.bitcount += size * 8
+            self.pos = pos + size
+
+    def read(self, num_bits):
+        if num_bits == 0:
+            return 0
+
+        self.ensure(num_bits)
+        self.bitcount -= num_bits
+
+        return (self.bitbuf >> self.bitcount) & ((1 << num_bits) - 1)
+
+    def remove(self, num_bits):
+        self.bitcount -= num_bits
+
+    def decode(self, table, bits):
+        """
+        read one Huffman coded symbol
+        """
+        self.ensure(16)
+        entry = table[(self.bitbuf >> (self.bitcount - bits)) &
+                      ((1 << bits) - 1)]
+        if entry is None:
+            raise LZXError("invalid Huffman code")
+
+        sym, length = entry
+        self.bitcount -= length
+
+        return sym
+
+    def reset(self):
+        """
+        drop all buffered bits
+        """
+        self.bitbuf = 0
+        self.bitcount = 0
+
+    def align_bytes(self):
+        """
+        align to the next 16-bit boundary, dropping at least one bit,
+        and switch to reading bytes directly from the input
+        """
+        partial = self.bitcount % 16
+        if partial == 0:
+            self.ensure(16)
+            partial = 16
+
+        # rewind the input to the first unused whole word
+        self.pos -= (self.bitcount - partial) // 8
+        self.reset()
+
+    def read_bytes(self, size):
+        """
+        read bytes directly from the input, bypassing the bit buffer
+        """
+        self._fill(size)
+        data = self.data[self.pos:self.pos + size]
+        self.pos += size
+
+        return data
+
+
+class LZXDecoder:
+    """
+    LZX decoder, for decompressing data of one CAB folder
+
+    The compressed data is supplied with feed() method, or by read_input
+    function, which is invoked when more data is needed.
+
+    :param window_bits: the LZX window size, as power of 2
+    :param read_input: function returning next chunk of input data,
+                       or empty bytes at the end of the input
+    """
+    def __init__(self, window_bits, read_input=lambda: b""):
+        if window_bits not in POSITION_SLOTS:
+            raise LZXError("unsupported window size %s" % window_bits)
+
+        self.window_size = 1 << window_bits
+        self.main_elements = NUM_CHARS + POSITION_SLOTS[window_bits] * 8
+
+        self.bits = _BitReader(read_input)
+        self.window = bytearray()
+
+        self.header_read = False
+        self.intel_filesize = 0
+        self.intel_started = False
+        self.intel_curpos = 0
+        self.frame = 0
+
+        self.block_type = None
+        self.block_length = 0
+        self.block_remaining = 0
+
+        self.main_lengths = [0] * self.main_elements
+        self.length_lengths = [0] * NUM_SECONDARY_LENGTHS
+        self.main_table = self.length_table = self.aligned_table = None
+        self.main_bits = self.length_bits = self.aligned_bits = 0
+
+        self.r0 = self.r1 = self.r2 = 1
+
+    def feed(self, data):
+        """
+        supply more compressed data
+        """
+        self.bits.feed(data)
+
+    def _read_lengths(self, lengths, first, last):
+        """
+        read delta encoded code lengths, using the pretree
+        """
+        bits = self.bits
+        pretree, pretree_bits = _make_table(
+            [bits.read(4) for _ in range(PRETREE_NUM_ELEMENTS)])
+        if pretree is None:
+            raise LZXError("empty pretree")
+
+        x = first
+        while x < last:
+            z = bits.decode(pretree, pretree_bits)
+            if z == 17:
+                run = bits.read(4) + 4
+                lengths[x:x + run] = [0] * run
+            elif z == 18:
+                run = bits.read(5) + 20
+                lengths[x:x + run] = [0] * run
+            elif z == 19:
+                run = bits.read(1) + 4
+                z = bits.decode(pretree, pretree_bits)
+                z = (lengths[x] - z) % 17
+                lengths[x:x + run] = [z] * run
+            else:
+                run = 1
+                lengths[x] = (lengths[x] - z) % 17
+
+            x += run
+
+        # runs must not extend beyond the last element
+        if x > last:
+            raise LZXError("invalid code lengths run")
+
+    def _read_block_header(self):
+        bits = self.bits
+
+        if self.block_type == BLOCKTYPE_UNCOMPRESSED:
+            # uncompressed blocks are padded to even number of bytes
+            if self.block_length & 1:
+                bits.read_bytes(1)
+            bits.reset()
+
+        self.block_type = bits.read(3)
+        self.block_length = (bits.read(16) << 8) | bits.read(8)
+        self.block_remaining = self.block_length
+
+        if self.block_type == BLOCKTYPE_ALIGNED:
+            self.aligned_table, self.aligned_bits = _make_table(
+                [bits.read(3) for _ in range(ALIGNED_NUM_ELEMENTS)])
+            if self.aligned_table is None:
+                raise LZXError("empty aligned offsets tree")
+
+        if self.block_type in (BLOCKTYPE_VERBATIM, BLOCKTYPE_ALIGNED):
+            self._read_lengths(self.main_lengths, 0, NUM_CHARS)
+            self._read_lengths(self.main_lengths,
+                               NUM_CHARS, self.main_elements)
+            self.main_table, self.main_bits = \
+                _make_table(self.main_lengths)
+            if self.main_table is None:
+                raise LZXError("empty main tree")
+
+            if self.main_lengths[0xE8] != 0:
+                self.intel_started = True
+
+            self._read_lengths(self.length_lengths,
+                               0, NUM_SECONDARY_LENGTHS)
+            self.length_table, self.length_bits = \
+                _make_table(self.length_lengths)
+        elif self.block_type == BLOCKTYPE_UNCOMPRESSED:
+            self.intel_started = True
+
+            bits.align_bytes()
+
+            r = bits.read_bytes(12)
+            self.r0 = int.from_bytes(r[0:4], "little")
+            self.r1 = int.from_bytes(r[4:8], "little")
+            self.r2 = int.from_bytes(r[8:12], "little")
+        else:
+            raise LZXError("invalid block type %s" % self.block_type)
+
+    def _decode_compressed(self, run):
+        """
+        decode verbatim or aligned block's data
+
+        :param run: number of bytes to decode
+        :return: number of bytes actually decoded, can be larger then
+                 requested if the last match overruns the run
+        """
+        bits = self.bits
+        window = self.window
+        aligned = self.block_type == BLOCKTYPE_ALIGNED
+        main_table, main_bits = self.main_table, self.main_bits
+        r0, r1, r2 = self.r0, self.r1, self.r2
+
+        main_mask = (1 << main_bits) - 1
+        append = window.append
+
+        start = len(window)
+        end = start + run
+        pos = start
+
+        # for speed, literals are decoded using local copies
+        # of the bit buffer state
+        bitbuf, bitcount = bits.bitbuf, bits.bitcount
+
+        while pos < end:
+            if bitcount < 16:
+                bits.bitbuf, bits.bitcount = bitbuf, bitcount
+                bits.ensure(16)
+                bitbuf, bitcount = bits.bitbuf, bits.bitcount
+
+            entry = main_table[(bitbuf >> (bitcount - main_bits)) & main_mask]
+            if entry is None:
+                raise LZXError("invalid Huffman code")
+            sym, length = entry
+            bitcount -= length
+
+            if sym < NUM_CHARS:
+                append(sym)
+                pos += 1
+                continue
+
+            bits.bitbuf, bits.bitcount = bitbuf, bitcount
+            sym -= NUM_CHARS
+
+            length = sym & NUM_PRIMARY_LENGTHS
+            if length == NUM_PRIMARY_LENGTHS:
+                if self.length_table is None:
+                    raise LZXError("empty length tree")
+                length += bits.decode(self.length_table, self.length_bits)
+            length += MIN_MATCH
+
+            slot = sym >> 3
+            if slot > 2:
+                extra = EXTRA_BITS[slot]
+                offset = POSITION_BASE[slot] - 2
+                if not aligned:
+                    offset += bits.read(extra)
+                elif extra > 3:
+                    offset += bits.read(extra - 3) << 3
+                    offset += bits.decode(self.aligned_table,
+                                          self.aligned_bits)
+                elif extra == 3:
+                    offset += bits.decode(self.aligned_table,
+                                          self.aligned_bits)
+                else:
+                    offset += bits.read(extra)
+
+                r2, r1, r0 = r1, r0, offset
+            elif slot == 0:
+                offset = r0
+            elif slot == 1:
+                offset = r1
+                r1, r0 = r0, offset
+            else:
+                offset = r2
+                r2, r0 = r0, offset
+
+            if offset > len(window) or offset == 0:
+                raise LZXError("match offset beyond start of data")
+
+            # copy the match, repeating the copied data
+            # if the match overlaps the position being written
+            src = len(window) - offset
+            if offset >= length:
+                window += window[src:src + length]
+            else:
+                pattern = window[src:]
+                window += (pattern * (length // offset + 1))[:length]
+
+            pos = len(window)
+            bitbuf, bitcount = bits.bitbuf, bits.bitcount
+
+        bits.bitbuf, bits.bitcount = bitbuf, bitcount
+        self.r0, self.r1, self.r2 = r0, r1, r2
+
+        return len(window) - start
+
+    def _e8_translate(self, data):
+        """
+        undo the translation of x86 CALL instruction offsets
+        """
+        size = len(data)
+        if not self.intel_started or self.intel_filesize == 0 or \
+                self.frame >= MAX_E8_FRAMES or size <= 10:
+            return
+
+        filesize = self.intel_filesize
+        curpos = self.intel_curpos
+        i = data.find(b"\xe8", 0, size - 10)
+        while i >= 0:
+            pos = curpos + i
+            abs_off = int.from_bytes(data[i + 1:i + 5], "little", signed=True)
+            if -pos <= abs_off < filesize:
+                if abs_off >= 0:
+                    rel_off = abs_off - pos
+                else:
+                    rel_off = abs_off + filesize
+                data[i + 1:i + 5] = (rel_off & 0xFFFFFFFF).to_bytes(4,
+                                                                    "little")
+            i = data.find(b"\xe8", i + 5, size - 10)
+
+    def decompress(self, frame_size=FRAME_SIZE):
+        """
+        decompress next frame of data
+
+        :param frame_size: the size of uncompressed frame, must be
+                           FRAME_SIZE for all frames except the last one
+
+        :return: uncompressed data, as bytearray
+        """
+        bits = self.bits
+
+        if not self.header_read:
+            if bits.read(1):
+                self.intel_filesize = (bits.read(16) << 16) | bits.read(16)
+            self.header_read = True
+
+        frame_start = len(self.window)
+        todo = frame_size
+
+        while todo > 0:
+            if self.block_remaining == 0:
+                self._read_block_header()
+
+            run = min(self.block_remaining, todo)
+            if self.block_type == BLOCKTYPE_UNCOMPRESSED:
+                self.window += bits.read_bytes(run)
+            else:
+                run = self._decode_compressed(run)
+                if run > self.block_remaining:
+                    raise LZXError("match overruns the block")
+
+            self.block_remaining -= run
+            todo -= run
+
+        if todo != 0:
+            raise LZXError("match overruns the frame")
+
+        # re-align bitstream to 16-bit boundary
+        if bits.bitcount > 0:
+            bits.ensure(16)
+        bits.remove(bits.bitcount & 15)
+
+        data = self.window[frame_start:]
+        self._e8_translate(data)
+        self.intel_curpos += frame_size
+        self.frame += 1
+
+        # only keep the data that can be referenced by the following frames
+        if len(self.window) > self.window_size + FRAME_SIZE:
+            del self.window[:len(self.window) - self.window_size]
+
+        return data
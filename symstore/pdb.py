@@ -1,14 +1,31 @@
+import sys
 import math
+import mmap
+import array
 import struct
+from contextlib import contextmanager
+from symstore import errs
 from symstore import fileio
 
 SIGNATURE = b"Microsoft C/C++ MSF 7.00\r\n\x1ADS\0\0\0"
 
+# size value used in the stream directory for deleted ('nil') streams,
+# such streams don't occupy any pages
+NIL_STREAM_SIZE = 0xFFFFFFFF
+
+# offset of the root stream's index page list, it starts
+# 5 int fields after the signature
+ROOT_INDEX_OFFSET = len(SIGNATURE) + 4*5
+
 
 class PDBInvalidSignature(Exception):
     pass
 
 
+class PDBFormatError(errs.FileFormatError):
+    format_name = "PDB"
+
+
 def pages(size, page_size):
     """
     calculate number of pages that are required to store the specified
@@ -20,56 +37,186 @@ def pages(size, page_size):
     return int(math.ceil(float(size)/page_size))
 
 
+def _stream_pages_num(size, page_size):
+    """
+    number of pages occupied by a stream of specified size
+    """
+    if size == NIL_STREAM_SIZE:
+        return 0
+
+    return pages(size, page_size)
+
+
+def _u32_array(data):
+    """
+    decode an array of little-endian 32-bit unsigned integers
+
+    On little-endian hosts the data is not copied, a memoryview cast
+    over the data is returned.
+
+    :param data: bytes-like object, its size must be a multiple of 4
+    """
+    view = memoryview(data)
+    if len(view) % 4 != 0:
+        raise PDBFormatError("truncated integer array")
+
+    if sys.byteorder == "little":
+        return view.cast("I")
+
+    arr = array.array("I", view.tobytes())
+    arr.byteswap()
+    return arr
+
+
+@contextmanager
+def _map_file(fp):
+    """
+    map opened file into memory
+
+    Falls back to reading the whole file, if the file can't be memory
+    mapped, for example if it is empty.
+    """
+    try:
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        yield fp.read()
+        return
+
+    try:
+        yield data
+    finally:
+        try:
+            data.close()
+        except BufferError:
+            # some views of the mapped data are still alive,
+            # the mapping will be closed when they are garbage collected
+            pass
+
+
+class Pages:
+    """
+    Provides access to the pages of a PDB file, as zero-copy
+    memoryview slices of the file's data.
+    """
+    def __init__(self, data, page_size):
+        self.data = data
+        self.page_size = page_size
+        self._view = None
+
+    def page(self, page_num, start=0, end=None):
+        """
+        get contents of a page
+
+        :param page_num: page number
+        :param start: first byte inside the page
+        :param end: end of the range inside the page, None for page's end
+        """
+        if self._view is None:
+            self._view = memoryview(self.data)
+
+        if end is None:
+            end = self.page_size
+
+        offset = page_num * self.page_size
+        if offset + end > len(self._view):
+            raise PDBFormatError("page %s beyond end of file" % page_num)
+
+        return self._view[offset + start:offset + end]
+
+
+class Stream:
+    """
+    A lazy view of a PDB stream. Maps stream offsets to the pages
+    the stream is stored in, and reads only the pages that
+    are accessed.
+    """
+    def __init__(self, pages, size, page_numbers):
+        self.pages = pages
+        self.size = size
+        self.page_numbers = page_numbers
+
+    def __len__(self):
+        return self.size
+
+    def read(self, start, length):
+        """
+        read stream bytes
+
+        If requested range is stored inside a single page, a memoryview
+        of the page is returned, otherwise the data is copied into
+        a new bytes object.
+
+        :param start: the offset in the stream where to read
+        :param length: number of bytes to read
+
+        :return: bytes-like object
+        """
+        page_size = self.pages.page_size
+
+        if start + length > len(self.page_numbers) * page_size:
+            raise PDBFormatError("read beyond the pages of the stream")
+
+        page = start // page_size
+        page_start = start % page_size
+
+        if page_start + length <= page_size:
+            return self.pages.page(self.page_numbers[page],
+                                   page_start, page_start + length)
+
+        chunks = []
+        while length > 0:
+            partial_size = min(length, page_size - page_start)
+            chunks.append(self.pages.page(self.page_numbers[page],
+                                          page_start,
+                                          page_start + partial_size))
+            length -= partial_size
+            page += 1
+            page_start = 0
+
+        return b"".join(chunks)
+
+
 class Root:
     """
     A bare bones abstraction of the root stream of an PDB files. Provides
     methods to read raw chunks of the root stream, as well as accessing
     data about streams containing streams.
+
+    :param data: PDB file's contents, as a bytes-like object,
+                 typically a memory map of the file
     """
-    def __init__(self, fp, page_size, size):
-        self.fp = fp
+    def __init__(self, data, page_size, size):
+        self.pages = Pages(data, page_size)
         self.page_size = page_size
         self.size = size
-        self._pages_idx = None
+        self._stream = None
+        self._sizes = None
+        self._pages_offsets = None
 
     def _load_pages(self):
         """
         get page numbers used by the root stream
         """
         num_pages = pages(self.size, self.page_size)
-
-        # root stream indexes starts 5 int pointers after the signature
-        self.fp.seek(len(SIGNATURE) + 4*5)
         num_root_index_pages = pages(num_pages * 4, self.page_size)
 
-        root_index_pages = struct.unpack(
-            "<%sI" % num_root_index_pages,
-            self.fp.read(4*num_root_index_pages))
+        if ROOT_INDEX_OFFSET + 4*num_root_index_pages > self.page_size:
+            raise PDBFormatError("root stream too large")
 
-        # read in the root page list
-        root_page_data = b""
-        for root_index in root_index_pages:
-            self.fp.seek(root_index * self.page_size)
-            root_page_data += self.fp.read(self.page_size)
+        # the root stream page list is stored in 'root index' pages,
+        # which are listed after the header fields
+        root_index_pages = _u32_array(
+            self.pages.page(0, ROOT_INDEX_OFFSET,
+                            ROOT_INDEX_OFFSET + 4*num_root_index_pages))
 
-        page_list_fmt = "<" + ("%dI" % num_pages)
-        return struct.unpack(page_list_fmt, root_page_data[:num_pages*4])
+        index = Stream(self.pages, num_pages * 4, root_index_pages)
+        return _u32_array(index.read(0, num_pages * 4))
 
-    def _pages(self):
-        if self._pages_idx is None:
-            self._pages_idx = self._load_pages()
+    def _root_stream(self):
+        if self._stream is None:
+            self._stream = Stream(self.pages, self.size, self._load_pages())
 
-        return self._pages_idx
-
-    def _seek(self, page, byte):
-        """
-        move the root stream to a new position
-
-        :param page: move to this page
-        :param byte: move to the offset in the specified page
-        """
-        offset = self._pages()[page] * self.page_size + byte
-        self.fp.seek(offset)
+        return self._stream
 
     def read(self, start, length):
         """
@@ -78,31 +225,50 @@ class Root:
         :param start: the global offset where to read
         :param length: number of bytes to read
 
-        :return: root bytes as an bytes array
+        :return: root bytes as an bytes-like object
         """
+        return self._root_stream().read(start, length)
 
-        start_page = start // self.page_size
-        start_byte = start % self.page_size
+    def _load_directory(self):
+        """
+        decode the stream directory
 
-        self._seek(start_page, start_byte)
+        Reads all stream sizes in one go and calculates the offset of each
+        stream's page list inside the root stream. The offsets are prefix
+        sums of the streams page list sizes, so that any stream can be
+        looked up without walking the preceding streams.
+        """
+        num_streams = struct.unpack("<I", self.read(0, 4))[0]
+        if 4 + 4 * num_streams > self.size:
+            raise PDBFormatError("stream sizes beyond end of root stream")
 
-        partial_size = min(length, self.page_size - start_byte)
-        result = self.fp.read(partial_size)
-        length -= partial_size
-        while 0 < length:
-            start_page += 1
-            self._seek(start_page, 0)
-            partial_size = min(self.page_size, length)
-            result += self.fp.read(partial_size)
-            length -= partial_size
-        return result
+        sizes = _u32_array(self.read(4, 4 * num_streams))
+
+        offsets = []
+        pages_offset = 4 + 4 * num_streams
+        for size in sizes:
+            offsets.append(pages_offset)
+            pages_offset += _stream_pages_num(size, self.page_size) * 4
+
+        if pages_offset > self.size:
+            raise PDBFormatError("stream pages beyond end of root stream")
+
+        self._sizes = sizes
+        self._pages_offsets = offsets
+
+    def _directory(self):
+        if self._sizes is None:
+            self._load_directory()
+
+        return self._sizes, self._pages_offsets
 
     def num_streams(self):
         """
         get number of streams listed in this root stream
         :return:
         """
-        return struct.unpack("<I", self.read(0, 4))[0]
+        sizes, _ = self._directory()
+        return len(sizes)
 
     def stream_size(self, stream_index):
         """
@@ -111,26 +277,30 @@ class Root:
         if stream_index >= self.num_streams():
             raise IndexError("stream index to large")
 
-        return struct.unpack("<I", self.read(stream_index * 4 + 4, 4))[0]
+        sizes, _ = self._directory()
+        return sizes[stream_index]
 
     def stream_pages(self, stream_index):
         """
         get stream's page numbers
         """
-        num_streams = self.num_streams()
+        num_pages = _stream_pages_num(self.stream_size(stream_index),
+                                      self.page_size)
 
-        pages_offset = 4 + 4 * num_streams
+        _, offsets = self._directory()
+        return _u32_array(self.read(offsets[stream_index], 4*num_pages))
 
-        for sidx in range(stream_index):
-            stream_size = self.stream_size(sidx)
-            stream_num_pages = pages(stream_size, self.page_size)
-            pages_offset += stream_num_pages * 4
+    def stream(self, stream_index):
+        """
+        get a lazy view of the specified stream
 
-        num_pages = pages(self.stream_size(stream_index),
-                          self.page_size)
+        :return: Stream object
+        """
+        size = self.stream_size(stream_index)
+        if size == NIL_STREAM_SIZE:
+            size = 0
 
-        return struct.unpack("<%dI" % num_pages,
-                             self.read(pages_offset, 4*num_pages))
+        return Stream(self.pages, size, self.stream_pages(stream_index))
 
 
 class GUID:
@@ -168,43 +338,57 @@ class PDBFile:
         guid - PDB file's GUID as an instance of GUID class
         age  - PDB file's Age, as an integer
 
+    If the file is already opened, the file object can be passed via
+    'file' argument. The data is accessed via memory map of the file.
+
     :raises symstore.FileNotFoundError: if specified file does not exist
     """
-    def __init__(self, filepath):
-        with fileio.open_rb(filepath) as f:
-
-            # Check signature
-            sig = f.read(len(SIGNATURE))
-            if sig != SIGNATURE:
-                raise PDBInvalidSignature()
-
-            # load page size and root stream definition
-            page_size, _, _, root_dir_size, _ = \
-                struct.unpack("<IIIII", f.read(4*5))
-
-            # Create Root stream parser
-            root = Root(f, page_size, root_dir_size)
-
-            # load the PDB stream page
-            pdb_stream_pages = root.stream_pages(1)
-
-            # load GUID from PDB stream
-            f.seek(pdb_stream_pages[0]*page_size)
-            _, _, _, guid_d1, guid_d2, guid_d3, guid_d4 = \
-                struct.unpack("<IIIIHH8s", f.read(4*4 + 2 * 2 + 8))
-
-            # load age from the DBI information
-            # (PDB information age changes when using PDBSTR)
-            dbi_stream_pages = root.stream_pages(3)
-            if 0 < len(dbi_stream_pages):
-                f.seek(dbi_stream_pages[0]*page_size)
-                _, _, age = struct.unpack("<III", f.read(3*4))
-            else:
-                # vc140.pdb however, does not have this stream,
-                # so it does not have an age that can be used
-                # in the hash string
-                age = None
-
-            # store GUID and age for user friendly retrieval
-            self.guid = GUID(guid_d1, guid_d2, guid_d3, guid_d4)
-            self.age = age
+    def __init__(self, filepath, file=None):
+        if file is None:
+            with fileio.open_rb(filepath) as f, _map_file(f) as data:
+                self._parse(data)
+            return
+
+        file.seek(0)
+        with _map_file(file) as data:
+            self._parse(data)
+
+    def _parse(self, data):
+        # Check signature
+        if data[:len(SIGNATURE)] != SIGNATURE:
+            raise PDBInvalidSignature()
+
+        if len(data) < ROOT_INDEX_OFFSET:
+            raise PDBFormatError("truncated file header")
+
+        # load page size and root stream definition
+        page_size, _, _, root_dir_size, _ = \
+            struct.unpack_from("<IIIII", data, len(SIGNATURE))
+
+        if page_size < ROOT_INDEX_OFFSET or page_size > len(data):
+            raise PDBFormatError("invalid page size %s" % page_size)
+
+        # Create Root stream parser
+        root = Root(data, page_size, root_dir_size)
+        if root.num_streams() < 4:
+            raise PDBFormatError("missing PDB or DBI stream")
+
+        # load GUID from PDB stream
+        pdb_stream = root.stream(1)
+        _, _, _, guid_d1, guid_d2, guid_d3, guid_d4 = \
+            struct.unpack("<IIIIHH8s", pdb_stream.read(0, 4*4 + 2 * 2 + 8))
+
+        # load age from the DBI information
+        # (PDB information age changes when using PDBSTR)
+        dbi_stream = root.stream(3)
+        if 0 < len(dbi_stream):
+            _, _, age = struct.unpack("<III", dbi_stream.read(0, 3*4))
+        else:
+            # vc140.pdb however, does not have this stream,
+            # so it does not have an age that can be used
+            # in the hash string
+            age = None
+
+        # store GUID and age for user friendly retrieval
+        self.guid = GUID(guid_d1, guid_d2, guid_d3, guid_d4)
+        self.age = age
@@ -35,6 +35,17 @@ OPTIONAL_HEADER_OFFSET = \
 # SizeOfImage field's offset relative to optional header start
 SIZE_OF_IMAGE_OFFSET = 56
 
+# number of bytes, relative to PE signature, that
+# contain all header fields we are interested in
+PE_HEADERS_SIZE = \
+    OPTIONAL_HEADER_OFFSET + \
+    SIZE_OF_IMAGE_OFFSET + 4
+
+# number of bytes to read from the start of the file when probing
+# the headers, large enough to hold DOS stub and PE headers of
+# virtually all PE files
+HEADERS_PROBE_SIZE = 4096
+
 
 class PESignatureNotFoundError(Exception):
     pass
@@ -44,21 +55,77 @@ class PEFormatError(errs.FileFormatError):
     format_name = "PE"
 
 
-def _read_u32(file, size, offset):
+class _Headers:
+    """
+    A chunk of PE file's data, read from specified offset of the file.
+    """
+    def __init__(self, file, offset, data):
+        self.file = file
+        self.offset = offset
+        self.data = data
+
+    def covers(self, offset, size):
+        """
+        check if specified range of the file is covered by this chunk
+        """
+        start = offset - self.offset
+        return 0 <= start and start + size <= len(self.data)
+
+    def read(self, offset, size):
+        """
+        get bytes at specified file offset,
+        returns less bytes if the range is not covered by this chunk
+        """
+        start = offset - self.offset
+        if start < 0:
+            return b""
+
+        return self.data[start:start + size]
+
+    def u32(self, offset):
+        """
+        Decode 32-bit little-endian unsigned integer.
+
+        :param offset: the file offset of the integer
+        """
+        if not self.covers(offset, 4):
+            size = os.fstat(self.file.fileno()).st_size
+            raise PEFormatError("data offset %s beyond end of file %s" %
+                                (offset, size))
+
+        return struct.unpack_from("<I", self.data, offset - self.offset)[0]
+
+
+def _read_headers(file, head):
     """
-    Read 32-bit little-endian unsigned integer from an opened file.
+    Read PE file's headers data.
 
-    :param file: opended file handle
-    :param size: file szie
-    :param offset: the offset of the integer
+    Uses the data read from the start of the file and, if the PE headers
+    are located beyond it, makes one more read at the PE signature.
+
+    :param file: opened file
+    :param head: data read from the start of the file, should be
+                 HEADERS_PROBE_SIZE bytes or the whole file if it's smaller
+
+    :return: tuple of PE signature offset and a _Headers object
+             covering the signature and the headers
     """
-    if offset + 4 > size:
-        raise PEFormatError("data offset %s beyond end of file %s" %
-                            (offset, size))
+    headers = _Headers(file, 0, head)
+
+    # load PE signature offset
+    try:
+        pe_sig_offset = headers.u32(PE_SIGNATURE_POINTER)
+    except PEFormatError:
+        raise PESignatureNotFoundError()
 
-    file.seek(offset)
+    if not headers.covers(pe_sig_offset, PE_HEADERS_SIZE) and \
+            len(headers.data) >= HEADERS_PROBE_SIZE:
+        # headers are not inside probed data, and the file is larger
+        # then the probed chunk, read the headers
+        file.seek(pe_sig_offset)
+        headers = _Headers(file, pe_sig_offset, file.read(PE_HEADERS_SIZE))
 
-    return struct.unpack("<I", file.read(4))[0]
+    return pe_sig_offset, headers
 
 
 class PEFile:
@@ -73,29 +140,34 @@ class PEFile:
 
         PEFile("some.exe").TimeDateStamp
 
+    The headers are read with at most two reads, to keep the number of
+    I/O operations low when accessing files on network shares.
+
+    If the file is already opened, the file object and the data read from
+    the start of the file can be passed via 'file' and 'head' arguments.
+
     :raises symstore.FileNotFoundError: if specified file does not exist
     """
-    def __init__(self, filepath):
-        with fileio.open_rb(filepath) as f:
-            fsize = os.fstat(f.fileno()).st_size
-
-            # load PE signature offset
-            try:
-                pe_sig_offset = _read_u32(f, fsize, PE_SIGNATURE_POINTER)
-            except PEFormatError:
-                raise PESignatureNotFoundError()
-
-            # check that file contains valid PE signature
-            f.seek(pe_sig_offset)
-            if f.read(4) != PE_SIGNATURE:
-                raise PESignatureNotFoundError()
-
-            # load TimeDateStamp field
-            self.TimeDateStamp = \
-                _read_u32(f, fsize, pe_sig_offset+TIME_DATE_STAMP_OFFSET)
-
-            # load SizeOfImage field
-            self.SizeOfImage = _read_u32(f, fsize,
-                                         pe_sig_offset +
-                                         OPTIONAL_HEADER_OFFSET +
-                                         SIZE_OF_IMAGE_OFFSET)
+    def __init__(self, filepath, file=None, head=None):
+        if file is None:
+            with fileio.open_rb(filepath) as f:
+                self._parse(f, f.read(HEADERS_PROBE_SIZE))
+            return
+
+        self._parse(file, head)
+
+    def _parse(self, file, head):
+        pe_sig_offset, headers = _read_headers(file, head)
+
+        # check that file contains valid PE signature
+        if headers.read(pe_sig_offset, len(PE_SIGNATURE)) != PE_SIGNATURE:
+            raise PESignatureNotFoundError()
+
+        # load TimeDateStamp field
+        self.TimeDateStamp = \
+            headers.u32(pe_sig_offset + TIME_DATE_STAMP_OFFSET)
+
+        # load SizeOfImage field
+        self.SizeOfImage = headers.u32(pe_sig_offset +
+                                       OPTIONAL_HEADER_OFFSET +
+                                       SIZE_OF_IMAGE_OFFSET)
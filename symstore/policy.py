@@ -0,0 +1,125 @@
+"""
+policies for deciding which files to publish compressed
+"""
+import os
+import time
+import zlib
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# default amount of data to sample from each file
+DEFAULT_SAMPLE_SIZE = 512 * 1024
+
+# number of chunks the sample is split into, the chunks
+# are spread evenly over the file
+SAMPLE_CHUNKS = 8
+
+# by default, compress files that are estimated to shrink by at least 10%
+DEFAULT_MIN_RATIO = 1.1
+
+
+class AdaptiveCompression:
+    """
+    Decides to compress files based on their estimated compression ratio.
+
+    The ratio is estimated by compressing a sample of the file's data with
+    zlib, e.g. deflate, which is the algorithm used for MSZIP compression.
+    Files with lower estimated ratio than 'min_ratio' are published
+    uncompressed.
+
+    The instances are callable, and can be used as the 'compress' argument
+    to Transaction.new_entries() and Store.add_files() methods.
+
+    The decisions are logged on INFO level. The totals of the decisions
+    made are available via 'compressed', 'skipped', 'sampling_time' and
+    'saved_time' members.
+
+    :param min_ratio: minimal compression ratio, as size of uncompressed
+                      data divided by size of compressed data
+    :param sample_size: amount of data to sample from each file, files
+                        smaller than this are compressed as whole
+    """
+    def __init__(self, min_ratio=DEFAULT_MIN_RATIO,
+                 sample_size=DEFAULT_SAMPLE_SIZE):
+        self.min_ratio = min_ratio
+        self.sample_size = sample_size
+
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.skipped = 0
+        # time spent sampling files
+        self.sampling_time = 0.0
+        # estimated compression time saved by skipped files
+        self.saved_time = 0.0
+
+    def _sample(self, file):
+        """
+        read the data sample from the file
+
+        :return: (sample data, file size) tuple
+        """
+        with open(file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= self.sample_size:
+                return f.read(), size
+
+            chunk_size = self.sample_size // SAMPLE_CHUNKS
+            chunks = []
+            for i in range(SAMPLE_CHUNKS):
+                f.seek(i * (size - chunk_size) // (SAMPLE_CHUNKS - 1))
+                chunks.append(f.read(chunk_size))
+
+            return b"".join(chunks), size
+
+    def estimate(self, file):
+        """
+        estimate the compression ratio of the file
+
+        :return: (ratio, file size, sampling time) tuple
+        """
+        start = time.perf_counter()
+
+        sample, size = self._sample(file)
+        compressed_size = len(zlib.compress(sample))
+
+        return (len(sample) / max(compressed_size, 1), size,
+                time.perf_counter() - start)
+
+    def __call__(self, file):
+        ratio, size, sampling_time = self.estimate(file)
+        compress = ratio >= self.min_ratio
+
+        # assume that compressing whole file takes
+        # proportionally longer than sampling it
+        sample_size = min(size, self.sample_size)
+        saved_time = 0.0
+        if not compress and sample_size > 0:
+            saved_time = sampling_time * size / sample_size - sampling_time
+
+        with self._lock:
+            self.sampling_time += sampling_time
+            if compress:
+                self.compressed += 1
+            else:
+                self.skipped += 1
+                self.saved_time += saved_time
+
+        if compress:
+            log.info("%s: estimated compression ratio %.2f, compressing",
+                     file, ratio)
+        else:
+            log.info("%s: estimated compression ratio %.2f, not compressing, "
+                     "saved approximately %.3fs", file, ratio, saved_time)
+
+        return compress
+
+    def log_summary(self):
+        """
+        log the totals of the decisions made
+        """
+        log.info("compressed %s files, skipped %s files, sampling took "
+                 "%.3fs, saved approximately %.3fs",
+                 self.compressed, self.skipped,
+                 self.sampling_time, self.saved_time)
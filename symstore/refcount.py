@@ -0,0 +1,185 @@
+"""
+index of the number of transactions referencing each published file
+"""
+import os
+from os import path
+
+# first line of the index file
+HEADER = "symstore-refcount 1\n"
+
+# prefix of the lines marking the last transaction the index is
+# up to date with
+MARKER = "@"
+
+# rewrite the index when it has this many times more lines
+# than after it was last rewritten
+COMPACT_RATIO = 2
+
+# don't bother compacting small indexes
+COMPACT_MIN_LINES = 1024
+
+
+class RefCountIndex:
+    """
+    Counts the transactions referencing each published file.
+
+    The counts are kept in a text file, where each line holds a file key,
+    e.g. 'file_name\\file_hash', and a count delta, separated by a space.
+    The file's reference count is the sum of all it's deltas. Committing
+    and deleting transactions appends the deltas for the transaction's
+    files, followed by a marker line with the ID of the transaction. The
+    marker allows to detect when the store have been modified by other
+    tools, and the index is out of date.
+
+    The marker also records the number of lines in the file, and the
+    number of lines when the file was last rewritten. When the file grows
+    large compared to it's rewritten size, it's rewritten with one line
+    per file. As the last marker is read from the end of the file, the
+    file only needs to be read in full when it's rewritten, or when
+    loading the counts.
+
+    :param file_path: index file path
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def exists(self):
+        return path.isfile(self.file_path)
+
+    def _last_marker(self):
+        """
+        parse the last marker line, reading only the end of the file
+
+        :return: (transaction ID, number of lines, number of lines after
+                 last rewrite) tuple, the ID is None if there is no
+                 marker, the numbers are None if they are unknown
+        """
+        if not self.exists():
+            return None, 0, 0
+
+        with open(self.file_path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - 4096))
+            lines = f.read().decode("utf-8", "replace").splitlines()
+
+        for line in reversed(lines):
+            if line.startswith(MARKER):
+                fields = line[len(MARKER):].split(" ")
+                if len(fields) != 3:
+                    # line numbers not recorded
+                    return fields[0], None, None
+                return fields[0], int(fields[1]), int(fields[2])
+
+        return None, None, None
+
+    def last_id(self):
+        """
+        the ID of the last transaction recorded in the index,
+        reading only the end of the file
+
+        :return: transaction ID, or None if the index is missing or empty
+        """
+        transaction_id, _, _ = self._last_marker()
+        return transaction_id
+
+    def load(self, keys=None):
+        """
+        load the reference counts
+
+        The index is read line by line, only the counts of the
+        specified files are kept in memory.
+
+        :param keys: the file keys to load the counts of,
+                     None to load the counts of all files
+        :return: dictionary of file key to reference count
+        """
+        counts = {}
+        with open(self.file_path, encoding="utf-8") as f:
+            if f.readline() != HEADER:
+                raise ValueError("%s: not a reference count index" %
+                                 self.file_path)
+
+            for line in f:
+                if line.startswith(MARKER):
+                    continue
+
+                key, delta = line.rsplit(" ", 1)
+                if keys is not None and key not in keys:
+                    continue
+
+                count = counts.get(key, 0) + int(delta)
+                if count == 0:
+                    del counts[key]
+                else:
+                    counts[key] = count
+
+        return counts
+
+    def _append(self, keys, delta, transaction_id):
+        """
+        append the count delta for each file, followed by a marker
+
+        :return: (number of lines, number of lines after last rewrite)
+                 tuple, the numbers are None if they are unknown
+        """
+        new = not self.exists()
+        _, num_lines, compacted_lines = self._last_marker()
+        if num_lines is not None:
+            num_lines += len(keys) + 1
+
+        with open(self.file_path, "a", encoding="utf-8") as f:
+            if new:
+                f.write(HEADER)
+            f.writelines("%s %s\n" % (key, delta) for key in keys)
+            f.write(_marker(transaction_id, num_lines, compacted_lines))
+
+        return num_lines, compacted_lines
+
+    def add(self, keys, transaction_id):
+        """
+        record a committed transaction, referencing the files
+
+        :param keys: distinct file keys of transaction's entries
+        """
+        self._append(keys, 1, transaction_id)
+
+    def remove(self, keys, transaction_id):
+        """
+        record a deleted transaction, that referenced the files
+
+        :param keys: file keys of deleted transaction's entries
+        :param transaction_id: the ID of the delete transaction
+        """
+        num_lines, compacted_lines = self._append(keys, -1, transaction_id)
+
+        if num_lines is None or \
+                num_lines > max(COMPACT_MIN_LINES,
+                                compacted_lines * COMPACT_RATIO):
+            self.write(self.load(), transaction_id)
+
+    def write(self, counts, transaction_id):
+        """
+        atomically replace the index with the reference counts
+        """
+        num_lines = len(counts) + 1
+
+        temp_path = "%s.tmp" % self.file_path
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(HEADER)
+            for key, count in sorted(counts.items()):
+                f.write("%s %s\n" % (key, count))
+            f.write(_marker(transaction_id, num_lines, num_lines))
+
+        os.replace(temp_path, self.file_path)
+
+    def discard(self):
+        if self.exists():
+            os.remove(self.file_path)
+
+
+def _marker(transaction_id, num_lines, compacted_lines):
+    if num_lines is None:
+        return "%s%s\n" % (MARKER, transaction_id)
+
+    return "%s%s %s %s\n" % \
+        (MARKER, transaction_id, num_lines, compacted_lines)
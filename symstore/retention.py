@@ -0,0 +1,252 @@
+"""
+retention policies, for deciding which transactions to delete
+"""
+import os
+import re
+import json
+import logging
+from os import path
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+# the rule settings that can be specified in the rules file
+RULE_KEYS = ("product", "version", "comment", "keep_last", "keep_days")
+
+
+def _dir_size(dir_path):
+    """
+    total size of the files in the directory tree
+    """
+    size = 0
+    for dir_name, _, file_names in os.walk(dir_path):
+        for file_name in file_names:
+            try:
+                size += os.lstat(path.join(dir_name, file_name)).st_size
+            except OSError:
+                # removed behind our back
+                pass
+
+    return size
+
+
+class RetentionRule:
+    """
+    Selects transactions, and specifies which of them to keep.
+
+    A transaction is selected by the rule if it's product, version and
+    comment match the rule's regular expressions. The expressions must
+    match the whole value, None matches anything.
+
+    Of the selected transactions, the rule keeps the transactions of
+    the 'keep_last' most recently published versions of each product,
+    and the transactions published less than 'keep_days' days ago. If
+    neither is specified, the rule keeps none of the selected
+    transactions.
+
+    :param product: product name regular expression
+    :param version: product version regular expression
+    :param comment: comment regular expression
+    :param keep_last: number of versions to keep of each product
+    :param keep_days: maximum age of the transactions to keep, in days
+    """
+    def __init__(self, product=None, version=None, comment=None,
+                 keep_last=None, keep_days=None):
+        if keep_last is not None and keep_last < 0:
+            raise ValueError("invalid keep_last '%s'" % keep_last)
+
+        if keep_days is not None and keep_days < 0:
+            raise ValueError("invalid keep_days '%s'" % keep_days)
+
+        self.product = product
+        self.version = version
+        self.comment = comment
+        self.keep_last = keep_last
+        self.keep_days = keep_days
+
+        self._patterns = []
+        for name in ("product", "version", "comment"):
+            pattern = getattr(self, name)
+            if pattern is None:
+                continue
+
+            try:
+                self._patterns.append((name, re.compile(pattern)))
+            except re.error as e:
+                raise ValueError("invalid %s pattern '%s': %s" %
+                                 (name, pattern, e))
+
+    @classmethod
+    def from_dict(cls, rule):
+        """
+        create the rule from it's dictionary representation,
+        as used in the rules file
+        """
+        if not isinstance(rule, dict):
+            raise ValueError("rule must be an object")
+
+        unknown = sorted(set(rule) - set(RULE_KEYS))
+        if unknown:
+            raise ValueError("unknown rule setting '%s'" % unknown[0])
+
+        for name in ("product", "version", "comment"):
+            value = rule.get(name)
+            if value is not None and not isinstance(value, str):
+                raise ValueError("%s must be a string" % name)
+
+        for name in ("keep_last", "keep_days"):
+            value = rule.get(name)
+            if value is not None and (isinstance(value, bool) or
+                                      not isinstance(value, int)):
+                raise ValueError("%s must be an integer" % name)
+
+        return cls(**rule)
+
+    def matches(self, transaction):
+        for name, pattern in self._patterns:
+            value = getattr(transaction, name)
+            if value is None or pattern.fullmatch(value) is None:
+                return False
+
+        return True
+
+    def kept(self, transactions, now):
+        """
+        figure out which of the selected transactions the rule keeps
+
+        :param transactions: transactions selected by the rule
+        :param now: current time, as datetime object
+        :return: set of the IDs of kept transactions
+        """
+        kept = set()
+
+        if self.keep_days is not None:
+            oldest = now - timedelta(days=self.keep_days)
+            kept.update(t.id for t in transactions if t.timestamp > oldest)
+
+        if self.keep_last is not None:
+            # product -> version -> IDs of version's transactions,
+            # in the order they were published
+            products = {}
+            for transaction in sorted(transactions, key=lambda t: t.id):
+                versions = products.setdefault(transaction.product, {})
+                versions.setdefault(transaction.version, []).append(
+                    transaction.id)
+
+            for versions in products.values():
+                # order versions by their latest publication
+                latest = sorted(versions.values(), key=lambda ids: ids[-1])
+                for ids in latest[max(0, len(latest) - self.keep_last):]:
+                    kept.update(ids)
+
+        return kept
+
+
+class RetentionPlan:
+    """
+    The transactions a retention policy deletes, and the files
+    deleted with them.
+
+    :param transactions: Transaction objects to delete
+    :param kept: number of transactions that are kept
+    :param files: list of (file name, file hash) tuples of the files
+                  to delete
+    :param size: the total size of the files to delete, in bytes
+    """
+    def __init__(self, transactions, kept, files, size):
+        self.transactions = transactions
+        self.kept = kept
+        self.files = files
+        self.size = size
+
+    def execute(self, store):
+        """
+        delete the transactions and their files from the store
+        """
+        if not self.transactions:
+            return
+
+        store.delete_transactions([t.id for t in self.transactions],
+                                  self.files)
+        log.info("deleted %s transactions and %s files, reclaimed %s bytes",
+                 len(self.transactions), len(self.files), self.size)
+
+
+class RetentionPolicy:
+    """
+    Decides which transactions to delete, based on a list of rules.
+
+    A transaction is deleted if it is selected by at least one rule, and
+    none of the rules selecting it keeps it. Transactions not selected by
+    any rule are kept.
+
+    :param rules: RetentionRule objects
+    """
+    def __init__(self, rules):
+        self.rules = rules
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        load the policy from a JSON rules file
+
+        The file contains an object with a 'rules' list, where each rule
+        is an object with RetentionRule's arguments, e.g.:
+
+            {"rules": [{"product": "app", "keep_last": 5},
+                       {"product": "app", "keep_days": 90}]}
+
+        :raises ValueError: if the rules are invalid
+        """
+        with open(file_path) as f:
+            try:
+                policy = json.load(f)
+            except ValueError as e:
+                raise ValueError("%s: %s" % (file_path, e))
+
+        if not isinstance(policy, dict) or \
+                not isinstance(policy.get("rules"), list):
+            raise ValueError("%s: expected an object with 'rules' list" %
+                             file_path)
+
+        rules = []
+        for num, rule in enumerate(policy["rules"], 1):
+            try:
+                rules.append(RetentionRule.from_dict(rule))
+            except (TypeError, ValueError) as e:
+                raise ValueError("%s: rule %s: %s" % (file_path, num, e))
+
+        return cls(rules)
+
+    def plan(self, store, now=None):
+        """
+        figure out which transactions to delete from the store
+
+        :param now: current time, as datetime object, None for the
+                    current local time
+        :return: RetentionPlan object
+        """
+        if now is None:
+            now = datetime.now()
+
+        transactions = [t for _, t in sorted(store.transactions.items())]
+
+        selected = set()
+        kept = set()
+        for rule in self.rules:
+            matching = [t for t in transactions if rule.matches(t)]
+            selected.update(t.id for t in matching)
+            kept |= rule.kept(matching, now)
+
+        deleted = [t for t in transactions
+                   if t.id in selected and t.id not in kept]
+
+        files = []
+        size = 0
+        if deleted:
+            files = store.dropped_files(deleted)
+            size = sum(_dir_size(path.join(store._path, name, file_hash))
+                       for name, file_hash in files)
+
+        return RetentionPlan(deleted, len(transactions) - len(deleted),
+                             files, size)
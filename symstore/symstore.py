@@ -1,16 +1,28 @@
 import os
 import re
+import mmap
 import time
+import locale
+import logging
 import shutil
+from itertools import islice
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
 from os import path
 from symstore import pe
 from symstore import pdb
 from symstore import cab
+from symstore import cabfile
 from symstore import errs
 from symstore import fileio
+from symstore import linefile
+from symstore.journal import PublishJournal
+from symstore.refcount import RefCountIndex
 from datetime import datetime
 
+log = logging.getLogger(__name__)
 
 TRANSACTION_PREFIX_RE = re.compile(
     r"(\d+),"
@@ -34,6 +46,8 @@ ADMIN_DIR = "000Admin"
 LAST_ID_FILE = path.join(ADMIN_DIR, "lastid.txt")
 HISTORY_FILE = path.join(ADMIN_DIR, "history.txt")
 SERVER_FILE = path.join(ADMIN_DIR, "server.txt")
+JOURNAL_FILE = path.join(ADMIN_DIR, "journal.jsonl")
+REFCOUNT_FILE = path.join(ADMIN_DIR, "refcount.txt")
 PINGME_FILE = "pingme.txt"
 
 
@@ -54,7 +68,7 @@ def _pe_hash(pefile):
     return "%.8X%.4x" % (pefile.TimeDateStamp, pefile.SizeOfImage)
 
 
-def _probe_pe_hash(fname):
+def _probe_pe_hash(fname, file=None, head=None):
     """
     try to parse the specified file as PE file
 
@@ -62,7 +76,7 @@ def _probe_pe_hash(fname):
     if can't parse as PE, returns None
     """
     try:
-        pefile = pe.PEFile(fname)
+        pefile = pe.PEFile(fname, file, head)
     except pe.PESignatureNotFoundError:
         # does not look like a PE file
         return None
@@ -70,40 +84,252 @@ def _probe_pe_hash(fname):
     return _pe_hash(pefile)
 
 
-def _probe_pdb_hash(fname):
+def _probe_pdb_hash(fname, file=None, head=None):
     """
     try to parse the specified file as PDB file
 
     on success, return the PDB-style hash for the file
     if can't parse as PDB, returns None
+
+    The file is memory mapped, thus the 'head' data is not used.
     """
     try:
-        pdbfile = pdb.PDBFile(fname)
+        pdbfile = pdb.PDBFile(fname, file)
     except pdb.PDBInvalidSignature:
         return None
 
     return _pdb_hash(pdbfile)
 
 
-def _file_hash(fname):
-    # first try parsing as PE file
-    hash = _probe_pe_hash(fname)
-    if hash is not None:
-        return hash
+# number of bytes read from the start of a file, when detecting it's format
+SNIFF_SIZE = pe.HEADERS_PROBE_SIZE
+
+# registered file formats, as list of (magic, probe function) tuples
+_file_formats = []
+
+
+def register_file_format(magic, probe):
+    """
+    register a file format that can be published to the symstore
+
+    The probe function is invoked for files starting with the magic bytes,
+    as probe(fname, file, head), where 'file' is the opened file object and
+    'head' is the data read from the start of the file. The probe function
+    should return file's symstore hash, or None if the file can't be parsed.
+
+    :param magic: bytes that the format's files start with
+    :param probe: the probe function
+    """
+    _file_formats.append((magic, probe))
+
+
+register_file_format(b"MZ", _probe_pe_hash)
+register_file_format(pdb.SIGNATURE, _probe_pdb_hash)
+
 
-    # then try to parse as PDB file
-    hash = _probe_pdb_hash(fname)
-    if hash is not None:
-        return hash
+def _probe_file_hash(fname):
+    with fileio.open_rb(fname) as f:
+        head = f.read(SNIFF_SIZE)
+
+        # pick parser by the magic bytes at the start of the file
+        for magic, probe in _file_formats:
+            if not head.startswith(magic):
+                continue
+
+            hash = probe(fname, f, head)
+            if hash is not None:
+                return hash
 
     # we don't know the file type
     raise errs.UnknownFileType()
 
 
+def _file_hash(fname, hash_cache=None):
+    """
+    get symstore hash of a file
+
+    :param hash_cache: optional HashCache object, used to look up
+                       hashes of files that have been hashed before
+    """
+    if hash_cache is None:
+        return _probe_file_hash(fname)
+
+    return hash_cache.file_hash(fname, _probe_file_hash)
+
+
+def file_key(file_name, file_hash):
+    """
+    format symbols store key of a file, e.g. 'foo.pdb\\<hash>'
+    """
+    return "%s\\%s" % (file_name, file_hash)
+
+
+def _walk_files(paths):
+    """
+    generate (file path, explicit) tuples for specified paths,
+    where directories are expanded to all files they contain
+
+    'explicit' is True for files that where directly specified
+    """
+    for fpath in paths:
+        if not path.isdir(fpath):
+            yield fpath, True
+            continue
+
+        for dir_path, _, file_names in os.walk(fpath):
+            for file_name in sorted(file_names):
+                yield path.join(dir_path, file_name), False
+
+
+def hash_files(paths, workers=None, hash_cache=None):
+    """
+    compute symbols store keys of files
+
+    The files are parsed in parallel, using a pool of threads. The
+    results are generated as they are completed, thus not necessarily
+    in the order of the specified files.
+
+    Directories are searched recursively. Files inside directories,
+    that are not in a supported format, are silently skipped.
+
+    Generates (file path, key, error) tuples. On success, key is
+    file's symbols store key, in the 'file_name\\file_hash' format,
+    and error is None. If the file can't be hashed, key is None and
+    error is the raised exception.
+
+    :param paths: files and directories to hash
+    :param workers: maximum number of threads to use,
+                    None for the thread pool default
+    :param hash_cache: optional HashCache object
+    """
+    def _hash(fpath):
+        return file_key(path.basename(fpath), _file_hash(fpath, hash_cache))
+
+    if workers is None:
+        # same default as ThreadPoolExecutor uses
+        workers = min(32, (os.cpu_count() or 1) + 4)
+
+    # limit number of files queued at any time,
+    # to keep memory usage flat for any number of files
+    max_pending = workers * 4
+
+    with ThreadPoolExecutor(max_workers=workers) as e:
+        pending = {}
+
+        def _completed(futures):
+            for future in futures:
+                fpath, explicit = pending.pop(future)
+                try:
+                    yield fpath, future.result(), None
+                except errs.UnknownFileType as ex:
+                    if explicit:
+                        yield fpath, None, ex
+                except (errs.FileFormatError, errs.FileNotFound,
+                        OSError) as ex:
+                    yield fpath, None, ex
+
+        for fpath, explicit in _walk_files(paths):
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _completed(done)
+
+            pending[e.submit(_hash, fpath)] = (fpath, explicit)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from _completed(done)
+
+
 def _is_empty_dir(dir_path):
     return len(os.listdir(dir_path)) == 0
 
 
+# the publish method reported for compressed entries
+COMPRESSED = "compressed"
+
+
+class PublishOptions:
+    """
+    Options controlling how transaction's files are published.
+
+    :param compress_processes: number of worker processes used for
+                               compressing files, None to compress
+                               files in a pool of threads
+    :param cpu_workers: number of threads used for compressing files,
+                        None for the number of CPUs, not used if
+                        'compress_processes' is specified
+    :param io_workers: number of threads used for copying files into
+                       the store, None for the thread pool default
+    :param compression: cab.Compression object, specifying compression
+                        method and level, None for the compression
+                        backend's default
+    :param link_mode: how uncompressed files are published, one of
+                      fileio.LINK_MODES, by default files are copied
+    :param parallel_copy: fileio.ParallelCopy object, specifying how large
+                          files are copied concurrently, None to copy
+                          files sequentially
+    :param checksums: write a checksum sidecar file next to each published
+                      file, and use it to check if a file is already
+                      published when skipping published files
+    """
+    def __init__(self, compress_processes=None, compression=None,
+                 link_mode=fileio.COPY, parallel_copy=None, checksums=False,
+                 cpu_workers=None, io_workers=None):
+        self.compress_processes = compress_processes
+        self.cpu_workers = cpu_workers
+        self.io_workers = io_workers
+        self.compression = compression
+        self.link_mode = link_mode
+        self.parallel_copy = parallel_copy
+        self.checksums = checksums
+
+
+class PublishTiming:
+    """
+    Time spent publishing a transaction entry.
+
+    :param entry: the published TransactionEntry
+    :param method: how the file was published, see TransactionEntry.publish(),
+                   None if the entry was published before the commit
+                   was resumed
+    :param cpu_time: time spent compressing the file, in seconds
+    :param io_time: time spent copying or moving the file into the store,
+                    in seconds
+    """
+    def __init__(self, entry, method=None, cpu_time=0.0, io_time=0.0):
+        self.entry = entry
+        self.method = method
+        self.cpu_time = cpu_time
+        self.io_time = io_time
+
+
+def _timed(func, *args):
+    """
+    call the function, timing it
+
+    This is a module level function, so it can be run in a worker process.
+
+    :return: (function's return value, elapsed seconds) tuple
+    """
+    start = time.perf_counter()
+    result = func(*args)
+
+    return result, time.perf_counter() - start
+
+
+def _source_size(entry):
+    try:
+        return os.stat(entry.source_file).st_size
+    except OSError:
+        # the error is reported when the file is published
+        return 0
+
+
+def _remove_file(file_path):
+    if path.isfile(file_path):
+        os.remove(file_path)
+
+
 class TransactionEntry:
     def __init__(self, symstore, file_name, file_hash, source_file,
                  compressed=False):
@@ -134,12 +360,57 @@ class TransactionEntry:
     def _dest_dir(self):
         return path.join(self._symstore._path, self.file_name, self.file_hash)
 
-    def read(self):
+    def _compressed_path(self):
+        return path.join(self._dest_dir(), self.file_name[:-1]+"_")
+
+    def _checksum_path(self):
+        return path.join(self._dest_dir(),
+                         self.file_name + fileio.CHECKSUM_SUFFIX)
+
+    def _remove_temp_files(self):
+        """
+        remove temporary files, left behind by an interrupted publish
+        """
+        dest_dir = self._dest_dir()
+        if not path.isdir(dest_dir):
+            return
+
+        for name in os.listdir(dest_dir):
+            if name.startswith(".") and name.endswith(".tmp"):
+                os.remove(path.join(dest_dir, name))
+
+    def _make_dest_dir(self):
+        dest_dir = self._dest_dir()
+        os.makedirs(dest_dir, exist_ok=True)
+
+        return dest_dir
+
+    def _temp_path(self):
+        """
+        create a temporary file in the entry's directory
+
+        :return: path to the created file
+        """
+        self._make_dest_dir()
+
+        return fileio.create_temp(self._compressed_path())
+
+    def open(self):
+        """
+        open published file for reading
+
+        The data of compressed entries is decompressed as it is read.
+
+        :return: binary file-like object
+        """
         if self.compressed:
-            raise NotImplementedError("reading compressed data not supported")
+            return cabfile.open_cab(self._compressed_path())
 
-        fpath = path.join(self._dest_dir(), self.file_name)
-        return fileio.read_all(fpath, "rb")
+        return fileio.open_rb(path.join(self._dest_dir(), self.file_name))
+
+    def read(self):
+        with self.open() as f:
+            return f.read()
 
     def exists(self):
         """
@@ -147,30 +418,145 @@ class TransactionEntry:
         """
         return path.isdir(self._dest_dir())
 
-    def publish(self):
+    def checksum(self):
+        """
+        the checksum of the published file's contents,
+        as recorded in the checksum sidecar file
+
+        :return: fileio.Checksum object, or None if there is no checksum
+                 recorded for the published file
+        """
+        return fileio.Checksum.load(self._checksum_path())
+
+    def verify_published(self):
+        """
+        check that the source file have been completely published
+
+        The source file's size is compared first, and the checksum
+        of it's contents only if the size matches.
+
+        :return: True if the checksum recorded for the published file
+                 matches the source file, False if it differs, or if
+                 no checksum is recorded
+        """
+        published = self.checksum()
+        if published is None:
+            return False
+
+        if os.stat(self.source_file).st_size != published.size:
+            return False
+
+        return fileio.Checksum.of_file(self.source_file) == published
+
+    def publish(self, options=None):
         """
         publish this entry's source file inside symstore
+
+        When checksums are enabled, the checksum sidecar is written after
+        the file is published, thus an interrupted publish does not leave
+        behind a sidecar matching the source file.
+
+        :param options: PublishOptions object, None for default options
+        :return: how the file was published, 'compressed' for compressed
+                 entries, otherwise one of fileio.COPY, fileio.HARDLINK
+                 or fileio.REFLINK
         """
-        dest_dir = self._dest_dir()
+        if options is None:
+            options = PublishOptions()
 
-        if not path.isdir(dest_dir):
-            os.makedirs(dest_dir)
+        dest_dir = self._prepare_publish(options)
 
         if self.compressed:
-            cab.compress(self.source_file,
-                         path.join(dest_dir, self.file_name[:-1]+"_"))
-        else:
-            shutil.copy(self.source_file, dest_dir)
-            # TODO handle I/O errors
+            temp_path = self._temp_path()
+            try:
+                cab.compress(self.source_file, temp_path,
+                             options.compression)
+            except BaseException:
+                _remove_file(temp_path)
+                raise
+
+            return self._finish_compressed(temp_path, options)
+
+        hasher = fileio.Hasher() if options.checksums else None
+
+        method = fileio.publish_file(self.source_file,
+                                     path.join(dest_dir, self.file_name),
+                                     options.link_mode,
+                                     options.parallel_copy,
+                                     hasher)
+
+        if hasher is not None:
+            hasher.checksum().save(self._checksum_path())
+
+        return method
+
+    def _prepare_publish(self, options):
+        """
+        create entry's directory, and remove stale checksum sidecar
+
+        :return: entry's directory path
+        """
+        dest_dir = self._make_dest_dir()
+        if options.checksums:
+            _remove_file(self._checksum_path())
+
+        return dest_dir
+
+    def _finish_compressed(self, temp_path, options):
+        """
+        move compressed file into place, and record it's checksum
+
+        :param temp_path: the compressed file
+        """
+        try:
+            os.replace(temp_path, self._compressed_path())
+        except BaseException:
+            _remove_file(temp_path)
+            raise
+
+        if options.checksums:
+            # the compression backends read the source file themselves,
+            # thus the checksum can't be computed while compressing
+            checksum = fileio.Checksum.of_file(self.source_file)
+            checksum.save(self._checksum_path())
+
+        return COMPRESSED
 
     def __str__(self):
-        return r""""%s\%s","%s""""" % \
-               (self.file_name,
-                self.file_hash,
+        return r""""%s","%s""""" % \
+               (file_key(self.file_name, self.file_hash),
                 path.abspath(self.source_file))
 
 
+def _transaction_field(index):
+    """
+    property for transaction's field, decoded from transaction's line
+    on first access
+    """
+    def get(self):
+        return self._decoded()[index]
+
+    def set(self, value):
+        self._decoded()[index] = value
+
+    return property(get, set)
+
+
 class Transaction:
+    """
+    A transaction, either a new transaction or one read from the server
+    or history file.
+
+    Transactions read from the files are kept as their raw lines, until
+    the transaction's fields are first accessed. Then the line is decoded,
+    and only the fields are kept. The transaction's timestamp is decoded
+    separately, on it's first access. The instances use slots to minimize
+    the memory used by stores with many transactions, the statistics of
+    the commit are stored in a single slot, only set on commit.
+    """
+    __slots__ = ("_symstore", "_entries", "_line", "_fields", "id",
+                 "_publish_stats")
+
     transaction_entry_class = TransactionEntry
 
     def __init__(self, symstore, id=None, type="add", ref="file",
@@ -179,14 +565,84 @@ class Transaction:
 
         self._symstore = symstore
         self._entries = None
+        self._line = None
+        self._fields = [type, ref, timestamp, product, version, comment,
+                        deleted_id]
         self.id = id
-        self.type = type
-        self.ref = ref
-        self.timestamp = timestamp
-        self.product = product
-        self.version = version
-        self.comment = comment
-        self.deleted_id = deleted_id
+        # (PublishTiming objects, bytes linked, bytes copied) tuple,
+        # set on commit
+        self._publish_stats = None
+
+    @classmethod
+    def from_line(cls, symstore, line):
+        """
+        create a transaction from it's line in the server or history file
+
+        Only the transaction's ID is decoded up front.
+        """
+        transaction = cls.__new__(cls)
+        transaction._symstore = symstore
+        transaction._entries = None
+        transaction._line = line.rstrip("\r\n")
+        transaction._fields = None
+        transaction.id = line[:line.find(",")]
+        transaction._publish_stats = None
+
+        return transaction
+
+    def _decoded(self):
+        if self._fields is None:
+            self._fields = list(_split_transaction_line(self._line)[1:])
+            # only keep the decoded fields
+            self._line = None
+        return self._fields
+
+    type = _transaction_field(0)
+    ref = _transaction_field(1)
+    product = _transaction_field(3)
+    version = _transaction_field(4)
+    comment = _transaction_field(5)
+    deleted_id = _transaction_field(6)
+
+    @property
+    def timestamp(self):
+        fields = self._decoded()
+        if isinstance(fields[2], str):
+            fields[2] = datetime.strptime(fields[2], "%m/%d/%Y,%H:%M:%S")
+        return fields[2]
+
+    @timestamp.setter
+    def timestamp(self, timestamp):
+        self._decoded()[2] = timestamp
+
+    @property
+    def publish_timings(self):
+        """
+        PublishTiming objects for the entries published on commit
+        """
+        if self._publish_stats is None:
+            return []
+        return self._publish_stats[0]
+
+    @property
+    def bytes_linked(self):
+        """
+        bytes of files linked into the store on commit,
+        compressed files are not included
+        """
+        if self._publish_stats is None:
+            return 0
+        return self._publish_stats[1]
+
+    @property
+    def bytes_copied(self):
+        """
+        bytes of files copied into the store on commit,
+        compressed files are not included
+        """
+        if self._publish_stats is None:
+            return 0
+        return self._publish_stats[2]
 
     def _commited(self):
         return self.id is not None
@@ -229,10 +685,56 @@ class Transaction:
         # TODO handle I/O errors from _file_hash()
         return TransactionEntry(self._symstore,
                                 path.basename(file),
-                                _file_hash(file),
+                                _file_hash(file,
+                                           self._symstore.hash_cache),
                                 file,
                                 compress)
 
+    def new_entries(self, files, compress=False, workers=None):
+        """
+        create entries for multiple files
+
+        The files are parsed in parallel, using a pool of threads.
+        The entries are returned in the same order as the files.
+
+        :param files: list of file paths
+        :param compress: True if files should be compressed, or a function
+                         taking file path, returning True if the file should
+                         be compressed
+        :param workers: maximum number of threads to use,
+                        None for the thread pool default
+
+        :raises symstore.FileErrors: if some of the files could not be
+                                     parsed, lists errors for all of them
+        """
+        if callable(compress):
+            compress_file = compress
+        else:
+            def compress_file(_):
+                return compress
+
+        def _new_entry(file):
+            entry = self.new_entry(file)
+            entry.compressed = compress_file(file)
+            return entry
+
+        with ThreadPoolExecutor(max_workers=workers) as e:
+            futures = [e.submit(_new_entry, file) for file in files]
+
+        entries = []
+        errors = []
+        for file, future in zip(files, futures):
+            try:
+                entries.append(future.result())
+            except (errs.UnknownFileType, errs.FileFormatError,
+                    errs.FileNotFound, OSError) as ex:
+                errors.append((file, ex))
+
+        if errors:
+            raise errs.FileErrors(errors)
+
+        return entries
+
     def add_entry(self, entry):
         self.entries.append(entry)
 
@@ -243,9 +745,167 @@ class Transaction:
 
         return self._entries
 
-    def commit(self, id, now):
+    def _publish_entries(self, options, journal=None):
+        """
+        publish entries, using separate pools of workers for compressing
+        and copying files
+
+        Compressed files are written by the CPU workers to temporary files
+        in the entries' directories, and then moved into place by the I/O
+        workers, which also copy the uncompressed files. In each pool the
+        largest files are started first, which evens out the workers'
+        load when the file sizes vary a lot.
+
+        At most as many jobs as there are workers are submitted to each
+        pool. If any entry fails to be published, no new jobs are started,
+        and the first error is raised once the running jobs are done.
+
+        :param journal: PublishJournal object, the entries marked as done
+                        in the journal are not published, and the
+                        published entries are marked as done
+        :return: list of PublishTiming objects, in the entries order
+        """
+        timings = {entry: PublishTiming(entry) for entry in self.entries}
+        indexes = {entry: i for i, entry in enumerate(self.entries)}
+
+        entries = self.entries
+        if journal is not None:
+            entries = [e for e in entries if indexes[e] not in journal.done]
+
+        cpu_queue = deque(sorted((e for e in entries if e.compressed),
+                                 key=_source_size, reverse=True))
+        # (entry, function, arguments, temporary file path) tuples
+        io_queue = deque((e, e.publish, (options,), None)
+                         for e in sorted((e for e in entries
+                                          if not e.compressed),
+                                         key=_source_size, reverse=True))
+
+        if options.compress_processes is not None:
+            cpu_workers = options.compress_processes
+            cpu_pool = ProcessPoolExecutor(max_workers=cpu_workers)
+        else:
+            cpu_workers = options.cpu_workers or os.cpu_count() or 1
+            cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers)
+
+        io_workers = options.io_workers
+        if io_workers is None:
+            # same default as ThreadPoolExecutor uses
+            io_workers = min(32, (os.cpu_count() or 1) + 4)
+
+        # future -> (entry, temporary file path)
+        cpu_pending = {}
+        # future -> entry
+        io_pending = {}
+        error = None
+
+        with cpu_pool, ThreadPoolExecutor(max_workers=io_workers) as io_pool:
+            def _submit():
+                while cpu_queue and len(cpu_pending) < cpu_workers:
+                    entry = cpu_queue.popleft()
+                    entry._prepare_publish(options)
+                    temp_path = entry._temp_path()
+                    future = cpu_pool.submit(_timed, cab.compress_file,
+                                             entry.source_file, temp_path,
+                                             cab.backend, options.compression)
+                    cpu_pending[future] = (entry, temp_path)
+
+                while io_queue and len(io_pending) < io_workers:
+                    entry, func, args, _ = io_queue.popleft()
+                    io_pending[io_pool.submit(_timed, func, *args)] = entry
+
+            _submit()
+            while cpu_pending or io_pending:
+                done, _ = wait(list(cpu_pending) + list(io_pending),
+                               return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in cpu_pending:
+                        entry, temp_path = cpu_pending.pop(future)
+                        try:
+                            _, timings[entry].cpu_time = future.result()
+                        except Exception as e:
+                            _remove_file(temp_path)
+                            error = error or e
+                            continue
+
+                        # move the compressed file into place before
+                        # starting new copies, to release the temporary
+                        # file as soon as possible
+                        io_queue.appendleft((entry, entry._finish_compressed,
+                                             (temp_path, options), temp_path))
+                    else:
+                        entry = io_pending.pop(future)
+                        try:
+                            timings[entry].method, timings[entry].io_time = \
+                                future.result()
+                            if journal is not None:
+                                journal.mark_done(indexes[entry])
+                        except Exception as e:
+                            error = error or e
+
+                if error is None:
+                    _submit()
+
+        if error is not None:
+            # don't leave compressed files, that were never moved into
+            # place, in the store
+            for _, _, _, temp_path in io_queue:
+                if temp_path is not None:
+                    _remove_file(temp_path)
+            raise error
+
+        return [timings[entry] for entry in self.entries]
+
+    def _log_timings(self, timings, elapsed):
+        for timing in sorted(timings, reverse=True,
+                             key=lambda t: t.cpu_time + t.io_time):
+            log.info("%s: %s, compression %.3fs, I/O %.3fs",
+                     timing.entry.source_file, timing.method,
+                     timing.cpu_time, timing.io_time)
+
+        log.info("transaction %s: published %s files in %.3fs, "
+                 "compression %.3fs, I/O %.3fs",
+                 self.id, len(timings), elapsed,
+                 sum(t.cpu_time for t in timings),
+                 sum(t.io_time for t in timings))
+
+    def _record_publish_methods(self, timings):
+        """
+        count the bytes of uncompressed files that were linked
+        and copied into the store
+        """
+        bytes_linked = 0
+        bytes_copied = 0
+
+        for timing in timings:
+            if timing.method in (COMPRESSED, None):
+                continue
+
+            size = os.stat(timing.entry.source_file).st_size
+            if timing.method == fileio.COPY:
+                bytes_copied += size
+            else:
+                bytes_linked += size
+
+        self._publish_stats = (timings, bytes_linked, bytes_copied)
+
+        log.info("transaction %s: linked %s bytes, copied %s bytes",
+                 self.id, bytes_linked, bytes_copied)
+
+    def commit(self, id, now, options=None, journal=None):
+        """
+        publish transaction's files and write the transaction file
+
+        :param options: PublishOptions object, None for default options
+        :param journal: PublishJournal object for recording published
+                        entries, and skipping entries published before
+                        resuming an interrupted commit
+        """
         assert not self._commited()
 
+        if options is None:
+            options = PublishOptions()
+
         self.timestamp = now
         self.id = id
 
@@ -255,11 +915,19 @@ class Transaction:
         # when there are multiple entries,
         # specially when compression is requested
         #
-        with ThreadPoolExecutor() as e:
-            e.map(lambda entry: entry.publish(), self.entries)
-
-        # write new transaction file
-        with self._entries_file("a") as efile:
+        start = time.perf_counter()
+        try:
+            timings = self._publish_entries(options, journal)
+        finally:
+            if journal is not None:
+                journal.close()
+
+        self._record_publish_methods(timings)
+        self._log_timings(timings, time.perf_counter() - start)
+
+        # write new transaction file, overwriting the file written
+        # before a resumed commit was interrupted
+        with self._entries_file("w") as efile:
             for entry in self.entries:
                 efile.write("%s\n" % entry)
         # TODO handle I/O errors while opening/writing efile
@@ -270,6 +938,10 @@ class Transaction:
         os.rename(src, dst)
 
     def __str__(self):
+        if self._line is not None:
+            # not modified since read from the file
+            return self._line
+
         date_stamp = self.timestamp.strftime("%m/%d/%Y")
         time_stamp = self.timestamp.strftime("%H:%M:%S")
 
@@ -279,7 +951,15 @@ class Transaction:
                 self.product, self.version, self.comment)
 
 
-def parse_transaction_line(line):
+def _split_transaction_line(line):
+    """
+    split transaction's line into it's fields, without decoding
+    the timestamp
+
+    :return: (id, type, ref, timestamp, product, version, comment,
+             deleted_id) tuple, the fields not applicable to the
+             transaction's type are None
+    """
     # TODO handle parse errors in this function
     (id, type, tail) = TRANSACTION_PREFIX_RE.match(line).groups()
 
@@ -288,17 +968,82 @@ def parse_transaction_line(line):
         (ref, timestamp, product, version, comment) = \
             TRANSACTION_ADD_RE.match(tail).groups()
 
-        timestamp = datetime.strptime(timestamp, "%m/%d/%Y,%H:%M:%S")
-        return dict(id=id, type=type, ref=ref, timestamp=timestamp,
-                    product=product, version=version, comment=comment)
+        return id, type, ref, timestamp, product, version, comment, None
 
     # this should be a delete transaction
     assert type == "del"
     (deleted_id,) = TRANSACTION_DEL_RE.match(tail).groups()
 
+    return id, type, None, None, None, None, None, deleted_id
+
+
+def parse_transaction_line(line):
+    (id, type, ref, timestamp, product, version, comment, deleted_id) = \
+        _split_transaction_line(line)
+
+    if type == "add":
+        timestamp = datetime.strptime(timestamp, "%m/%d/%Y,%H:%M:%S")
+        return dict(id=id, type=type, ref=ref, timestamp=timestamp,
+                    product=product, version=version, comment=comment)
+
     return dict(id=id, type=type, deleted_id=deleted_id)
 
 
+def _decode_line(line):
+    """
+    decode the line read in binary mode from the server or history file,
+    the same way as the file opened in text mode
+    """
+    return line.decode(locale.getpreferredencoding(False))
+
+
+def _find_sorted_line(data, key):
+    """
+    find the line starting with 'key,' in lines sorted by their keys
+
+    The lines are binary searched, only examining the keys of the
+    lines on the search path. If the line is not found, for example
+    because the lines are not sorted, falls back to a linear search.
+
+    :param data: bytes-like object, e.g. a memory map, with the lines
+    :param key: the key, as bytes
+    :return: the line, without the line terminator, or None if not found
+    """
+    lo = 0
+    hi = len(data)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        newline = data.rfind(b"\n", lo, mid)
+        start = lo if newline == -1 else newline + 1
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = len(data)
+
+        line_key = data[start:end].split(b",", 1)[0]
+        if line_key == key:
+            return data[start:end].rstrip(b"\r")
+        if line_key < key:
+            lo = end + 1
+        else:
+            hi = start
+
+    # not found, fall back to a linear search,
+    # in case the lines are not sorted
+    prefix = key + b","
+    if data[:len(prefix)] == prefix:
+        start = 0
+    else:
+        start = data.find(b"\n" + prefix) + 1
+        if start == 0:
+            return None
+
+    end = data.find(b"\n", start)
+    if end == -1:
+        end = len(data)
+
+    return data[start:end].rstrip(b"\r")
+
+
 class FilesMap:
     def __init__(self):
         self._entries = {}
@@ -315,17 +1060,31 @@ class FilesMap:
         """
         figure out which files can be deleted
         """
+        return self.dropped_entries_of([transaction.id])
+
+    def dropped_entries_of(self, transaction_ids):
+        """
+        figure out which files can be deleted,
+        when all specified transactions are deleted
+        """
+        transaction_ids = set(transaction_ids)
         deleted_entries = []
 
         for entry, trans_ids in self._entries.items():
-            if transaction.id not in trans_ids:
-                continue
-
-            if len(trans_ids) == 1:
+            if transaction_ids.issuperset(trans_ids):
                 deleted_entries.append(entry)
 
         return deleted_entries
 
+    def ref_counts(self):
+        """
+        count the transactions referencing each file
+
+        :return: dictionary of file key to the number of transactions
+        """
+        return {file_key(*entry): len(set(trans_ids))
+                for entry, trans_ids in self._entries.items()}
+
 
 class Transactions:
     transaction_class = Transaction
@@ -347,9 +1106,9 @@ class Transactions:
         transactions = {}
 
         with self._server_file() as sfile:
-            for line in sfile.readlines():
-                transaction = self.transaction_class(
-                    self._symstore, **parse_transaction_line(line))
+            for line in sfile:
+                transaction = self.transaction_class.from_line(
+                    self._symstore, line)
 
                 transactions[transaction.id] = transaction
 
@@ -360,8 +1119,46 @@ class Transactions:
             self._transactions = self._parse_server_file()
         return self._transactions
 
+    def _find_line(self, transaction_id):
+        """
+        look up transaction's line in the server file, without reading
+        the whole file
+
+        :return: the line, or None if the transaction is not found
+        """
+        if not self._server_file_exists():
+            return None
+
+        with open(self._symstore._server_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # empty files can't be memory mapped
+                return None
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                line = _find_sorted_line(data, transaction_id.encode())
+
+        if line is None:
+            return None
+
+        return _decode_line(line)
+
     def find(self, transaction_id):
-        return self._get_transactions().get(transaction_id)
+        """
+        look up a transaction by it's ID
+
+        The transactions in the server file are sorted by their IDs, which
+        allows to look up a transaction without parsing the whole file.
+
+        :return: Transaction object or None if not found
+        """
+        if self._transactions is not None:
+            return self._transactions.get(transaction_id)
+
+        line = self._find_line(transaction_id)
+        if line is None:
+            return None
+
+        return self.transaction_class.from_line(self._symstore, line)
 
     def get_files_map(self):
         fmap = FilesMap()
@@ -380,6 +1177,9 @@ class Transactions:
             sfile.write("%s\n" % transaction)
         # TODO handle I/O errors
 
+        if self._transactions is not None:
+            self._transactions[transaction.id] = transaction
+
     def rewrite_server_file(self, transactions):
         """
         overwrite the server.txt with specified transactions
@@ -393,10 +1193,31 @@ class Transactions:
             for transaction in transactions:
                 sfile.write("%s\n" % transaction)
 
-    def delete(self, transaction):
-        # figure out what files can be removed
-        files_map = self.get_files_map()
-        dropped = files_map.droped_entries(transaction)
+    def delete(self, transaction, dropped=None):
+        """
+        delete transaction's files, that are not referenced by other
+        transactions, and remove the transaction from the server file
+
+        :param dropped: list of (file name, file hash) tuples of the
+                        files to delete, None to figure out the files
+                        by reading all transactions
+        """
+        self.delete_many([transaction], dropped)
+
+    def delete_many(self, transactions, dropped=None):
+        """
+        delete multiple transactions in one pass
+
+        :param dropped: list of (file name, file hash) tuples of the
+                        files to delete, None to figure out the files
+                        by reading all transactions
+        """
+        transaction_ids = [t.id for t in transactions]
+
+        if dropped is None:
+            # figure out what files can be removed
+            files_map = self.get_files_map()
+            dropped = files_map.dropped_entries_of(transaction_ids)
 
         # delete any dropped files
         for file_name, file_hash in dropped:
@@ -408,13 +1229,26 @@ class Transactions:
             if _is_empty_dir(parent_dir):
                 shutil.rmtree(parent_dir)
 
-        # create a list of transaction without the deleted transaction
-        new_transactions = [
-            v for v in self._transactions.values()
-            if v.id != transaction.id]
+        # 'delete' transactions listing from server file
+        self._remove_server_lines(transaction_ids)
+
+        if self._transactions is not None:
+            for transaction_id in transaction_ids:
+                self._transactions.pop(transaction_id, None)
 
-        # 'delete' transaction listing from server file
-        self.rewrite_server_file(new_transactions)
+    def _remove_server_lines(self, transaction_ids):
+        """
+        remove transactions' lines from the server file,
+        without parsing the other transactions
+        """
+        transaction_ids = set(transaction_ids)
+
+        with self._server_file() as sfile:
+            lines = sfile.readlines()
+
+        with self._server_file("w") as sfile:
+            sfile.writelines(line for line in lines
+                             if line.split(",", 1)[0] not in transaction_ids)
 
 
 class History:
@@ -422,7 +1256,7 @@ class History:
 
     def __init__(self, symstore):
         self._symstore = symstore
-        self._transactions = None
+        self._index = linefile.SparseLineIndex()
 
     def _history_file(self, mode="r"):
         return open(self._symstore._history_file, mode=mode)
@@ -430,31 +1264,94 @@ class History:
     def _history_file_exists(self):
         return path.isfile(self._symstore._history_file)
 
-    def _parse_history_file(self):
+    def _transaction(self, line):
+        return self.transaction_class.from_line(self._symstore,
+                                                _decode_line(line))
+
+    def _lines(self, offset=0):
         if not self._history_file_exists():
-            return []
+            return
 
-        transactions = []
+        with self._history_file("rb") as hfile:
+            for _, line in linefile.iter_lines(hfile, offset):
+                yield line
 
-        with self._history_file() as hfile:
-            for line in hfile.readlines():
-                transaction = self.transaction_class(
-                    self._symstore, **parse_transaction_line(line))
+    def __iter__(self):
+        """
+        iterate over the transactions, oldest first, reading them
+        from the history file as needed
+        """
+        return (self._transaction(line) for line in self._lines())
 
-                transactions.append(transaction)
+    def __reversed__(self):
+        """
+        iterate over the transactions, newest first, reading them
+        from the end of the history file as needed
+        """
+        if not self._history_file_exists():
+            return
 
-        return transactions
+        with self._history_file("rb") as hfile:
+            for line in linefile.iter_lines_reversed(hfile):
+                yield self._transaction(line)
 
-    def _get_transactions(self):
-        if self._transactions is None:
-            self._transactions = self._parse_history_file()
-        return self._transactions
+    def _update_index(self):
+        if not self._history_file_exists():
+            return
+
+        with self._history_file("rb") as hfile:
+            self._index.update(hfile)
 
     def __len__(self):
-        return len(self._get_transactions())
+        self._update_index()
+        return len(self._index)
 
     def __getitem__(self, item):
-        return self._get_transactions()[item]
+        """
+        get transactions by their positions in the history
+
+        Negative positions are looked up reading the history file from
+        the end, other positions are looked up with the sparse index of
+        the file's lines.
+        """
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+
+        if item < 0:
+            newest = reversed(self)
+            transaction = next(islice(newest, -item - 1, None), None)
+            newest.close()
+            if transaction is None:
+                raise IndexError("history index out of range")
+            return transaction
+
+        if item >= len(self):
+            raise IndexError("history index out of range")
+
+        offset, skip = self._index.locate(item)
+        lines = self._lines(offset)
+        line = next(islice(lines, skip, None))
+        lines.close()
+
+        return self._transaction(line)
+
+    def since(self, transaction_id):
+        """
+        iterate over the transactions newer than the specified transaction
+
+        The transactions are recorded in the history in the order of their
+        IDs, which allows to find the first newer transaction by binary
+        searching the history file.
+
+        :param transaction_id: transaction ID
+        """
+        if not self._history_file_exists():
+            return
+
+        with self._history_file("rb") as hfile:
+            offset = linefile.bisect_lines(hfile, transaction_id.encode())
+            for _, line in linefile.iter_lines(hfile, offset):
+                yield self._transaction(line)
 
     def _write_line(self, new_line):
         def prefix_with_newline(f):
@@ -490,12 +1387,28 @@ class History:
         self._write_line("%s" % transaction)
 
     def delete(self, transaction_id, next_transaction_id):
-        self._write_line("%s,del,%s" % (next_transaction_id, transaction_id))
+        self.delete_many([(transaction_id, next_transaction_id)])
+
+    def delete_many(self, deletes):
+        """
+        record multiple deleted transactions, with a single write
+
+        :param deletes: list of (deleted transaction ID, delete
+                        transaction ID) tuples
+        """
+        self._write_line("\n".join("%s,del,%s" % (delete_id, transaction_id)
+                                   for transaction_id, delete_id in deletes))
 
 
 class Store:
-    def __init__(self, store_path):
+    """
+    :param store_path: root directory of the symbols store
+    :param hash_cache: optional HashCache object, used to avoid parsing
+                       files that have been hashed before
+    """
+    def __init__(self, store_path, hash_cache=None):
         self._path = store_path
+        self.hash_cache = hash_cache
         self.transactions = Transactions(self)
         self.history = History(self)
 
@@ -524,6 +1437,14 @@ class Store:
     def _server_file(self):
         return path.join(self._path, SERVER_FILE)
 
+    @property
+    def _refcount_file(self):
+        return path.join(self._path, REFCOUNT_FILE)
+
+    @property
+    def _journal_file(self):
+        return path.join(self._path, JOURNAL_FILE)
+
     @property
     def _pingme_file(self):
         return path.join(self._path, PINGME_FILE)
@@ -538,16 +1459,26 @@ class Store:
             os.mkdir(admin_dir)
             # TODO handle mkdir errors
 
-    def _next_transaction_id(self):
+    def _last_transaction_id(self):
+        """
+        :return: the ID of the last transaction,
+                 or None if no transactions have been made
+        """
         last_id_file = self._last_id_file
 
-        last_id = 0
-        if path.isfile(last_id_file):
-            # TODO handle open and read errors
-            # TODO handle parse errors
-            last_id = int(fileio.read_all(last_id_file))
+        if not path.isfile(last_id_file):
+            return None
+
+        # TODO handle open and read errors
+        # TODO handle parse errors
+        return "%.010d" % int(fileio.read_all(last_id_file))
+
+    def _next_transaction_id(self):
+        last_id = self._last_transaction_id()
+        if last_id is None:
+            last_id = 0
 
-        return "%.010d" % (last_id + 1)
+        return "%.010d" % (int(last_id) + 1)
 
     def _write_transaction_id(self, trans_id):
         with open(self._last_id_file, "w") as id_file:
@@ -565,31 +1496,336 @@ class Store:
         return Transaction(self, type=type, product=product,
                            version=version, comment=comment)
 
+    def _published_hashes(self, file_name):
+        """
+        list the hashes of published versions of a file,
+        with a single scan of the file name's directory
+
+        :return: set of normalized case file hashes
+        """
+        try:
+            with os.scandir(path.join(self._path, file_name)) as it:
+                return {path.normcase(entry.name)
+                        for entry in it if entry.is_dir()}
+        except (FileNotFoundError, NotADirectoryError):
+            return set()
+
+    def find_published(self, keys):
+        """
+        find out which files are published in the store
+
+        This is a batched version of TransactionEntry.exists(). Instead of
+        checking each file's directory, the directory of each file name is
+        scanned once, which makes checking many files much faster,
+        especially on network file systems.
+
+        :param keys: iterable of (file name, file hash) tuples
+        :return: set of (file name, file hash) tuples of the published files
+        """
+        by_name = {}
+        for file_name, file_hash in keys:
+            by_name.setdefault(file_name, []).append(file_hash)
+
+        published = set()
+        for file_name, file_hashes in by_name.items():
+            hashes = self._published_hashes(file_name)
+            published.update((file_name, file_hash)
+                             for file_hash in file_hashes
+                             if path.normcase(file_hash) in hashes)
+
+        return published
+
+    def add_files(self, paths, product, version, comment,
+                  compress=False, skip_published=False, workers=None,
+                  options=None):
+        """
+        publish files in a new transaction
+
+        :param paths: list of paths of files to publish
+        :param compress: True if files should be compressed, or a function
+                         taking file path, returning True if the file should
+                         be compressed
+        :param skip_published: exclude files already published in the store,
+                               if checksums are enabled in 'options', only
+                               the files with matching checksums are
+                               excluded
+        :param workers: maximum number of threads used to parse the files
+        :param options: PublishOptions object, None for default options
+
+        :return: the committed transaction,
+                 or None if there are no new files to publish
+
+        :raises symstore.FileErrors: if some of the files could not be
+                                     parsed, lists errors for all of them
+        """
+        if options is None:
+            options = PublishOptions()
+
+        transaction = self.new_transaction(product, version, comment)
+        entries = transaction.new_entries(paths, compress, workers)
+
+        published = [False] * len(entries)
+        if skip_published and options.checksums:
+            with ThreadPoolExecutor(max_workers=workers) as e:
+                published = list(e.map(lambda entry:
+                                       entry.verify_published(), entries))
+        elif skip_published:
+            keys = [(entry.file_name, entry.file_hash) for entry in entries]
+            published_keys = self.find_published(keys)
+            published = [key in published_keys for key in keys]
+
+        for entry, is_published in zip(entries, published):
+            if is_published:
+                # 'skip published' mode is on and this file
+                # have already been published, skip it
+                continue
+
+            transaction.add_entry(entry)
+
+        if len(transaction.entries) == 0:
+            return None
+
+        self.commit(transaction, options)
+        return transaction
+
+    def _refcount_index(self):
+        """
+        get the reference count index, if it's up to date with the store
+
+        An out of date index is discarded, it needs to be rebuilt with
+        rebuild_refcount_index() method.
+
+        :return: RefCountIndex object, or None if there is no index
+        """
+        index = RefCountIndex(self._refcount_file)
+        if not index.exists():
+            return None
+
+        if index.last_id() != self._last_transaction_id():
+            log.warning("reference count index is out of date, "
+                        "discarding it")
+            index.discard()
+            return None
+
+        return index
+
+    def rebuild_refcount_index(self):
+        """
+        rebuild the reference count index from all transactions
+
+        Use on stores that have been created or modified by other tools.
+        """
+        counts = self.transactions.get_files_map().ref_counts()
+
+        last_id = self._last_transaction_id()
+        if last_id is None:
+            last_id = "%.010d" % 0
+
+        RefCountIndex(self._refcount_file).write(counts, last_id)
+
+    def _entry_keys(self, transaction):
+        """
+        :return: sorted list of distinct keys of transaction's files
+        """
+        return sorted({file_key(e.file_name, e.file_hash)
+                       for e in transaction.entries})
+
+    def _dropped_files(self, transactions, index):
+        """
+        figure out which files are referenced only by the transactions
+
+        :param index: up to date RefCountIndex object, None to figure
+                      out the files by reading all transactions
+        :return: list of (file name, file hash) tuples
+        """
+        if index is None:
+            files_map = self.transactions.get_files_map()
+            return files_map.dropped_entries_of([t.id for t in transactions])
+
+        # file key -> (file name, file hash)
+        entries = {}
+        for transaction in transactions:
+            entries.update((file_key(e.file_name, e.file_hash),
+                            (e.file_name, e.file_hash))
+                           for e in transaction.entries)
+
+        remaining = index.load(entries.keys())
+        for transaction in transactions:
+            for key in self._entry_keys(transaction):
+                remaining[key] = remaining.get(key, 0) - 1
+
+        return [entry for key, entry in entries.items()
+                if remaining[key] <= 0]
+
+    def dropped_files(self, transactions):
+        """
+        figure out which files would be deleted, if the transactions
+        were deleted
+
+        Uses the reference count index when available, otherwise reads
+        all transactions in the store.
+
+        :param transactions: Transaction objects
+        :return: list of (file name, file hash) tuples
+        """
+        return self._dropped_files(transactions, self._refcount_index())
+
     def delete_transaction(self, transaction_id):
-        # look up the transaction to delete
-        transaction = self.transactions.find(transaction_id)
-        if transaction is None:
-            raise errs.TransactionNotFound()
+        """
+        delete transaction, and the files only it references
+        """
+        self.delete_transactions([transaction_id])
+
+    def delete_transactions(self, transaction_ids, dropped=None):
+        """
+        delete multiple transactions, and the files only they reference
+
+        The transactions are deleted in one pass, the files to delete are
+        figured out once, and the server, history and pingme files are
+        written once. Each deleted transaction is recorded in the history
+        with it's own delete transaction ID.
+
+        With an up to date reference count index, only the deleted
+        transactions' entries are read, otherwise all transactions
+        are read to figure out which files can be deleted.
+
+        :param transaction_ids: IDs of the transactions to delete
+        :param dropped: the files to delete, as returned by
+                        dropped_files() for the transactions, None to
+                        figure them out
+        :raises symstore.TransactionNotFound: if some of the transactions
+                                              does not exist, no
+                                              transactions are deleted
+        """
+        # look up the transactions to delete
+        transactions = []
+        for transaction_id in dict.fromkeys(transaction_ids):
+            transaction = self.transactions.find(transaction_id)
+            if transaction is None:
+                raise errs.TransactionNotFound(transaction_id)
+            transactions.append(transaction)
+
+        if not transactions:
+            return
+
+        keys = []
+        for transaction in transactions:
+            keys += self._entry_keys(transaction)
 
-        self.transactions.delete(transaction)
-        transaction.mark_deleted()
+        index = self._refcount_index()
+        if dropped is None:
+            dropped = self._dropped_files(transactions, index)
 
-        next_transaction_id = self._next_transaction_id()
-        self.history.delete(transaction.id, next_transaction_id)
+        self.transactions.delete_many(transactions, dropped)
+        for transaction in transactions:
+            transaction.mark_deleted()
 
-        self._write_transaction_id(next_transaction_id)
+        first_id = int(self._next_transaction_id())
+        deletes = [(transaction.id, "%.010d" % (first_id + i))
+                   for i, transaction in enumerate(transactions)]
+        last_delete_id = deletes[-1][1]
+
+        self.history.delete_many(deletes)
+
+        if index is not None:
+            index.remove(keys, last_delete_id)
+
+        self._write_transaction_id(last_delete_id)
         self._touch_pingme(round(time.time()))
 
-    def commit(self, transaction):
+    def commit(self, transaction, options=None):
+        """
+        publish transaction's files and record the transaction
+
+        The progress of the commit is recorded in a journal, so that an
+        interrupted commit can be finished with resume() method.
+
+        :param options: PublishOptions object, None for default options
+        """
         self._create_dirs()
 
+        journal = PublishJournal(self._journal_file)
+        if journal.exists():
+            log.warning("discarding the journal of an interrupted commit")
+
+        transaction_id = self._next_transaction_id()
+        journal.create(transaction_id, transaction)
+
+        self._commit(transaction, transaction_id, options, journal)
+
+    def resume(self, options=None):
+        """
+        finish the interrupted commit of a transaction
+
+        Only the entries that were not published before the commit was
+        interrupted are published, then the transaction is recorded.
+
+        :param options: PublishOptions object, None for default options
+        :return: the committed transaction, or None if there is no
+                 interrupted commit to resume
+        """
+        journal = PublishJournal(self._journal_file)
+        loaded = journal.load()
+        if loaded is None:
+            return None
+
+        record, entry_records = loaded
+        transaction = self.new_transaction(record["product"],
+                                           record["version"],
+                                           record["comment"])
+        for i, entry_record in enumerate(entry_records):
+            entry = transaction.transaction_entry_class(
+                self, entry_record["file_name"], entry_record["file_hash"],
+                entry_record["source_file"], entry_record["compressed"])
+            if i not in journal.done:
+                entry._remove_temp_files()
+            transaction.add_entry(entry)
+
+        log.info("resuming transaction %s, %s of %s files published",
+                 record["id"], len(journal.done), len(entry_records))
+
+        self._commit(transaction, record["id"], options, journal)
+        return transaction
+
+    def _commit(self, transaction, transaction_id, options, journal):
         now = round(time.time())
 
-        transaction.commit(self._next_transaction_id(),
-                           datetime.fromtimestamp(now))
+        transaction.commit(transaction_id,
+                           datetime.fromtimestamp(now),
+                           options, journal)
 
-        self.transactions.add(transaction)
-        self.history.add(transaction)
+        # when resuming, the commit may have been interrupted while
+        # recording the transaction, skip the steps that were done
+        if self.transactions.find(transaction.id) is None:
+            self.transactions.add(transaction)
 
+        if len(self.history) == 0 or \
+                self.history[-1].id != transaction.id:
+            self.history.add(transaction)
+
+        self._update_refcount_index(transaction)
         self._write_transaction_id(transaction.id)
         self._touch_pingme(now)
+
+        journal.remove()
+
+    def _update_refcount_index(self, transaction):
+        """
+        record committed transaction's files in the reference count index
+
+        The index is created on the first commit to a new store.
+        """
+        if RefCountIndex(self._refcount_file).last_id() == transaction.id:
+            # already recorded, before the commit was interrupted
+            return
+
+        if self._last_transaction_id() is None:
+            # new store, start a new index
+            index = RefCountIndex(self._refcount_file)
+            index.discard()
+        else:
+            index = self._refcount_index()
+            if index is None:
+                return
+
+        index.add(self._entry_keys(transaction), transaction.id)
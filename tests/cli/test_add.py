@@ -50,6 +50,76 @@ class TestNewStore(util.CliTester):
 
         self.assertSymstoreDir("max_compress.zip")
 
+    def test_add_hardlink(self):
+        retcode, stderr = util.run_script(
+            self.symstore_path, ["bigage.pdb", "dummyprog.pdb"],
+            ["--link-mode", "hardlink", "--verbose",
+             "--product-name", "dummyprod"])
+        self.assertEqual(retcode, 0)
+
+        self.assertSymstoreDir("new_store.zip")
+        self.assertRegex(stderr.decode(),
+                         "transaction 0000000001: linked 130560 bytes, "
+                         "copied 0 bytes")
+
+    def test_add_parallel_copy(self):
+        """
+        test publishing files copied in small chunks, concurrently
+        """
+        self.run_add_command(["--parallel-copy", "0",
+                              "--copy-chunk-size", "4096",
+                              "--copy-concurrency", "3",
+                              "--product-name", "dummyprod"],
+                             ["bigage.pdb", "dummyprog.pdb"])
+
+        self.assertSymstoreDir("new_store.zip")
+
+    @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+    def test_add_compression_none(self):
+        """
+        test publishing compressed files, stored in CAB uncompressed
+        """
+        self.run_add_command(["--compress", "--compression", "none",
+                              "--product-name", "dummyprod"],
+                             ["dummyprog.pdb"])
+
+        self.assertSymstoreDir("new_store_compressed.zip")
+
+    @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+    def test_add_compression_level(self):
+        self.run_add_command(["--compress", "--compression", "mszip:9",
+                              "--cab-backend", "builtin",
+                              "--product-name", "dummyprod"],
+                             ["dummyprog.pdb"])
+
+        self.assertSymstoreDir("new_store_compressed.zip")
+
+    @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+    def test_add_min_compress_ratio(self):
+        self.run_add_command(["--compress", "--min-compress-ratio", "5",
+                              "--product-name", "dummyprod"],
+                             ["dummyprog.pdb"])
+
+        self.assertSymstoreDir("new_store_compressed.zip")
+
+    @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+    def test_add_min_compress_ratio_skip(self):
+        """
+        test the case when none of the files compress well enough
+        """
+        retcode, stderr = util.run_script(
+            self.symstore_path, ["bigage.pdb", "dummyprog.pdb"],
+            ["--compress", "--min-compress-ratio", "100", "--verbose",
+             "--product-name", "dummyprod"])
+        self.assertEqual(retcode, 0)
+
+        self.assertSymstoreDir("new_store.zip")
+
+        log = stderr.decode()
+        self.assertRegex(log, "dummyprog.pdb: estimated compression ratio "
+                              r"[\d.]+, not compressing")
+        self.assertRegex(log, "compressed 0 files, skipped 2 files")
+
 
 class TestAlternativeExtensions(util.CliTester):
     """
@@ -162,6 +232,26 @@ class TestSkipPublished(util.CliTester):
         self.assertEqual(retcode, 1)
         self.assertEqual(stderr.decode(), "no new files to publish\n")
 
+    def test_skip_checksums(self):
+        """
+        test adding files with '--checksums' flag, files published
+        without checksums are published again, while files with matching
+        checksums are skipped
+        """
+        sidecar = path.join(self.symstore_path, "dummyprog.pdb",
+                            "F6301B4562FE4B4DB691192733ECE6B71",
+                            "dummyprog.pdb.sha256")
+        self.assertFalse(path.exists(sidecar))
+
+        options = ["--skip-published", "--checksums"]
+        self.run_add_command(options, ["dummyprog.pdb"])
+        self.assertTrue(path.isfile(sidecar))
+
+        retcode, stderr = util.run_script(self.symstore_path,
+                                          ["dummyprog.pdb"], options)
+        self.assertEqual(retcode, 1)
+        self.assertEqual(stderr.decode(), "no new files to publish\n")
+
 
 class TestRepublishCompressed(util.CliTester):
     initial_dir_zip = "new_store_compressed.zip"
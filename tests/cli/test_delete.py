@@ -1,3 +1,4 @@
+import symstore
 from tests.cli import util
 
 
@@ -22,3 +23,41 @@ class TestDelete(util.CliTester):
 
         self.run_add_command(["--delete", "0000000002"], [])
         self.assertSymstoreDir("syms-del2.zip")
+
+
+class TestDeleteRange(util.CliTester):
+    initial_dir_zip = "new_store.zip"
+
+    def test_gaps(self):
+        """
+        test deleting a range of IDs, that includes deleted transactions,
+        and the IDs of delete transactions
+        """
+        # the store contains transaction 1, add transactions 2 to 4
+        for _ in range(3):
+            self.run_add_command([], ["dummylib.dll"])
+        self.run_add_command(["--delete", "3"], [])
+
+        retcode, stderr = util.run_script(self.symstore_path, [],
+                                          ["--delete", "2-5"])
+        self.assertEqual(retcode, 0)
+        self.assertEqual(stderr.decode(),
+                         "skipping IDs not found: 0000000003, 0000000005" +
+                         util.line_end())
+
+        store = symstore.Store(self.symstore_path)
+        self.assertEqual([t for t, _ in store.transactions.items()],
+                         ["0000000001"])
+        self.assertEqual(store._next_transaction_id(), "0000000008")
+
+    def test_explicit_missing(self):
+        """
+        test that explicitly specified missing ID is an error
+        """
+        retcode, stderr = util.run_script(self.symstore_path, [],
+                                          ["--delete", "1,2"])
+        self.assertEqual(retcode, 1)
+        self.assertRegex(stderr.decode(),
+                         "no transaction with id '0000000002' found")
+        self.assertEqual(
+            len(symstore.Store(self.symstore_path).transactions.items()), 1)
@@ -79,3 +79,94 @@ class TestFileNotFound(testcase.TestCase):
         retcode, stderr = util.run_script(SYMSTORE_PATH, [self.PE_FILE])
         self.assertEqual(retcode, 1)
         self.assertRegex(stderr.decode(), "No such file: %s" % exe_path)
+
+
+class TestMultipleErrors(testcase.TestCase):
+    def test_all_errors_reported(self):
+        """
+        test that errors are reported for all invalid files
+        """
+        retcode, stderr = util.run_script(
+            SYMSTORE_PATH,
+            ["empty.exe", "dummyprog.pdb", "invalid.pdb", "truncated.exe"])
+
+        self.assertEqual(retcode, 1)
+
+        lines = stderr.decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertRegex(lines[0], ".*empty.exe: can't figure out file type")
+        self.assertRegex(lines[1],
+                         ".*invalid.pdb: can't figure out file type")
+        self.assertRegex(lines[2], ".*truncated.exe: invalid PE file:.*")
+
+
+class TestInvalidCompression(testcase.TestCase):
+    def test_unknown_method(self):
+        retcode, stderr = util.run_script(SYMSTORE_PATH, ["dummyprog.pdb"],
+                                          ["-z", "--compression", "foo"])
+
+        self.assertEqual(retcode, 2)
+        self.assertRegex(stderr.decode(),
+                         "unknown compression method 'foo'")
+
+    def test_unsupported_method(self):
+        retcode, stderr = util.run_script(SYMSTORE_PATH, ["dummyprog.pdb"],
+                                          ["-z", "--cab-backend", "builtin",
+                                           "--compression", "lzx"])
+
+        self.assertEqual(retcode, 1)
+        self.assertRegex(stderr.decode(),
+                         "lzx compression not supported by "
+                         "'builtin' backend")
+
+    def test_without_compress(self):
+        retcode, stderr = util.run_script(SYMSTORE_PATH, ["dummyprog.pdb"],
+                                          ["--compression", "mszip"])
+
+        self.assertEqual(retcode, 2)
+        self.assertRegex(stderr.decode(),
+                         "--compression requires -z/--compress")
+
+    def test_invalid_processes(self):
+        retcode, stderr = util.run_script(SYMSTORE_PATH, ["dummyprog.pdb"],
+                                          ["-z", "--compress-processes", "0"])
+
+        self.assertEqual(retcode, 2)
+        self.assertRegex(stderr.decode(), "invalid positive integer '0'")
+
+
+class TestInvalidParallelCopy(testcase.TestCase):
+    def test_invalid_concurrency(self):
+        retcode, stderr = util.run_script(SYMSTORE_PATH, ["dummyprog.pdb"],
+                                          ["--parallel-copy", "1024",
+                                           "--copy-concurrency", "0"])
+
+        self.assertEqual(retcode, 2)
+        self.assertRegex(stderr.decode(), "invalid positive integer '0'")
+
+
+class TestNothingToResume(util.CliTester):
+    initial_dir_zip = "new_store.zip"
+
+    def test_resume(self):
+        retcode, stderr = util.run_script(self.symstore_path, [],
+                                          ["--resume"])
+        self.assertEqual(retcode, 1)
+        self.assertEqual(stderr.decode(),
+                         "no interrupted transaction to resume\n")
+
+
+class TestInvalidRetentionRules(util.CliTester):
+    initial_dir_zip = "new_store.zip"
+
+    def test_invalid_rules(self):
+        rules_file = path.join(self.symstore_path, "rules.json")
+        with open(rules_file, "w") as f:
+            f.write('{"rules": [{"keep_last": "5"}]}')
+
+        retcode, stderr = util.run_script(self.symstore_path, [],
+                                          ["--retention", rules_file])
+        self.assertEqual(retcode, 1)
+        self.assertRegex(stderr.decode(),
+                         "invalid retention rules .*: rule 1: "
+                         "keep_last must be an integer")
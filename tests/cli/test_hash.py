@@ -0,0 +1,99 @@
+import os
+import csv
+import json
+import shutil
+import tempfile
+import subprocess
+from os import path
+from tests import conf
+from tests import testcase
+from tests.cli import util
+
+
+def _run_hash(args):
+    command = [util.SYMSTORE_COMMAND, "hash"] + args
+    if conf.WITH_COVERAGE:
+        command = ["coverage", "run", "-p"] + command
+
+    proc = subprocess.Popen(command,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = proc.communicate()
+
+    return proc.returncode, stdout.decode(), stderr.decode()
+
+
+def run_hash(args):
+    retcode, stdout, _ = _run_hash(args)
+    return retcode, stdout
+
+
+class TestHash(testcase.TestCase):
+    """
+    test 'symstore hash' command
+    """
+    def test_jsonl(self):
+        retcode, out = run_hash([util.symfile_path("dummyprog.pdb"),
+                                 util.symfile_path("dummyprog.exe")])
+        self.assertEqual(retcode, 0)
+
+        records = sorted([json.loads(line) for line in out.splitlines()],
+                         key=lambda r: r["path"])
+        self.assertEqual(records, [
+            dict(path=util.symfile_path("dummyprog.exe"),
+                 key="dummyprog.exe\\5617D4FE8000"),
+            dict(path=util.symfile_path("dummyprog.pdb"),
+                 key="dummyprog.pdb\\F6301B4562FE4B4DB691192733ECE6B71"),
+        ])
+
+    def test_csv_error(self):
+        retcode, out = run_hash(["--format", "csv",
+                                 util.symfile_path("empty.exe")])
+        self.assertEqual(retcode, 1)
+
+        rows = list(csv.reader(out.splitlines()))
+        self.assertEqual(rows, [
+            ["path", "key", "error"],
+            [util.symfile_path("empty.exe"), "",
+             "can't figure out file type"],
+        ])
+
+    def test_hash_cache_verbose(self):
+        """
+        test that cache hits and misses are logged in verbose mode
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            args = ["--verbose",
+                    "--hash-cache", path.join(temp_dir, "hashes.json"),
+                    util.symfile_path("dummyprog.pdb")]
+
+            retcode, _, stderr = _run_hash(args)
+            self.assertEqual(retcode, 0)
+            self.assertIn("hash cache: 0 hits, 1 misses", stderr)
+
+            retcode, _, stderr = _run_hash(args)
+            self.assertEqual(retcode, 0)
+            self.assertIn("hash cache: 1 hits, 0 misses", stderr)
+
+
+class TestHashStore(testcase.TestCase):
+    """
+    test publishing to an existing store in a directory named 'hash'
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.makedirs(path.join(self.temp_dir, "hash", "000Admin"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_publish(self):
+        command = [util.SYMSTORE_COMMAND, "hash",
+                   util.symfile_path("dummyprog.pdb")]
+        if conf.WITH_COVERAGE:
+            command = ["coverage", "run", "-p"] + command
+
+        retcode = subprocess.call(command, cwd=self.temp_dir)
+
+        self.assertEqual(retcode, 0)
+        self.assertTrue(path.isfile(path.join(self.temp_dir, "hash",
+                                              "000Admin", "server.txt")))
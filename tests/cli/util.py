@@ -9,6 +9,7 @@ from os import path
 from datetime import datetime
 
 import symstore
+from symstore import cabfile
 
 from tests import conf, testcase
 
@@ -47,14 +48,15 @@ class ZipTransactionEntry(symstore.TransactionEntry):
 
         return cls(symstore, file_name, file_hash, source_file, compressed)
 
-    def read(self):
-        if self.compressed:
-            raise NotImplementedError("reading compressed data not supported")
-
+    def open(self):
         name = ZipTransactionEntry._archive_name(self.file_name,
-                                                 self.file_hash)
-        with self._symstore._zfile.open(name) as f:
-            return f.read()
+                                                 self.file_hash,
+                                                 self.compressed)
+        if not self.compressed:
+            return self._symstore._zfile.open(name)
+
+        cab = io.BytesIO(self._symstore._zfile.read(name))
+        return cabfile.CabFile(cab).open()
 
 
 class ZipTransaction(symstore.Transaction):
@@ -78,8 +80,12 @@ class ZipTransactions(symstore.Transactions):
 class ZipHistory(symstore.History):
     transaction_class = ZipTransaction
 
-    def _history_file(self):
-        return io.TextIOWrapper(self._symstore._zfile.open(HISTORY_FILE))
+    def _history_file(self, mode="r"):
+        hfile = self._symstore._zfile.open(HISTORY_FILE)
+        if "b" in mode:
+            return hfile
+
+        return io.TextIOWrapper(hfile)
 
     def _history_file_exists(self):
         return True
@@ -188,13 +194,10 @@ class CliTester(testcase.TestCase):
 
         self.assertEqual(expected.compressed, got.compressed)
 
-        if not expected.compressed:
-            # as we don't support reading compressed entries data,
-            # check data only for uncompressed entries
-            self.assertEqual(expected.read(),
-                             got.read(),
-                             "Unexpected contents for %s/%s" %
-                             (expected.file_name, expected.file_hash))
+        self.assertEqual(expected.read(),
+                         got.read(),
+                         "Unexpected contents for %s/%s" %
+                         (expected.file_name, expected.file_hash))
 
     def _assert_transaction_timestamp(self, expected, got, modify_timestamp):
         self.assertEqual(expected.type, got.type)
@@ -0,0 +1,78 @@
+from os import path
+import shutil
+import unittest
+import tempfile
+import symstore
+from tests.cli import util
+
+FILES = ["dummylib.dll", "bigage.pdb", "dummyprog.exe", "dummylib.pdb",
+         "dummyprog.pdb", "vc140.pdb"]
+
+
+class TestAddFiles(unittest.TestCase):
+    """
+    test publishing files with Store.add_files()
+    """
+    def setUp(self):
+        self.symstore = symstore.Store(
+            path.join(tempfile.mkdtemp(), "store"))
+
+    def tearDown(self):
+        shutil.rmtree(path.dirname(self.symstore._path))
+
+    def test_order(self):
+        """
+        check that entries are listed in the same order as the files
+        """
+        files = [util.symfile_path(f) for f in FILES]
+        self.symstore.add_files(files, "prod", "1.0", "", workers=4)
+
+        (_, transaction), = self.symstore.transactions.items()
+        self.assertEqual([e.file_name for e in transaction.entries], FILES)
+
+    def test_skip_published(self):
+        files = [util.symfile_path(f) for f in FILES]
+        self.symstore.add_files(files[:2], "prod", "1.0", "")
+
+        transaction = self.symstore.add_files(files, "prod", "1.1", "",
+                                              skip_published=True)
+        self.assertEqual([e.file_name for e in transaction.entries],
+                         FILES[2:])
+
+        # nothing new to publish
+        self.assertIsNone(self.symstore.add_files(files, "prod", "1.2", "",
+                                                  skip_published=True))
+
+    def test_find_published(self):
+        files = [util.symfile_path(f) for f in FILES]
+        transaction = self.symstore.add_files(files[:3], "prod", "1.0", "")
+
+        published = [(e.file_name, e.file_hash) for e in transaction.entries]
+        keys = published + [
+            # not published version of a published file
+            ("dummylib.dll", "00000000000"),
+            # file name that have not been published
+            ("vc140.pdb", "A1B2C3D41"),
+        ]
+
+        self.assertEqual(self.symstore.find_published(keys), set(published))
+        self.assertEqual(self.symstore.find_published([]), set())
+
+    def test_errors(self):
+        """
+        check that errors are collected for all failed files
+        """
+        files = [util.symfile_path(f)
+                 for f in ["empty.exe", "dummylib.dll", "noexist.pdb"]]
+
+        with self.assertRaises(symstore.FileErrors) as cm:
+            self.symstore.add_files(files, "prod", "1.0", "")
+
+        (file0, err0), (file1, err1) = cm.exception.errors
+        self.assertEqual(file0, files[0])
+        self.assertIsInstance(err0, symstore.UnknownFileType)
+        self.assertEqual(file1, files[2])
+        self.assertIsInstance(err1, symstore.FileNotFound)
+
+        # nothing should be published
+        self.assertEqual(list(self.symstore.transactions.items()), [])
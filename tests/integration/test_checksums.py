@@ -0,0 +1,109 @@
+import os
+import shutil
+import unittest
+import tempfile
+from os import path
+
+import symstore
+from symstore import cab
+from symstore import fileio
+from tests.cli import util
+
+
+class TestChecksums(unittest.TestCase):
+    """
+    test publishing files with checksum sidecars, and skipping
+    published files by comparing the checksums
+    """
+    FILES = ["dummylib.pdb", "dummyprog.exe"]
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.symstore = symstore.Store(path.join(self.temp_dir, "store"))
+
+        self.files = []
+        for file_name in self.FILES:
+            file_path = path.join(self.temp_dir, file_name)
+            shutil.copy(util.symfile_path(file_name), file_path)
+            self.files.append(file_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _publish(self, compress=False, **options):
+        return self.symstore.add_files(
+            self.files, "prod", "1.0", "", compress=compress,
+            skip_published=True,
+            options=symstore.PublishOptions(checksums=True, **options))
+
+    def _published_files(self, transaction):
+        return sorted(path.basename(e.source_file)
+                      for e in transaction.entries)
+
+    def _assert_checksums(self, transaction):
+        for entry in transaction.entries:
+            self.assertEqual(entry.checksum(),
+                             fileio.Checksum.of_file(entry.source_file))
+            self.assertTrue(entry.verify_published())
+
+    def test_publish(self):
+        transaction = self._publish()
+
+        self.assertEqual(self._published_files(transaction), self.FILES)
+        self._assert_checksums(transaction)
+
+        # all files are published, nothing to publish
+        self.assertIsNone(self._publish())
+
+    @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+    def test_publish_compressed(self):
+        transaction = self._publish(compress=True)
+        self._assert_checksums(transaction)
+
+        self.assertIsNone(self._publish(compress=True))
+
+    @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+    def test_publish_compress_processes(self):
+        transaction = self._publish(compress=True, compress_processes=2)
+        self._assert_checksums(transaction)
+
+    def test_missing_checksum(self):
+        """
+        test that files without checksum sidecar, for example from an
+        interrupted publish, are published again
+        """
+        transaction = self._publish()
+        os.remove(transaction.entries[0]._checksum_path())
+
+        transaction = self._publish()
+        self.assertEqual(self._published_files(transaction),
+                         ["dummylib.pdb"])
+        self._assert_checksums(transaction)
+
+    def test_changed_contents(self):
+        """
+        test that files with the same key, but different contents,
+        are published again
+        """
+        self._publish()
+
+        # change last byte of the PE file, the key stays the same
+        with open(self.files[1], "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xff]))
+
+        transaction = self._publish()
+        self.assertEqual(self._published_files(transaction),
+                         ["dummyprog.exe"])
+        self._assert_checksums(transaction)
+
+    def test_no_checksums(self):
+        """
+        test that files published without checksums are published again
+        """
+        self.symstore.add_files(self.files, "prod", "1.0", "")
+
+        transaction = self._publish()
+        self.assertEqual(self._published_files(transaction), self.FILES)
@@ -0,0 +1,94 @@
+import os
+import sys
+import shutil
+import unittest
+import tempfile
+from os import path
+
+import symstore
+from symstore import cab
+from tests.cli import util
+
+
+@unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+class TestCompressProcesses(unittest.TestCase):
+    """
+    test publishing compressed files using a pool of processes
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.symstore = symstore.Store(path.join(self.temp_dir, "store"))
+        self.options = symstore.PublishOptions(compress_processes=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _store_files(self):
+        files = []
+        for dir_path, _, file_names in os.walk(self.symstore._path):
+            files += [path.relpath(path.join(dir_path, f),
+                                   self.symstore._path)
+                      for f in file_names]
+
+        return sorted(files)
+
+    def test_publish(self):
+        transaction = self.symstore.add_files(
+            [util.symfile_path("dummylib.pdb"),
+             util.symfile_path("dummyprog.exe")],
+            "prod", "1.0", "", compress=lambda f: f.endswith(".pdb"),
+            options=self.options)
+
+        pdb_entry, exe_entry = transaction.entries
+        self.assertTrue(pdb_entry.compressed)
+        self.assertFalse(exe_entry.compressed)
+
+        self.assertEqual(self._store_files(), [
+            path.join("000Admin", "0000000001"),
+            path.join("000Admin", "history.txt"),
+            path.join("000Admin", "lastid.txt"),
+            path.join("000Admin", "refcount.txt"),
+            path.join("000Admin", "server.txt"),
+            path.join("dummylib.pdb", "86808261E6FD4CC29DC8D3CEC6FC84AF1",
+                      "dummylib.pd_"),
+            path.join("dummyprog.exe", "5617D4FE8000", "dummyprog.exe"),
+            "pingme.txt",
+        ])
+
+    @unittest.skipIf(sys.platform == "win32", "no file mode bits on windows")
+    def test_file_mode(self):
+        """
+        test that compressed files are published with default permissions
+        """
+        umask = os.umask(0o022)
+        try:
+            transaction = self.symstore.add_files(
+                [util.symfile_path("dummylib.pdb")], "prod", "1.0", "",
+                compress=True, options=self.options)
+        finally:
+            os.umask(umask)
+
+        entry, = transaction.entries
+        self.assertEqual(os.stat(entry._compressed_path()).st_mode & 0o777,
+                         0o644)
+
+    def test_compression_error(self):
+        """
+        test that no temporary files are left behind,
+        when compression fails
+        """
+        pdb_path = path.join(self.temp_dir, "dummylib.pdb")
+        shutil.copy(util.symfile_path("dummylib.pdb"), pdb_path)
+
+        transaction = self.symstore.new_transaction("prod", "1.0", "")
+        transaction.add_entry(transaction.new_entry(pdb_path, compress=True))
+
+        # make compression fail by removing source file
+        os.remove(pdb_path)
+
+        with self.assertRaises(Exception):
+            self.symstore.commit(transaction, self.options)
+
+        self.assertEqual(
+            os.listdir(path.join(self.symstore._path, "dummylib.pdb",
+                                 "86808261E6FD4CC29DC8D3CEC6FC84AF1")), [])
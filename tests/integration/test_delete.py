@@ -0,0 +1,171 @@
+import os
+import shutil
+import unittest
+import tempfile
+from os import path
+from unittest import mock
+
+import symstore
+from symstore.refcount import RefCountIndex
+from tests.cli import util
+
+# files published in each transaction
+TRANSACTIONS = [
+    ["dummylib.dll", "dummylib.pdb"],
+    ["dummylib.pdb", "dummyprog.exe"],
+    ["dummylib.dll"],
+]
+
+
+class TestDelete(unittest.TestCase):
+    """
+    test deleting transactions, using the reference count index
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_path = path.join(self.temp_dir, "store")
+        self.symstore = symstore.Store(self.store_path)
+
+        for files in TRANSACTIONS:
+            self.symstore.add_files([util.symfile_path(f) for f in files],
+                                    "prod", "1.0", "")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _published(self):
+        return sorted(f for f in os.listdir(self.store_path)
+                      if f.endswith((".dll", ".pdb", ".exe")))
+
+    def _counts(self):
+        return RefCountIndex(self.symstore._refcount_file).load()
+
+    def _delete(self, transaction_id):
+        # use a new store object, as when running the command line tool
+        symstore.Store(self.store_path).delete_transaction(transaction_id)
+
+    def test_counts(self):
+        self.assertEqual(self._counts(), {
+            "dummylib.dll\\5617D5638000": 2,
+            "dummylib.pdb\\86808261E6FD4CC29DC8D3CEC6FC84AF1": 2,
+            "dummyprog.exe\\5617D4FE8000": 1,
+        })
+
+    def test_delete(self):
+        with mock.patch("symstore.symstore.Transactions.get_files_map") \
+                as files_map_mock:
+            self._delete("0000000001")
+            self.assertEqual(self._published(), ["dummylib.dll",
+                                                 "dummylib.pdb",
+                                                 "dummyprog.exe"])
+
+            self._delete("0000000002")
+            self.assertEqual(self._published(), ["dummylib.dll"])
+
+        # only the deleted transactions should have been read
+        files_map_mock.assert_not_called()
+
+        self.assertEqual(self._counts(), {"dummylib.dll\\5617D5638000": 1})
+
+    def test_out_of_date(self):
+        """
+        test deleting when the store was modified by other tools,
+        and the index is out of date
+        """
+        self.symstore._write_transaction_id("0000000004")
+
+        self._delete("0000000002")
+        self.assertEqual(self._published(), ["dummylib.dll",
+                                             "dummylib.pdb"])
+        self.assertFalse(path.exists(self.symstore._refcount_file))
+
+        # the index is not updated until it's rebuilt
+        self.symstore.add_files([util.symfile_path("dummyprog.exe")],
+                                "prod", "1.0", "")
+        self.assertFalse(path.exists(self.symstore._refcount_file))
+
+        self.symstore.rebuild_refcount_index()
+        self.assertEqual(self._counts(), {
+            "dummylib.dll\\5617D5638000": 2,
+            "dummylib.pdb\\86808261E6FD4CC29DC8D3CEC6FC84AF1": 1,
+            "dummyprog.exe\\5617D4FE8000": 1,
+        })
+
+    def test_rebuild(self):
+        counts = self._counts()
+
+        os.remove(self.symstore._refcount_file)
+        self.symstore.rebuild_refcount_index()
+
+        self.assertEqual(self._counts(), counts)
+        self.assertEqual(
+            RefCountIndex(self.symstore._refcount_file).last_id(),
+            "0000000003")
+
+
+class TestDeleteMany(unittest.TestCase):
+    """
+    test deleting multiple transactions with Store.delete_transactions()
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_path = path.join(self.temp_dir, "store")
+
+        store = symstore.Store(self.store_path)
+        for files in TRANSACTIONS:
+            store.add_files([util.symfile_path(f) for f in files],
+                            "prod", "1.0", "")
+
+        self.symstore = symstore.Store(self.store_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _published(self):
+        return sorted(f for f in os.listdir(self.store_path)
+                      if f.endswith((".dll", ".pdb", ".exe")))
+
+    def _assert_deleted(self):
+        self.assertEqual(self._published(), ["dummylib.dll"])
+
+        store = symstore.Store(self.store_path)
+        self.assertEqual([t for t, _ in store.transactions.items()],
+                         ["0000000003"])
+        self.assertEqual([(t.id, t.type, t.deleted_id)
+                          for t in list(store.history)[3:]],
+                         [("0000000004", "del", "0000000001"),
+                          ("0000000005", "del", "0000000002")])
+        self.assertEqual(store._next_transaction_id(), "0000000006")
+
+        self.assertTrue(path.isfile(path.join(
+            self.store_path, "000Admin", "0000000002.deleted")))
+
+    def test_delete(self):
+        with mock.patch.object(symstore.symstore.History, "_write_line",
+                               autospec=True,
+                               side_effect=symstore.symstore.History.
+                               _write_line) as write_mock:
+            self.symstore.delete_transactions(["0000000001", "0000000002",
+                                               "0000000001"])
+
+        # the history is appended once
+        write_mock.assert_called_once()
+        self._assert_deleted()
+
+    def test_no_index(self):
+        os.remove(self.symstore._refcount_file)
+
+        self.symstore.delete_transactions(["0000000001", "0000000002"])
+        self._assert_deleted()
+
+    def test_not_found(self):
+        """
+        test that no transactions are deleted,
+        if some of them does not exist
+        """
+        with self.assertRaises(symstore.TransactionNotFound) as cm:
+            self.symstore.delete_transactions(["0000000001", "0000000042"])
+
+        self.assertEqual(cm.exception.args, ("0000000042",))
+        self.assertEqual(len(self.symstore.transactions.items()), 3)
+        self.assertEqual(self.symstore._next_transaction_id(), "0000000004")
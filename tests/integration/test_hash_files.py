@@ -0,0 +1,96 @@
+import os
+import struct
+import shutil
+import unittest
+import tempfile
+from os import path
+import symstore
+from symstore import pdb
+from tests import synth
+from tests.cli import util
+
+
+class TestHashFiles(unittest.TestCase):
+    """
+    test computing keys with symstore.hash_files()
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+        # set-up a directory tree with some PE and PDB files,
+        # as well as files in other formats
+        subdir = path.join(self.temp_dir, "sub")
+        os.mkdir(subdir)
+        shutil.copy(util.symfile_path("dummylib.dll"), self.temp_dir)
+        shutil.copy(util.symfile_path("dummylib.pdb"), subdir)
+        shutil.copy(util.symfile_path("invalid.pdb"), subdir)
+        shutil.copy(util.symfile_path("truncated.exe"), subdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_directory(self):
+        results = sorted(symstore.hash_files([self.temp_dir], workers=2))
+
+        keys = [(path.relpath(p, self.temp_dir), key) for p, key, _ in results]
+        self.assertEqual(keys, [
+            ("dummylib.dll", "dummylib.dll\\5617D5638000"),
+            (path.join("sub", "dummylib.pdb"),
+             "dummylib.pdb\\86808261E6FD4CC29DC8D3CEC6FC84AF1"),
+            (path.join("sub", "truncated.exe"), None),
+        ])
+
+        # invalid files inside directories are reported,
+        # files in unknown formats are skipped
+        error = results[2][2]
+        self.assertIsInstance(error, symstore.FileFormatError)
+
+    def test_explicit_unknown_file(self):
+        invalid_pdb = path.join(self.temp_dir, "sub", "invalid.pdb")
+        (fpath, key, error), = symstore.hash_files([invalid_pdb])
+
+        self.assertEqual(fpath, invalid_pdb)
+        self.assertIsNone(key)
+        self.assertIsInstance(error, symstore.UnknownFileType)
+
+    def test_many_files(self):
+        """
+        check that all results are generated, when there are
+        more files then queued at any time
+        """
+        files = [util.symfile_path("dummyprog.exe")] * 100
+        results = list(symstore.hash_files(files, workers=2))
+
+        self.assertEqual(len(results), 100)
+        for fpath, key, error in results:
+            self.assertEqual(key, "dummyprog.exe\\5617D4FE8000")
+
+    def test_corrupt_pdbs(self):
+        """
+        check that corrupt PDB files are reported as errors,
+        and the rest of the files are hashed
+        """
+        contents = synth.pdb_file(page_size=512)
+
+        # page size 0, and truncated file
+        zero_page = bytearray(contents)
+        struct.pack_into("<I", zero_page, len(pdb.SIGNATURE), 0)
+        corrupt = {"zero_page.pdb": zero_page,
+                   "truncated.pdb": contents[:len(contents) - 512]}
+        for name, data in corrupt.items():
+            with open(path.join(self.temp_dir, name), "wb") as f:
+                f.write(data)
+
+        results = sorted(symstore.hash_files([self.temp_dir], workers=2))
+
+        errors = {path.basename(p): e for p, _, e in results if e is not None}
+        self.assertEqual(sorted(errors),
+                         ["truncated.exe", "truncated.pdb", "zero_page.pdb"])
+        for error in errors.values():
+            self.assertIsInstance(error, symstore.FileFormatError)
+
+        keys = [key for _, key, _ in results if key is not None]
+        self.assertEqual(keys, [
+            "dummylib.dll\\5617D5638000",
+            "dummylib.pdb\\86808261E6FD4CC29DC8D3CEC6FC84AF1",
+        ])
@@ -0,0 +1,64 @@
+import os
+import shutil
+import unittest
+import tempfile
+from os import path
+
+import symstore
+from symstore import fileio
+from tests.cli import util
+
+
+class TestLinkMode(unittest.TestCase):
+    """
+    test publishing files with different link modes
+    """
+    FILES = ["dummylib.pdb", "dummyprog.exe"]
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.symstore = symstore.Store(path.join(self.temp_dir, "store"))
+
+        self.files = []
+        for file_name in self.FILES:
+            file_path = path.join(self.temp_dir, file_name)
+            shutil.copy(util.symfile_path(file_name), file_path)
+            self.files.append(file_path)
+
+        self.total_size = sum(os.stat(f).st_size for f in self.files)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _publish(self, link_mode):
+        options = symstore.PublishOptions(link_mode=link_mode)
+        return self.symstore.add_files(self.files, "prod", "1.0", "",
+                                       options=options)
+
+    def _assert_linked(self, transaction, linked):
+        for entry in transaction.entries:
+            published = path.join(entry._dest_dir(), entry.file_name)
+            self.assertEqual(path.samefile(entry.source_file, published),
+                             linked)
+
+    def test_copy(self):
+        transaction = self._publish(fileio.COPY)
+
+        self._assert_linked(transaction, False)
+        self.assertEqual(transaction.bytes_copied, self.total_size)
+        self.assertEqual(transaction.bytes_linked, 0)
+
+    def test_hardlink(self):
+        transaction = self._publish(fileio.HARDLINK)
+
+        self._assert_linked(transaction, True)
+        self.assertEqual(transaction.bytes_copied, 0)
+        self.assertEqual(transaction.bytes_linked, self.total_size)
+
+    def test_auto(self):
+        """
+        auto mode should reflink or hard link files on the same file system
+        """
+        transaction = self._publish(fileio.AUTO)
+
+        self.assertEqual(transaction.bytes_linked, self.total_size)
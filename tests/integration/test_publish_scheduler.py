@@ -0,0 +1,137 @@
+import os
+import sys
+import shutil
+import unittest
+import tempfile
+from os import path
+from unittest import mock
+
+import symstore
+from symstore import cab
+from symstore import fileio
+from tests.cli import util
+
+# in the order of decreasing size
+FILES = ["vc140.pdb", "dummylib.pdb", "dummyprog.exe", "dummylib.dll"]
+
+
+class TestPublishScheduler(unittest.TestCase):
+    """
+    test the scheduling of the work when committing a transaction
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.symstore = symstore.Store(path.join(self.temp_dir, "store"))
+        self.files = [util.symfile_path(f) for f in FILES]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _new_transaction(self, compress=False):
+        transaction = self.symstore.new_transaction("prod", "1.0", "")
+        for entry in transaction.new_entries(self.files[::-1],
+                                             compress):
+            transaction.add_entry(entry)
+
+        return transaction
+
+    def _dir_files(self, dir_path):
+        files = []
+        for dir_path, _, file_names in os.walk(dir_path):
+            files += file_names
+
+        return files
+
+    def test_largest_first(self):
+        published = []
+
+        def _publish_file(src, *args):
+            published.append(path.basename(src))
+            return fileio.COPY
+
+        transaction = self._new_transaction()
+        options = symstore.PublishOptions(io_workers=1)
+        with mock.patch("symstore.fileio.publish_file", _publish_file):
+            self.symstore.commit(transaction, options)
+
+        self.assertEqual(published, FILES)
+
+    def test_timings(self):
+        transaction = self._new_transaction(
+            compress=lambda f: f.endswith(".pdb"))
+        self.symstore.commit(transaction)
+
+        timings = transaction.publish_timings
+        self.assertEqual([t.entry for t in timings], transaction.entries)
+        self.assertEqual([t.method for t in timings],
+                         [fileio.COPY, fileio.COPY,
+                          symstore.symstore.COMPRESSED,
+                          symstore.symstore.COMPRESSED])
+
+        for timing in timings:
+            self.assertGreater(timing.io_time, 0)
+            self.assertEqual(timing.cpu_time > 0, timing.entry.compressed)
+
+    def test_publish_error(self):
+        """
+        test that the commit fails, no new files are published and the
+        transaction is not recorded, when publishing a file fails
+        """
+        transaction = self._new_transaction()
+        options = symstore.PublishOptions(io_workers=1)
+        with mock.patch("symstore.fileio.publish_file",
+                        mock.Mock(side_effect=OSError("copy failed"))) \
+                as publish_mock:
+            self.assertRaisesRegex(OSError, "copy failed",
+                                   self.symstore.commit, transaction,
+                                   options)
+
+        # the largest file failed, the rest should not have been started
+        publish_mock.assert_called_once()
+        self.assertEqual(self._dir_files(self.symstore._path),
+                         ["journal.jsonl"])
+        self.assertEqual(len(self.symstore.transactions.items()), 0)
+
+    @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+    @unittest.skipIf(sys.platform == "win32", "no file mode bits on windows")
+    def test_file_mode(self):
+        """
+        test that files are published with default permissions
+        """
+        transaction = self._new_transaction(
+            compress=lambda f: f.endswith(".pdb"))
+
+        umask = os.umask(0o022)
+        try:
+            self.symstore.commit(transaction,
+                                 symstore.PublishOptions(cpu_workers=2))
+        finally:
+            os.umask(umask)
+
+        for entry in transaction.entries:
+            if entry.compressed:
+                file_path = entry._compressed_path()
+            else:
+                file_path = path.join(entry._dest_dir(), entry.file_name)
+
+            self.assertEqual(os.stat(file_path).st_mode & 0o777, 0o644)
+
+    @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
+    def test_compression_error(self):
+        """
+        test that no temporary files are left behind,
+        when compression fails
+        """
+        transaction = self._new_transaction(compress=True)
+
+        options = symstore.PublishOptions(cpu_workers=2)
+        with mock.patch("symstore.cab.compress_file",
+                        mock.Mock(side_effect=symstore.CabCompressionError(
+                            "compression failed"))):
+            self.assertRaisesRegex(symstore.CabCompressionError,
+                                   "compression failed",
+                                   self.symstore.commit, transaction,
+                                   options)
+
+        self.assertEqual(self._dir_files(self.symstore._path),
+                         ["journal.jsonl"])
@@ -12,7 +12,7 @@ from tests import testcase
 @unittest.skipIf(cab.compress is None, util.NO_COMP_SKIP)
 class TestOpenCompressedEntry(testcase.TestCase):
     """
-    test trying to open an compressed transaction entry's data
+    test reading compressed transaction entry's data
     """
     def setUp(self):
         """
@@ -32,13 +32,28 @@ class TestOpenCompressedEntry(testcase.TestCase):
         # make sure we remove created temp directory
         shutil.rmtree(path.dirname(self.symstore._path))
 
+    def _entry(self):
+        transactions = list(self.symstore.transactions.items())
+        return transactions[0][1].entries[0]
+
+    def _source_data(self):
+        with open(path.join(util.SYMFILES_DIR, "dummylib.pdb"), "rb") as f:
+            return f.read()
+
+    def test_read(self):
+        """
+        check that reading a compressed entry returns decompressed data
+        """
+        entry = self._entry()
+
+        self.assertTrue(entry.compressed)
+        self.assertEqual(entry.read(), self._source_data())
+
     def test_open(self):
         """
-        check that trying to open a compressed entry raises
-        not impelemted exception
+        check reading compressed entry's data in chunks
         """
-        transactions = list(self.symstore.transactions.items())
-        entry = transactions[0][1].entries[0]
-        self.assertRaisesRegex(NotImplementedError,
-                               "reading compressed data not supported",
-                               entry.read)
+        with self._entry().open() as f:
+            chunks = list(iter(lambda: f.read(512), b""))
+
+        self.assertEqual(b"".join(chunks), self._source_data())
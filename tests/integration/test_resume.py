@@ -0,0 +1,178 @@
+import os
+import shutil
+import unittest
+import tempfile
+from os import path
+from unittest import mock
+
+import symstore
+from symstore import fileio
+from tests.cli import util
+
+# in the order of decreasing size
+FILES = ["vc140.pdb", "dummylib.pdb", "dummyprog.exe", "dummylib.dll"]
+
+
+class TestResume(unittest.TestCase):
+    """
+    test resuming interrupted commits
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.symstore = symstore.Store(path.join(self.temp_dir, "store"))
+        self.files = [util.symfile_path(f) for f in FILES]
+        self.options = symstore.PublishOptions(io_workers=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _published(self):
+        return sorted(f for f in os.listdir(self.symstore._path)
+                      if f.endswith((".dll", ".pdb", ".exe")))
+
+    def _interrupted_commit(self, failing_file):
+        """
+        commit a transaction, interrupted when publishing specified file
+        """
+        publish_file = fileio.publish_file
+        published = []
+
+        def _publish_file(src, *args):
+            if path.basename(src) == failing_file:
+                raise OSError("share disconnected")
+            published.append(path.basename(src))
+            return publish_file(src, *args)
+
+        with mock.patch("symstore.fileio.publish_file", _publish_file):
+            self.assertRaisesRegex(OSError, "share disconnected",
+                                   self.symstore.add_files, self.files,
+                                   "prod", "1.0", "comment",
+                                   options=self.options)
+
+        return published
+
+    def test_resume(self):
+        published = self._interrupted_commit("dummyprog.exe")
+        self.assertEqual(published, ["vc140.pdb", "dummylib.pdb"])
+        self.assertEqual(len(self.symstore.transactions.items()), 0)
+
+        # leave a temporary file from the interrupted copy
+        entry_dir = path.join(self.symstore._path, "dummyprog.exe",
+                              "5617D4FE8000")
+        os.makedirs(entry_dir, exist_ok=True)
+        temp_file = path.join(entry_dir, ".dummyprog.exe.42.42.tmp")
+        open(temp_file, "w").close()
+
+        with mock.patch("symstore.fileio.publish_file",
+                        wraps=fileio.publish_file) as publish_mock:
+            transaction = self.symstore.resume(self.options)
+
+        # only the remaining files are published
+        calls = publish_mock.call_args_list
+        self.assertEqual(sorted(path.basename(c[0][0]) for c in calls),
+                         ["dummylib.dll", "dummyprog.exe"])
+        self.assertFalse(path.exists(temp_file))
+
+        self.assertEqual(transaction.id, "0000000001")
+        self.assertEqual(transaction.comment, "comment")
+        self.assertEqual([path.basename(e.source_file)
+                          for e in transaction.entries], FILES)
+        for entry in transaction.entries:
+            with open(entry.source_file, "rb") as f:
+                self.assertEqual(entry.read(), f.read())
+
+        # the transaction is recorded, and the journal removed
+        store = symstore.Store(self.symstore._path)
+        (transaction_id, _), = store.transactions.items()
+        self.assertEqual(transaction_id, "0000000001")
+        self.assertFalse(path.exists(self.symstore._journal_file))
+
+        # nothing more to resume
+        self.assertIsNone(self.symstore.resume())
+
+    def test_other_cwd(self):
+        """
+        test resuming a commit of files specified with relative paths,
+        from another working directory
+        """
+        cwd = os.getcwd()
+        os.chdir(util.symfile_path("."))
+        try:
+            self.files = FILES
+            self._interrupted_commit("dummyprog.exe")
+
+            os.chdir(self.temp_dir)
+            transaction = self.symstore.resume(self.options)
+        finally:
+            os.chdir(cwd)
+
+        for entry in transaction.entries:
+            with open(util.symfile_path(entry.file_name), "rb") as f:
+                self.assertEqual(entry.read(), f.read())
+
+    def test_interrupted_recording(self):
+        """
+        test resuming a commit interrupted after the transaction was
+        added to the server file
+        """
+        with mock.patch("symstore.symstore.History.add",
+                        side_effect=OSError("share disconnected")):
+            self.assertRaisesRegex(OSError, "share disconnected",
+                                   self.symstore.add_files, self.files,
+                                   "prod", "1.0", "comment",
+                                   options=self.options)
+
+        store = symstore.Store(self.symstore._path)
+        transaction = store.resume(self.options)
+        self.assertEqual(transaction.id, "0000000001")
+
+        # the transaction is recorded once
+        store = symstore.Store(self.symstore._path)
+        self.assertEqual([t for t, _ in store.transactions.items()],
+                         ["0000000001"])
+        self.assertEqual([t.id for t in store.history], ["0000000001"])
+        with open(path.join(store._admin_dir, "0000000001")) as f:
+            self.assertEqual(len(f.readlines()), len(FILES))
+        self.assertEqual(store._next_transaction_id(), "0000000002")
+        self.assertFalse(path.exists(store._journal_file))
+
+        # all files are freed when the transaction is deleted
+        store.delete_transaction("0000000001")
+        self.assertEqual(self._published(), [])
+
+    def test_interrupted_index_update(self):
+        """
+        test resuming a commit interrupted after the reference count
+        index was updated
+        """
+        self.symstore.add_files(self.files[:1], "prod", "1.0", "")
+
+        with mock.patch("symstore.symstore.Store._write_transaction_id",
+                        side_effect=OSError("share disconnected")):
+            self.assertRaisesRegex(OSError, "share disconnected",
+                                   self.symstore.add_files, self.files,
+                                   "prod", "1.1", "", options=self.options)
+
+        store = symstore.Store(self.symstore._path)
+        self.assertEqual(store.resume(self.options).id, "0000000002")
+
+        store = symstore.Store(self.symstore._path)
+        self.assertEqual([t.id for t in store.history],
+                         ["0000000001", "0000000002"])
+        counts = store._refcount_index().load()
+        self.assertEqual(set(counts.values()), {1, 2})
+
+        store.delete_transaction("0000000001")
+        store.delete_transaction("0000000002")
+        self.assertEqual(self._published(), [])
+
+    def test_new_commit(self):
+        """
+        test that a new commit discards the journal of an interrupted one
+        """
+        self._interrupted_commit("dummylib.dll")
+
+        transaction = self.symstore.add_files(self.files[:1],
+                                              "prod", "1.1", "")
+        self.assertEqual(transaction.id, "0000000001")
+        self.assertIsNone(self.symstore.resume())
@@ -0,0 +1,104 @@
+import os
+import shutil
+import unittest
+import tempfile
+from os import path
+from unittest import mock
+from datetime import datetime, timedelta
+
+import symstore
+from symstore.refcount import RefCountIndex
+from symstore.retention import RetentionRule, RetentionPolicy
+from tests.cli import util
+
+# (product, version, files) of each published transaction
+TRANSACTIONS = [
+    ("prod", "1.0", ["dummylib.dll", "dummylib.pdb"]),
+    ("prod", "1.1", ["dummylib.pdb", "dummyprog.exe"]),
+    ("prod", "1.2", ["dummylib.dll"]),
+]
+
+
+class TestRetention(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_path = path.join(self.temp_dir, "store")
+        store = symstore.Store(self.store_path)
+
+        for product, version, files in TRANSACTIONS:
+            store.add_files([util.symfile_path(f) for f in files],
+                            product, version, "")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _published(self):
+        return sorted(f for f in os.listdir(self.store_path)
+                      if f.endswith((".dll", ".pdb", ".exe")))
+
+    def _plan(self, *rules, now=None):
+        return RetentionPolicy(list(rules)).plan(
+            symstore.Store(self.store_path), now)
+
+    def test_plan(self):
+        plan = self._plan(RetentionRule(keep_last=1))
+
+        self.assertEqual([t.id for t in plan.transactions],
+                         ["0000000001", "0000000002"])
+        self.assertEqual(plan.kept, 1)
+        self.assertEqual(sorted(plan.files),
+                         [("dummylib.pdb",
+                           "86808261E6FD4CC29DC8D3CEC6FC84AF1"),
+                          ("dummyprog.exe", "5617D4FE8000")])
+        self.assertEqual(plan.size,
+                         os.stat(util.symfile_path("dummylib.pdb")).st_size +
+                         os.stat(util.symfile_path("dummyprog.exe")).st_size)
+
+        # dry run, nothing is deleted
+        self.assertEqual(self._published(), ["dummylib.dll",
+                                             "dummylib.pdb",
+                                             "dummyprog.exe"])
+
+    def test_execute(self):
+        store = symstore.Store(self.store_path)
+        RetentionPolicy([RetentionRule(keep_last=1)]).plan(store).execute(
+            store)
+
+        self.assertEqual(self._published(), ["dummylib.dll"])
+        self.assertEqual(
+            list(symstore.Store(self.store_path).transactions.items())[0][0],
+            "0000000003")
+
+    def test_index_loaded_once(self):
+        """
+        test that the reference count index is read once,
+        when planning and executing the deletes
+        """
+        store = symstore.Store(self.store_path)
+        with mock.patch("symstore.refcount.RefCountIndex.load",
+                        autospec=True,
+                        side_effect=RefCountIndex.load) as load_mock:
+            RetentionPolicy([RetentionRule(keep_last=1)]).plan(
+                store).execute(store)
+
+        load_mock.assert_called_once()
+        self.assertEqual(self._published(), ["dummylib.dll"])
+        self.assertEqual(RefCountIndex(store._refcount_file).load(),
+                         {"dummylib.dll\\5617D5638000": 1})
+
+    def test_keep_days(self):
+        # all transactions were published just now
+        plan = self._plan(RetentionRule(keep_days=90))
+        self.assertEqual(plan.transactions, [])
+        self.assertEqual(plan.kept, 3)
+
+        plan = self._plan(RetentionRule(keep_days=90),
+                          now=datetime.now() + timedelta(days=91))
+        self.assertEqual(len(plan.transactions), 3)
+        self.assertEqual(plan.kept, 0)
+
+    def test_unmatched_kept(self):
+        plan = self._plan(RetentionRule(product="other"))
+        self.assertEqual(plan.transactions, [])
+        self.assertEqual(plan.files, [])
+        self.assertEqual(plan.size, 0)
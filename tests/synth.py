@@ -0,0 +1,355 @@
+"""
+generators for synthetic test and benchmark input files
+"""
+import struct
+from symstore import pe
+from symstore import pdb
+from symstore import lzx
+from symstore import cabfile
+
+
+def _pad(data, page_size):
+    return data + b"\0" * (-len(data) % page_size)
+
+
+def pdb_stream(guid_d1, guid_d2, guid_d3, guid_d4, age):
+    """
+    contents of a PDB information stream (stream 1)
+    """
+    return struct.pack("<IIIIHH8s", 20000404, 0, age,
+                       guid_d1, guid_d2, guid_d3, guid_d4)
+
+
+def dbi_stream(age):
+    """
+    contents of a minimal DBI stream (stream 3)
+    """
+    return struct.pack("<III", 0xFFFFFFFF, 19990903, age)
+
+
+def msf_file(streams, page_size=4096):
+    """
+    build the contents of an MSF (PDB) file
+
+    :param streams: list of stream contents, as bytes objects,
+                    None entries are stored as 'nil' streams
+    :param page_size: file's page size
+
+    :return: file contents as bytes
+    """
+    # page 0 is the header, pages 1 and 2 are free page maps
+    next_page = 3
+    data_pages = []
+
+    sizes = []
+    page_lists = []
+    for stream in streams:
+        if stream is None:
+            sizes.append(pdb.NIL_STREAM_SIZE)
+            page_lists.append([])
+            continue
+
+        sizes.append(len(stream))
+        num_pages = pdb.pages(len(stream), page_size)
+        page_lists.append(list(range(next_page, next_page + num_pages)))
+        next_page += num_pages
+        data_pages.append(_pad(stream, page_size))
+
+    directory = struct.pack("<I", len(streams))
+    directory += struct.pack("<%dI" % len(sizes), *sizes)
+    for page_list in page_lists:
+        directory += struct.pack("<%dI" % len(page_list), *page_list)
+
+    dir_num_pages = pdb.pages(len(directory), page_size)
+    dir_pages = list(range(next_page, next_page + dir_num_pages))
+    next_page += dir_num_pages
+
+    index = struct.pack("<%dI" % len(dir_pages), *dir_pages)
+    index_num_pages = pdb.pages(len(index), page_size)
+    index_pages = list(range(next_page, next_page + index_num_pages))
+    next_page += index_num_pages
+
+    header = pdb.SIGNATURE
+    header += struct.pack("<IIIII", page_size, 1, next_page,
+                          len(directory), 0)
+    header += struct.pack("<%dI" % len(index_pages), *index_pages)
+
+    return b"".join([_pad(header, page_size),
+                     b"\0" * (2 * page_size)] +
+                    data_pages +
+                    [_pad(directory, page_size), _pad(index, page_size)])
+
+
+def pdb_file(guid=(0x12345678, 0x9ABC, 0xDEF0, b"\x01" * 8), age=1,
+             extra_streams=0, page_size=4096):
+    """
+    build the contents of PDB file with specified GUID and age
+
+    :param extra_streams: number of additional small streams to add,
+                          used to grow the size of the stream directory
+    """
+    streams = [b"", pdb_stream(*guid, age=age), b"", dbi_stream(age)]
+    streams += [b"\0" * 64] * extra_streams
+
+    return msf_file(streams, page_size)
+
+
+def pe_file(time_date_stamp, size_of_image, pe_sig_offset=0x80,
+            size=None):
+    """
+    build the contents of a minimal PE file
+
+    :param pe_sig_offset: offset of the PE signature in the file
+    :param size: total file size, the file is padded or truncated to
+                 this size, None to end the file after the headers
+    """
+    data = bytearray(pe_sig_offset)
+    data[0:2] = b"MZ"
+    struct.pack_into("<I", data, pe.PE_SIGNATURE_POINTER, pe_sig_offset)
+
+    # file header, with machine type i386
+    data += pe.PE_SIGNATURE
+    data += struct.pack("<HHIIIHH", 0x14C, 0, time_date_stamp, 0, 0, 0, 0)
+
+    # optional header, up to and including SizeOfImage
+    optional_header = bytearray(pe.SIZE_OF_IMAGE_OFFSET + 4)
+    struct.pack_into("<H", optional_header, 0, 0x10B)
+    struct.pack_into("<I", optional_header, pe.SIZE_OF_IMAGE_OFFSET,
+                     size_of_image)
+    data += optional_header
+
+    if size is not None:
+        data = data[:size] + bytes(max(0, size - len(data)))
+
+    return bytes(data)
+
+
+class _BitWriter:
+    """
+    writes LZX bitstream, made of 16-bit little-endian words
+    """
+    def __init__(self):
+        self.data = bytearray()
+        self.acc = 0
+        self.count = 0
+
+    def write(self, value, num_bits):
+        self.acc = (self.acc << num_bits) | value
+        self.count += num_bits
+        while self.count >= 16:
+            self.count -= 16
+            self.data += struct.pack("<H", self.acc >> self.count)
+            self.acc &= (1 << self.count) - 1
+
+    def align(self):
+        if self.count > 0:
+            self.write(0, 16 - self.count)
+
+
+def _complete_lengths(num_symbols):
+    """
+    code lengths of a complete Huffman code with two lengths
+    """
+    bits = (num_symbols - 1).bit_length()
+    short = (1 << bits) - num_symbols
+
+    return [bits - 1] * short + [bits] * (num_symbols - short)
+
+
+def _canonical_codes(lengths):
+    codes = [0] * len(lengths)
+    code = 0
+    prev_length = 0
+    for length, sym in sorted((length, sym)
+                              for sym, length in enumerate(lengths)):
+        code <<= length - prev_length
+        prev_length = length
+        codes[sym] = code
+        code += 1
+
+    return codes
+
+
+PRETREE_LENGTHS = _complete_lengths(lzx.PRETREE_NUM_ELEMENTS)
+PRETREE_CODES = _canonical_codes(PRETREE_LENGTHS)
+
+
+def _lzx_lengths(bits, prev_lengths, lengths):
+    """
+    write delta encoded code lengths
+    """
+    for length in PRETREE_LENGTHS:
+        bits.write(length, 4)
+
+    for prev, length in zip(prev_lengths, lengths):
+        z = (prev - length) % 17
+        bits.write(PRETREE_CODES[z], PRETREE_LENGTHS[z])
+
+
+def _lzx_matches(data, start, end, window_size):
+    """
+    greedily find matches in data[start:end]
+
+    :return: list of literal bytes and (length, offset) tuples
+    """
+    max_match = lzx.MIN_MATCH + lzx.NUM_PRIMARY_LENGTHS + \
+        lzx.NUM_SECONDARY_LENGTHS - 1
+    last_pos = {}
+    items = []
+
+    pos = start
+    while pos < end:
+        key = data[pos:pos + 3]
+        match_pos = last_pos.get(key)
+        last_pos[key] = pos
+
+        length = 0
+        if len(key) == 3 and match_pos is not None and \
+                pos - match_pos <= window_size - 3:
+            limit = min(end - pos, max_match)
+            while length < limit and \
+                    data[match_pos + length] == data[pos + length]:
+                length += 1
+
+        if length >= 3:
+            items.append((length, pos - match_pos))
+            pos += length
+        else:
+            items.append(data[pos])
+            pos += 1
+
+    return items
+
+
+def lzx_compress(data, window_bits=16, block_type=lzx.BLOCKTYPE_VERBATIM,
+                 intel_filesize=0):
+    """
+    compress data with LZX, using one block per frame and fixed
+    Huffman codes
+
+    :param block_type: the type of blocks to use, verbatim, aligned or
+                       uncompressed
+    :param intel_filesize: the E8 translation file size to store in the
+                           header, the data is not translated
+
+    :return: list of compressed frames
+    """
+    window_size = 1 << window_bits
+    main_elements = lzx.NUM_CHARS + lzx.POSITION_SLOTS[window_bits] * 8
+    main = _complete_lengths(main_elements)
+    main_codes = _canonical_codes(main)
+    lengths = _complete_lengths(lzx.NUM_SECONDARY_LENGTHS)
+    length_codes = _canonical_codes(lengths)
+
+    prev_main = [0] * main_elements
+    prev_length = [0] * lzx.NUM_SECONDARY_LENGTHS
+    repeated = [1, 1, 1]
+
+    bits = _BitWriter()
+    if intel_filesize:
+        bits.write(1, 1)
+        bits.write(intel_filesize, 32)
+    else:
+        bits.write(0, 1)
+
+    frames = []
+    for start in range(0, len(data), lzx.FRAME_SIZE):
+        end = min(start + lzx.FRAME_SIZE, len(data))
+
+        bits.write(block_type, 3)
+        bits.write(end - start, 24)
+
+        if block_type == lzx.BLOCKTYPE_UNCOMPRESSED:
+            if bits.count == 0:
+                bits.write(0, 16)
+            bits.align()
+            bits.data += struct.pack("<III", *repeated)
+            bits.data += data[start:end]
+            if (end - start) & 1:
+                bits.data += b"\0"
+            frames.append(bytes(bits.data))
+            bits.data = bytearray()
+            continue
+
+        aligned = block_type == lzx.BLOCKTYPE_ALIGNED
+        if aligned:
+            for _ in range(lzx.ALIGNED_NUM_ELEMENTS):
+                bits.write(3, 3)
+
+        _lzx_lengths(bits, prev_main[:lzx.NUM_CHARS], main[:lzx.NUM_CHARS])
+        _lzx_lengths(bits, prev_main[lzx.NUM_CHARS:], main[lzx.NUM_CHARS:])
+        prev_main = main
+
+        _lzx_lengths(bits, prev_length, lengths)
+        prev_length = lengths
+
+        for item in _lzx_matches(data, start, end, window_size):
+            if isinstance(item, int):
+                bits.write(main_codes[item], main[item])
+                continue
+
+            length, offset = item
+            if offset in repeated:
+                slot = repeated.index(offset)
+                repeated[0], repeated[slot] = offset, repeated[0]
+            else:
+                formatted = offset + 2
+                slot = max(i for i, base in enumerate(lzx.POSITION_BASE)
+                           if base <= formatted)
+                repeated = [offset] + repeated[:2]
+
+            header = min(length - lzx.MIN_MATCH, lzx.NUM_PRIMARY_LENGTHS)
+            sym = lzx.NUM_CHARS + (slot << 3) + header
+            bits.write(main_codes[sym], main[sym])
+            if header == lzx.NUM_PRIMARY_LENGTHS:
+                footer = length - lzx.MIN_MATCH - header
+                bits.write(length_codes[footer], lengths[footer])
+
+            if slot <= 2:
+                continue
+
+            extra = lzx.EXTRA_BITS[slot]
+            footer = formatted - lzx.POSITION_BASE[slot]
+            if aligned and extra >= 3:
+                bits.write(footer >> 3, extra - 3)
+                bits.write(footer & 7, 3)
+            else:
+                bits.write(footer, extra)
+
+        bits.align()
+        frames.append(bytes(bits.data))
+        bits.data = bytearray()
+
+    return frames
+
+
+def cab_file(name, size, blocks, type_compress):
+    """
+    build the contents of a single file cabinet from compressed blocks
+
+    :param name: stored file name
+    :param size: stored file size
+    :param blocks: list of (compressed data, uncompressed size) tuples
+    :param type_compress: the folder's compression type field
+    """
+    file_name = name.encode() + b"\0"
+    files_offset = cabfile.CFHEADER_SIZE + cabfile.CFFOLDER_SIZE
+    data_offset = files_offset + cabfile.CFFILE_SIZE + len(file_name)
+
+    data = bytearray()
+    for comp_data, block_size in blocks:
+        sizes = struct.pack("<HH", len(comp_data), block_size)
+        csum = cabfile.checksum(sizes, cabfile.checksum(comp_data))
+        data += struct.pack(cabfile.CFDATA_FMT,
+                            csum, len(comp_data), block_size)
+        data += comp_data
+
+    return struct.pack(cabfile.CFHEADER_FMT, cabfile.SIGNATURE, 0,
+                       data_offset + len(data), 0, files_offset, 0,
+                       cabfile.VERSION_MINOR, cabfile.VERSION_MAJOR,
+                       1, 1, 0, 0, 0) + \
+        struct.pack(cabfile.CFFOLDER_FMT,
+                    data_offset, len(blocks), type_compress) + \
+        struct.pack(cabfile.CFFILE_FMT, size, 0, 0, 0x5021, 0,
+                    cabfile.ATTRIB_ARCH) + \
+        file_name + data
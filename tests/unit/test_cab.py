@@ -64,20 +64,26 @@ class TestNoGcab(unittest.TestCase):
     @mock.patch(IMPORT_MODULE, side_effect=no_gi_import)
     def test_gi_import_error(self, _):
         """
-        test the case when we can't import gi
+        test the case when we can't import gi,
+        built-in compression should be used
         """
         import symstore.cab
         _reload(symstore.cab)
-        self.assertIsNone(symstore.cab.compress)
+        self.assertEqual(symstore.cab.compress,
+                         symstore.cab._compress_builtin)
+        self.assertNotIn("gcab", symstore.cab.backends)
 
     @mock.patch(IMPORT_MODULE, side_effect=no_gcab_namespace)
     def test_no_gcab_namespace(self, _):
         """
-        test the case whan gi is available, but Gcab is not
+        test the case whan gi is available, but Gcab is not,
+        built-in compression should be used
         """
         import symstore.cab
         _reload(symstore.cab)
-        self.assertIsNone(symstore.cab.compress)
+        self.assertEqual(symstore.cab.compress,
+                         symstore.cab._compress_builtin)
+        self.assertNotIn("gcab", symstore.cab.backends)
 
 
 @mock.patch("subprocess.Popen")
@@ -105,6 +111,32 @@ class TestCompressMakecab(testcase.TestCase):
              "CompressionMemory=21", "some.pdb", "some.pd_"],
             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
+    def test_compression_options(self, popen_mock):
+        """
+        check 'makecab.exe' arguments for specified compression
+        """
+        proc_mock = popen_mock.return_value
+        proc_mock.communicate.return_value = (None, None)
+        proc_mock.returncode = 0
+
+        with mock.patch("os.name", "nt"):
+            import symstore.cab
+            _reload(symstore.cab)
+
+            for compression, options in [
+                    ("none", ["/D", "Compress=off"]),
+                    ("mszip", ["/D", "CompressionType=MSZIP"]),
+                    ("lzx:15", ["/D", "CompressionType=LZX",
+                                "/D", "CompressionMemory=15"])]:
+                popen_mock.reset_mock()
+                symstore.cab._compress_makecab(
+                    "some.pdb", "some.pd_",
+                    symstore.cab.Compression.parse(compression))
+
+                popen_mock.assert_called_once_with(
+                    ["makecab.exe"] + options + ["some.pdb", "some.pd_"],
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
     def test_compress_error(self, popen_mock):
         """
         check that _compress_makecab() invokes 'makecab.exe' with
@@ -125,6 +157,68 @@ class TestCompressMakecab(testcase.TestCase):
                                    "src", "dest")
 
 
+class TestCompression(testcase.TestCase):
+    def test_parse(self):
+        from symstore.cab import Compression
+
+        for text, method, level in [("none", "none", None),
+                                    ("MSZIP", "mszip", None),
+                                    ("mszip:9", "mszip", 9),
+                                    ("lzx:15", "lzx", 15)]:
+            compression = Compression.parse(text)
+            self.assertEqual((compression.method, compression.level),
+                             (method, level))
+
+        self.assertEqual(str(Compression.parse("lzx:21")), "lzx:21")
+
+    def test_parse_invalid(self):
+        from symstore.cab import Compression
+
+        self.assertRaisesRegex(ValueError,
+                               "unknown compression method 'quantum'",
+                               Compression.parse, "quantum")
+        self.assertRaisesRegex(ValueError,
+                               "invalid compression level 'high'",
+                               Compression.parse, "mszip:high")
+
+    def test_check_compression(self):
+        from symstore.cab import Compression, check_compression
+
+        check_compression(None, "gcab")
+        check_compression(Compression("mszip", 1), "builtin")
+        check_compression(Compression("lzx", 15), "makecab")
+
+        for compression, backend, msg in [
+                (Compression("lzx"), "builtin",
+                 "lzx compression not supported by 'builtin' backend"),
+                (Compression("mszip", 5), "gcab",
+                 "mszip compression level not supported by 'gcab'"),
+                (Compression("lzx", 22), "makecab",
+                 "invalid lzx compression level 22, must be 15-21")]:
+            self.assertRaisesRegex(CabCompressionError, msg,
+                                   check_compression, compression, backend)
+
+
+class TestSelectBackend(unittest.TestCase):
+    def tearDown(self):
+        import symstore.cab
+        _reload(symstore.cab)
+
+    def test_select(self):
+        import symstore.cab
+        symstore.cab.select_backend("builtin")
+
+        self.assertEqual(symstore.cab.backend, "builtin")
+        self.assertEqual(symstore.cab.compress,
+                         symstore.cab._compress_builtin)
+
+    def test_unknown_backend(self):
+        import symstore.cab
+        self.assertRaisesRegex(ValueError,
+                               "unknown cab compression backend 'foo'",
+                               symstore.cab.select_backend, "foo")
+
+
 class TestWinCab(unittest.TestCase):
     def test_import_win(self):
         """
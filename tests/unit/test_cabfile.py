@@ -0,0 +1,258 @@
+import io
+import os
+import zlib
+import zipfile
+import struct
+import shutil
+import tempfile
+from os import path
+from unittest import mock
+from tests import testcase
+from tests import synth
+from tests.cli import util
+from symstore import lzx
+from symstore import cabfile
+from symstore import fileio
+from symstore import CabCompressionError
+
+
+def _reference_checksum(data, seed):
+    """
+    straightforward implementation of the checksum algorithm,
+    as listed in the [MS-CAB] specification
+    """
+    csum = seed
+    num_words = len(data) // 4
+    for i in range(num_words):
+        csum ^= struct.unpack_from("<I", data, i * 4)[0]
+
+    ul = 0
+    tail = data[num_words * 4:]
+    for byte in tail:
+        ul = (ul << 8) | byte
+
+    return csum ^ ul
+
+
+class TestChecksum(testcase.TestCase):
+    def test_checksum(self):
+        data = os.urandom(1001)
+        for size in (0, 1, 2, 3, 4, 5, 7, 8, 63, 1000, 1001):
+            self.assertEqual(cabfile.checksum(data[:size], 0x1234),
+                             _reference_checksum(data[:size], 0x1234),
+                             "checksum missmatch for size %s" % size)
+
+
+class TestWriteCab(testcase.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src_path = path.join(self.temp_dir, "foo.pdb")
+        self.cab_path = path.join(self.temp_dir, "foo.pd_")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_src(self, data):
+        with open(self.src_path, "wb") as f:
+            f.write(data)
+
+    def _parse_cab(self):
+        """
+        parse written cabinet, return stored file name and the data
+        """
+        with open(self.cab_path, "rb") as f:
+            cab = f.read()
+
+        (sig, _, cab_size, _, files_offset, _, minor, major,
+         folders, files, flags, _, _) = \
+            struct.unpack_from(cabfile.CFHEADER_FMT, cab)
+
+        self.assertEqual(sig, cabfile.SIGNATURE)
+        self.assertEqual(cab_size, len(cab))
+        self.assertEqual((major, minor, folders, files, flags),
+                         (1, 3, 1, 1, 0))
+
+        data_offset, num_blocks, compress_type = struct.unpack_from(
+            cabfile.CFFOLDER_FMT, cab, cabfile.CFHEADER_SIZE)
+        self.assertEqual(compress_type, cabfile.COMPRESS_MSZIP)
+
+        file_size, _, _, _, _, _ = \
+            struct.unpack_from(cabfile.CFFILE_FMT, cab, files_offset)
+        name_start = files_offset + cabfile.CFFILE_SIZE
+        file_name = cab[name_start:cab.index(b"\0", name_start)]
+
+        data = b""
+        offset = data_offset
+        for _ in range(num_blocks):
+            csum, comp_size, size = struct.unpack_from(cabfile.CFDATA_FMT,
+                                                       cab, offset)
+            offset += cabfile.CFDATA_SIZE
+            block = cab[offset:offset + comp_size]
+            offset += comp_size
+
+            self.assertEqual(
+                csum, cabfile.checksum(struct.pack("<HH", comp_size, size),
+                                       cabfile.checksum(block)))
+            self.assertEqual(block[:2], cabfile.MSZIP_SIGNATURE)
+
+            chunk = zlib.decompress(block[2:], -zlib.MAX_WBITS)
+            self.assertEqual(len(chunk), size)
+            data += chunk
+
+        self.assertEqual(offset, len(cab))
+        self.assertEqual(len(data), file_size)
+
+        return file_name, data
+
+    def test_write(self):
+        data = os.urandom(40000) + b"symbols " * 20000
+        self._write_src(data)
+
+        cabfile.write_cab(self.src_path, self.cab_path)
+
+        self.assertEqual(self._parse_cab(), (b"foo.pdb", data))
+
+    def test_empty_file(self):
+        self._write_src(b"")
+
+        cabfile.write_cab(self.src_path, self.cab_path)
+
+        self.assertEqual(self._parse_cab(), (b"foo.pdb", b""))
+
+    @mock.patch("symstore.cabfile.MAX_BLOCKS", 2)
+    def test_too_large(self):
+        self._write_src(b"\0" * (cabfile.BLOCK_SIZE * 2 + 1))
+
+        self.assertRaisesRegex(CabCompressionError,
+                               "file too large for a cabinet",
+                               cabfile.write_cab,
+                               self.src_path, self.cab_path)
+
+
+class TestReadCab(testcase.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src_path = path.join(self.temp_dir, "foo.pdb")
+        self.cab_path = path.join(self.temp_dir, "foo.pd_")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_cab(self, data, compress_type=cabfile.COMPRESS_MSZIP):
+        with open(self.src_path, "wb") as f:
+            f.write(data)
+
+        cabfile.write_cab(self.src_path, self.cab_path, compress_type)
+
+    def _read_cab(self, name=None):
+        with cabfile.open_cab(self.cab_path, name) as f:
+            return f.read()
+
+    def test_mszip(self):
+        data = os.urandom(40000) + b"symbols " * 20000
+        self._write_cab(data)
+
+        self.assertEqual(self._read_cab(), data)
+        self.assertEqual(self._read_cab("foo.pdb"), data)
+
+    def test_close(self):
+        """
+        test that closing the reader closes the cabinet file
+        """
+        self._write_cab(b"symbols")
+
+        open_rb = fileio.open_rb
+        opened = []
+
+        def _open_rb(file_path):
+            opened.append(open_rb(file_path))
+            return opened[-1]
+
+        with mock.patch("symstore.fileio.open_rb", _open_rb):
+            with cabfile.open_cab(self.cab_path) as f:
+                self.assertEqual(f.read(), b"symbols")
+                self.assertFalse(opened[0].closed)
+
+        self.assertTrue(opened[0].closed)
+
+    def test_uncompressed(self):
+        data = os.urandom(70000)
+        self._write_cab(data, cabfile.COMPRESS_NONE)
+
+        self.assertEqual(self._read_cab(), data)
+
+    def test_chunked_read(self):
+        """
+        test reading the data in chunks smaller then the blocks
+        """
+        data = b"symbols " * 30000
+        self._write_cab(data)
+
+        chunks = []
+        with cabfile.open_cab(self.cab_path) as f:
+            for chunk in iter(lambda: f.read(1000), b""):
+                chunks.append(chunk)
+
+        self.assertEqual(b"".join(chunks), data)
+
+    def test_lzx(self):
+        data = os.urandom(10000) + b"symbols " * 20000
+        sizes = [min(cabfile.BLOCK_SIZE, len(data) - i)
+                 for i in range(0, len(data), cabfile.BLOCK_SIZE)]
+        frames = synth.lzx_compress(data, 18, lzx.BLOCKTYPE_ALIGNED)
+
+        with open(self.cab_path, "wb") as f:
+            f.write(synth.cab_file("foo.pdb", len(data),
+                                   list(zip(frames, sizes)),
+                                   cabfile.COMPRESS_LZX | (18 << 8)))
+
+        self.assertEqual(self._read_cab(), data)
+
+    def test_makecab_lzx(self):
+        """
+        test reading LZX compressed cabinet, created by makecab
+        """
+        cab_name = "dummyprog.pdb/F6301B4562FE4B4DB691192733ECE6B71/" \
+                   "dummyprog.pd_"
+        with zipfile.ZipFile(
+                util.symfile_path("new_store_compressed.zip")) as zfile:
+            cab = io.BytesIO(zfile.read(cab_name))
+
+        with cabfile.CabFile(cab).open() as f:
+            data = f.read()
+
+        with open(util.symfile_path("dummyprog.pdb"), "rb") as f:
+            self.assertEqual(data, f.read())
+
+    def test_unsupported_compression(self):
+        with open(self.cab_path, "wb") as f:
+            f.write(synth.cab_file("foo.pdb", 1, [(b"\0", 1)],
+                                   cabfile.COMPRESS_QUANTUM))
+
+        self.assertRaisesRegex(NotImplementedError,
+                               "reading Quantum compressed data "
+                               "not supported",
+                               self._read_cab)
+
+    def test_no_file(self):
+        self._write_cab(b"foo")
+
+        self.assertRaisesRegex(KeyError, "no file 'bar.pdb'",
+                               self._read_cab, "bar.pdb")
+
+    def test_invalid_signature(self):
+        with open(self.cab_path, "wb") as f:
+            f.write(b"XXXX" + b"\0" * 100)
+
+        self.assertRaisesRegex(cabfile.CabFormatError, "invalid signature",
+                               self._read_cab)
+
+    def test_truncated(self):
+        self._write_cab(os.urandom(50000))
+
+        with open(self.cab_path, "r+b") as f:
+            f.truncate(40000)
+
+        self.assertRaisesRegex(cabfile.CabFormatError,
+                               "unexpected end of file",
+                               self._read_cab)
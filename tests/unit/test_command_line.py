@@ -1,4 +1,7 @@
+import argparse
+import tempfile
 import unittest
+from os import path
 from unittest import mock
 
 from symstore import command_line, CabCompressionError
@@ -25,7 +28,7 @@ class TestMain(unittest.TestCase):
     @mock.patch("sys.stderr")
     def test_cab_error(self, stderr, store_mock):
         store_obj = store_mock.return_value
-        store_obj.new_transaction.side_effect = \
+        store_obj.add_files.side_effect = \
             CabCompressionError(self.ERROR_MSG)
 
         with mock.patch("sys.argv", self.Z_ARGV):
@@ -33,3 +36,42 @@ class TestMain(unittest.TestCase):
 
         stderr.write.assert_called_once_with(
             "Error creating CAB\ncab dummy\n")
+
+
+class TestTransactionIds(unittest.TestCase):
+    """
+    test parsing transaction IDs for --delete option
+    """
+    def test_ids(self):
+        self.assertEqual(command_line._transaction_ids("0000000042"),
+                         [("0000000042", False)])
+        self.assertEqual(command_line._transaction_ids("1,0000000003"),
+                         [("0000000001", False), ("0000000003", False)])
+
+    def test_ranges(self):
+        self.assertEqual(command_line._transaction_ids("2-4,10"),
+                         [("0000000002", True), ("0000000003", True),
+                          ("0000000004", True), ("0000000010", False)])
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ids_file = path.join(temp_dir, "ids.txt")
+            with open(ids_file, "w") as f:
+                f.write("0000000007\n1-2\n\n")
+
+            self.assertEqual(
+                command_line._transaction_ids("5,@%s" % ids_file),
+                [("0000000005", False), ("0000000007", False),
+                 ("0000000001", True), ("0000000002", True)])
+
+    def test_invalid(self):
+        for text in ["foo", "3-1", "1-", "1-x"]:
+            self.assertRaisesRegex(argparse.ArgumentTypeError,
+                                   "invalid transaction IDs",
+                                   command_line._transaction_ids_arg, text)
+
+    def test_missing_file(self):
+        self.assertRaisesRegex(argparse.ArgumentTypeError,
+                               "can't read noexist.txt",
+                               command_line._transaction_ids_arg,
+                               "@noexist.txt")
@@ -1,7 +1,12 @@
 import os
+import sys
+import errno
+import unittest
+import hashlib
 import tempfile
 import shutil
 from os import path
+from unittest import mock
 from tests import testcase
 from symstore import fileio
 from symstore import FileNotFound
@@ -39,3 +44,482 @@ class TestOpenRb(testcase.TestCase):
 
         self.assertRaisesRegex(IOError, ".*Is a directory",
                                fileio.open_rb, dir_path)
+
+
+class TestPublishFile(testcase.TestCase):
+    """
+    test fileio.publish_file() function
+    """
+    DATA = b"symbols data"
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src = path.join(self.temp_dir, "src.pdb")
+        self.dest = path.join(self.temp_dir, "dest.pdb")
+
+        with open(self.src, "wb") as f:
+            f.write(self.DATA)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assertPublished(self, linked):
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.DATA)
+
+        self.assertEqual(path.samefile(self.src, self.dest), linked)
+
+        # no temporary files should be left behind
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ["dest.pdb", "src.pdb"])
+
+    def test_copy(self):
+        method = fileio.publish_file(self.src, self.dest)
+
+        self.assertEqual(method, fileio.COPY)
+        self.assertPublished(linked=False)
+
+    def test_hardlink(self):
+        method = fileio.publish_file(self.src, self.dest, fileio.HARDLINK)
+
+        self.assertEqual(method, fileio.HARDLINK)
+        self.assertPublished(linked=True)
+
+    def test_hardlink_replace(self):
+        """
+        test hard linking over an existing file
+        """
+        with open(self.dest, "wb") as f:
+            f.write(b"old data")
+
+        fileio.publish_file(self.src, self.dest, fileio.HARDLINK)
+        self.assertPublished(linked=True)
+
+    @mock.patch("os.link", side_effect=OSError(errno.EXDEV, "cross-device"))
+    def test_hardlink_error(self, _):
+        self.assertRaisesRegex(OSError, "cross-device",
+                               fileio.publish_file,
+                               self.src, self.dest, fileio.HARDLINK)
+        self.assertFalse(path.exists(self.dest))
+
+    @mock.patch("symstore.fileio._ficlone")
+    def test_reflink(self, ficlone_mock):
+        def _ficlone(src, dest):
+            shutil.copy(src, dest)
+        ficlone_mock.side_effect = _ficlone
+
+        with mock.patch("sys.platform", "linux"):
+            method = fileio.publish_file(self.src, self.dest,
+                                         fileio.REFLINK)
+
+        self.assertEqual(method, fileio.REFLINK)
+        self.assertPublished(linked=False)
+
+    @mock.patch("symstore.fileio._ficlone",
+                side_effect=OSError(errno.EOPNOTSUPP, "not supported"))
+    def test_reflink_not_supported(self, _):
+        self.assertRaises(OSError, fileio.publish_file,
+                          self.src, self.dest, fileio.REFLINK)
+        self.assertEqual(os.listdir(self.temp_dir), ["src.pdb"])
+
+    @mock.patch("symstore.fileio._ficlone",
+                side_effect=OSError(errno.EOPNOTSUPP, "not supported"))
+    def test_auto_hardlink(self, _):
+        method = fileio.publish_file(self.src, self.dest, fileio.AUTO)
+
+        self.assertEqual(method, fileio.HARDLINK)
+        self.assertPublished(linked=True)
+
+    @mock.patch("os.link", side_effect=OSError(errno.EXDEV, "cross-device"))
+    @mock.patch("symstore.fileio._ficlone",
+                side_effect=OSError(errno.EXDEV, "cross-device"))
+    def test_auto_copy(self, *_):
+        method = fileio.publish_file(self.src, self.dest, fileio.AUTO)
+
+        self.assertEqual(method, fileio.COPY)
+        self.assertPublished(linked=False)
+
+    def test_unknown_mode(self):
+        self.assertRaisesRegex(ValueError, "unknown link mode 'symlink'",
+                               fileio.publish_file,
+                               self.src, self.dest, "symlink")
+
+
+class TestCopyFile(testcase.TestCase):
+    """
+    test fileio.copy_file() function
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src = path.join(self.temp_dir, "src.pdb")
+        self.dest = path.join(self.temp_dir, "dest.pdb")
+
+        # make sure the data is copied in multiple chunks
+        self.data = os.urandom(fileio.COPY_BUFFER_SIZE * 2 + 1001)
+        with open(self.src, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assertCopied(self):
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ["dest.pdb", "src.pdb"])
+
+    def _copy_with(self, methods):
+        with mock.patch("symstore.fileio._copy_methods",
+                        return_value=methods), \
+                mock.patch("symstore.fileio.COPY_CHUNK_SIZE",
+                           fileio.COPY_BUFFER_SIZE):
+            fileio.copy_file(self.src, self.dest)
+
+    def test_copy(self):
+        fileio.copy_file(self.src, self.dest)
+        self.assertCopied()
+
+    def test_buffered(self):
+        self._copy_with([])
+        self.assertCopied()
+
+    def test_empty_file(self):
+        self.data = b""
+        with open(self.src, "wb"):
+            pass
+
+        fileio.copy_file(self.src, self.dest)
+        self.assertCopied()
+
+    def test_replace(self):
+        with open(self.dest, "wb") as f:
+            f.write(b"old data" * 1000000)
+
+        fileio.copy_file(self.src, self.dest)
+        self.assertCopied()
+
+    def test_fallback(self):
+        """
+        test falling back to the next copy method on 'unsupported' errors
+        """
+        unsupported = mock.Mock(side_effect=OSError(errno.EXDEV, "xdev"))
+        self._copy_with([unsupported])
+
+        unsupported.assert_called_once()
+        self.assertCopied()
+
+    def test_short_kernel_copy(self):
+        """
+        test finishing the copy via the buffer, when kernel copy stops
+        before the end of the file
+        """
+        calls = []
+
+        def _stops_early(src_file, dest_file, offset):
+            calls.append(offset)
+            if offset > 0:
+                return 0
+            return buffered_copy(src_file, dest_file, offset)
+
+        with fileio._BufferedCopy() as buffered_copy:
+            self._copy_with([_stops_early])
+        self.assertCopied()
+        self.assertEqual(calls, [0, fileio.COPY_BUFFER_SIZE])
+
+    def test_truncated_source(self):
+        """
+        test that reaching end of file before the source file's size
+        is an error
+        """
+        def _read_nothing(buffered_copy, src_file, dest_file, offset):
+            return 0
+
+        with mock.patch("symstore.fileio._BufferedCopy.__call__",
+                        _read_nothing):
+            self.assertRaisesRegex(OSError, "unexpected end of file",
+                                   self._copy_with, [])
+
+        self.assertEqual(os.listdir(self.temp_dir), ["src.pdb"])
+
+    def test_buffer_closed(self):
+        """
+        test that the copy buffer is released after copying
+        """
+        buffers = []
+        init = fileio._BufferedCopy.__init__
+
+        def _init(buffered_copy, *args):
+            init(buffered_copy, *args)
+            buffers.append(buffered_copy.buffer)
+
+        with mock.patch("symstore.fileio._BufferedCopy.__init__", _init):
+            self._copy_with([])
+
+        self.assertCopied()
+        self.assertEqual(len(buffers), 1)
+        self.assertTrue(buffers[0].closed)
+
+    def test_error(self):
+        failing = mock.Mock(side_effect=OSError(errno.EIO, "I/O error"))
+
+        self.assertRaisesRegex(OSError, "I/O error",
+                               self._copy_with, [failing])
+        self.assertEqual(os.listdir(self.temp_dir), ["src.pdb"])
+
+    @mock.patch("os.posix_fadvise", create=True)
+    def test_drop_cached_data(self, fadvise_mock):
+        """
+        test that copied data is dropped from the page cache
+        """
+        with mock.patch("os.POSIX_FADV_DONTNEED", "dontneed", create=True), \
+                mock.patch("os.POSIX_FADV_SEQUENTIAL", "sequential",
+                           create=True):
+            self._copy_with([])
+
+        advice = [c[0][3] for c in fadvise_mock.call_args_list]
+        self.assertEqual(advice, ["sequential"] + ["dontneed"] * 4)
+
+        # the source data is dropped after each copied chunk
+        offsets = [c[0][1:3] for c in fadvise_mock.call_args_list[1:4]]
+        self.assertEqual(offsets, [(0, fileio.COPY_BUFFER_SIZE),
+                                   (fileio.COPY_BUFFER_SIZE,
+                                    fileio.COPY_BUFFER_SIZE),
+                                   (fileio.COPY_BUFFER_SIZE * 2, 1001)])
+
+
+class TestParallelCopy(testcase.TestCase):
+    """
+    test copying files with fileio.ParallelCopy settings
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src = path.join(self.temp_dir, "src.pdb")
+        self.dest = path.join(self.temp_dir, "dest.pdb")
+
+        self.data = os.urandom(1000 * 1000)
+        with open(self.src, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assertCopied(self):
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ["dest.pdb", "src.pdb"])
+
+    def test_chunks(self):
+        parallel = fileio.ParallelCopy(0, chunk_size=400)
+
+        self.assertEqual(parallel.chunks(1000),
+                         [(0, 400), (400, 400), (800, 200)])
+        self.assertEqual(parallel.chunks(800), [(0, 400), (400, 400)])
+        self.assertEqual(parallel.chunks(0), [])
+
+    def test_invalid_settings(self):
+        self.assertRaisesRegex(ValueError, "invalid chunk size 0",
+                               fileio.ParallelCopy, 0, 0)
+        self.assertRaisesRegex(ValueError, "invalid concurrency -1",
+                               fileio.ParallelCopy, 0, 1024, -1)
+
+    @mock.patch("symstore.fileio._copy_data")
+    def test_parallel_copy(self, copy_data_mock):
+        fileio.copy_file(self.src, self.dest,
+                         fileio.ParallelCopy(len(self.data), 64 * 1024, 3))
+
+        self.assertCopied()
+        copy_data_mock.assert_not_called()
+
+    @mock.patch("symstore.fileio._parallel_copy_data")
+    def test_below_threshold(self, parallel_copy_mock):
+        """
+        test that files smaller than the threshold are copied sequentially
+        """
+        fileio.copy_file(self.src, self.dest,
+                         fileio.ParallelCopy(len(self.data) + 1))
+
+        self.assertCopied()
+        parallel_copy_mock.assert_not_called()
+
+    @mock.patch("symstore.fileio._parallel_copy_data")
+    def test_not_supported(self, parallel_copy_mock):
+        """
+        test that files are copied sequentially, on systems without
+        pread() and pwrite() calls
+        """
+        with mock.patch("symstore.fileio._parallel_copy_supported",
+                        return_value=False):
+            fileio.copy_file(self.src, self.dest, fileio.ParallelCopy(0))
+
+        self.assertCopied()
+        parallel_copy_mock.assert_not_called()
+
+    def test_empty_file(self):
+        self.data = b""
+        with open(self.src, "wb"):
+            pass
+
+        fileio.copy_file(self.src, self.dest, fileio.ParallelCopy(0))
+        self.assertCopied()
+
+    @mock.patch("os.posix_fallocate", create=True)
+    def test_preallocate(self, fallocate_mock):
+        fileio.copy_file(self.src, self.dest, fileio.ParallelCopy(0, 4096))
+
+        self.assertCopied()
+        self.assertEqual(fallocate_mock.call_count, 1)
+        self.assertEqual(fallocate_mock.call_args[0][1:],
+                         (0, len(self.data)))
+
+    @mock.patch("os.posix_fallocate", create=True,
+                side_effect=OSError(errno.EOPNOTSUPP, "not supported"))
+    def test_preallocate_not_supported(self, _):
+        """
+        test that the file is extended with ftruncate(), when
+        posix_fallocate() is not supported by the file system
+        """
+        with mock.patch("os.ftruncate", wraps=os.ftruncate) as truncate_mock:
+            fileio.copy_file(self.src, self.dest,
+                             fileio.ParallelCopy(0, 4096))
+
+        self.assertCopied()
+        self.assertEqual(truncate_mock.call_args[0][1], len(self.data))
+
+    @mock.patch("os.posix_fallocate", create=True,
+                side_effect=OSError(errno.ENOSPC, "no space"))
+    def test_preallocate_no_space(self, _):
+        self.assertRaisesRegex(OSError, "no space",
+                               fileio.copy_file, self.src, self.dest,
+                               fileio.ParallelCopy(0, 4096))
+
+        self.assertEqual(os.listdir(self.temp_dir), ["src.pdb"])
+
+    def test_replace(self):
+        with open(self.dest, "wb") as f:
+            f.write(b"old data" * 1000000)
+
+        fileio.copy_file(self.src, self.dest, fileio.ParallelCopy(0, 4096))
+        self.assertCopied()
+
+    def test_truncated_source(self):
+        """
+        test copying a file, that shrinks while it's being copied
+        """
+        with mock.patch("os.fstat") as fstat_mock:
+            fstat_mock.return_value.st_size = len(self.data) + 10
+            self.assertRaisesRegex(OSError, "unexpected end of file",
+                                   fileio.copy_file, self.src, self.dest,
+                                   fileio.ParallelCopy(0, 4096))
+
+        self.assertEqual(os.listdir(self.temp_dir), ["src.pdb"])
+
+    def test_write_error(self):
+        with mock.patch("os.pwrite",
+                        side_effect=OSError(errno.ENOSPC, "no space")):
+            self.assertRaisesRegex(OSError, "no space",
+                                   fileio.copy_file, self.src, self.dest,
+                                   fileio.ParallelCopy(0, 4096))
+
+        self.assertEqual(os.listdir(self.temp_dir), ["src.pdb"])
+
+
+class TestCreateTemp(testcase.TestCase):
+    """
+    test fileio.create_temp()
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.dest = path.join(self.temp_dir, "dest.pd_")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_unique(self):
+        temp_paths = {fileio.create_temp(self.dest),
+                      fileio.create_temp(self.dest)}
+
+        self.assertEqual(len(temp_paths), 2)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         sorted(path.basename(p) for p in temp_paths))
+
+    @unittest.skipIf(sys.platform == "win32", "no file mode bits on windows")
+    def test_mode(self):
+        """
+        test that the temporary file is created according to the umask
+        """
+        umask = os.umask(0o027)
+        try:
+            temp_path = fileio.create_temp(self.dest)
+        finally:
+            os.umask(umask)
+
+        self.assertEqual(os.stat(temp_path).st_mode & 0o777, 0o640)
+
+
+class TestChecksum(testcase.TestCase):
+    """
+    test computing, saving and loading fileio.Checksum objects
+    """
+    DATA = b"symbols" * 100000
+    SHA256 = hashlib.sha256(DATA).hexdigest()
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.src = path.join(self.temp_dir, "src.pdb")
+        self.dest = path.join(self.temp_dir, "dest.pdb")
+        self.sidecar = path.join(self.temp_dir, "src.pdb.sha256")
+
+        with open(self.src, "wb") as f:
+            f.write(self.DATA)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_of_file(self):
+        self.assertEqual(fileio.Checksum.of_file(self.src),
+                         fileio.Checksum(self.SHA256, len(self.DATA)))
+
+    def test_save_load(self):
+        checksum = fileio.Checksum.of_file(self.src)
+        checksum.save(self.sidecar)
+
+        self.assertEqual(fileio.read_all(self.sidecar),
+                         "%s %s\n" % (self.SHA256, len(self.DATA)))
+        self.assertEqual(fileio.Checksum.load(self.sidecar), checksum)
+
+    def test_load_missing(self):
+        self.assertIsNone(fileio.Checksum.load(self.sidecar))
+
+    def test_load_malformed(self):
+        with open(self.sidecar, "w") as f:
+            f.write("deadbeef\n")
+
+        self.assertIsNone(fileio.Checksum.load(self.sidecar))
+
+    def test_not_equal(self):
+        checksum = fileio.Checksum(self.SHA256, len(self.DATA))
+
+        self.assertNotEqual(checksum, fileio.Checksum(self.SHA256, 1))
+        self.assertNotEqual(checksum, fileio.Checksum("00", len(self.DATA)))
+
+    def _assert_copy_hashed(self, **kwargs):
+        hasher = fileio.Hasher()
+        fileio.publish_file(self.src, self.dest, hasher=hasher, **kwargs)
+
+        self.assertEqual(fileio.read_all(self.dest, "rb"), self.DATA)
+        self.assertEqual(hasher.checksum(),
+                         fileio.Checksum(self.SHA256, len(self.DATA)))
+
+    def test_copy(self):
+        self._assert_copy_hashed()
+
+    def test_parallel_copy(self):
+        self._assert_copy_hashed(
+            parallel=fileio.ParallelCopy(0, chunk_size=64 * 1024,
+                                         concurrency=3))
+
+    def test_hardlink(self):
+        self._assert_copy_hashed(link_mode=fileio.HARDLINK)
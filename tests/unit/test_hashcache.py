@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+from os import path
+from unittest import mock
+from tests import testcase
+from tests.cli import util
+from symstore import HashCache
+from symstore import FileNotFound
+from symstore.symstore import _file_hash, _probe_file_hash
+
+
+class TestHashCache(testcase.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = path.join(self.temp_dir, "cache", "hashes.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _copy_symfile(self, symfile):
+        dest = path.join(self.temp_dir, symfile)
+        shutil.copyfile(util.symfile_path(symfile), dest)
+        return dest
+
+    def test_hit_miss(self):
+        pdb_path = self._copy_symfile("dummyprog.pdb")
+        cache = HashCache(self.cache_path)
+
+        expected = _probe_file_hash(pdb_path)
+        self.assertEqual(_file_hash(pdb_path, cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        # second lookup should not open the file
+        with mock.patch("symstore.fileio.open_rb") as open_rb:
+            self.assertEqual(_file_hash(pdb_path, cache), expected)
+            open_rb.assert_not_called()
+
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_persistent(self):
+        pdb_path = self._copy_symfile("dummyprog.pdb")
+
+        with HashCache(self.cache_path) as cache:
+            _file_hash(pdb_path, cache)
+
+        cache = HashCache(self.cache_path)
+        _file_hash(pdb_path, cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_modified_file(self):
+        pe_path = self._copy_symfile("dummyprog.exe")
+        cache = HashCache(self.cache_path)
+        _file_hash(pe_path, cache)
+
+        # replace file with a different one
+        shutil.copyfile(util.symfile_path("dummylib.dll"), pe_path)
+        st = os.stat(pe_path)
+        os.utime(pe_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+
+        self.assertEqual(_file_hash(pe_path, cache),
+                         _probe_file_hash(util.symfile_path("dummylib.dll")))
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_eviction(self):
+        files = [self._copy_symfile(f)
+                 for f in ("dummyprog.exe", "dummylib.dll", "dummyprog.pdb")]
+        cache = HashCache(self.cache_path, max_entries=2)
+
+        for f in files:
+            _file_hash(f, cache)
+
+        # second file is still cached, make it the most recently used one
+        _file_hash(files[1], cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+        # the first file have been evicted,
+        # re-adding it evicts the third file
+        _file_hash(files[0], cache)
+        _file_hash(files[1], cache)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+        _file_hash(files[2], cache)
+        self.assertEqual((cache.hits, cache.misses), (2, 5))
+
+    def test_corrupt_cache_file(self):
+        os.makedirs(path.dirname(self.cache_path))
+        with open(self.cache_path, "w") as f:
+            f.write("{not json")
+
+        pdb_path = self._copy_symfile("dummyprog.pdb")
+        with HashCache(self.cache_path) as cache:
+            _file_hash(pdb_path, cache)
+
+        self.assertEqual(cache.misses, 1)
+
+    def test_malformed_cache_file(self):
+        """
+        test loading valid JSON, that is not a valid cache
+        """
+        pdb_path = self._copy_symfile("dummyprog.pdb")
+        os.makedirs(path.dirname(self.cache_path))
+
+        for data in ['{"version": 1}',
+                     '{"version": 1, "entries": 42}',
+                     '{"version": 1, "entries": [[1, 2, 3]]}']:
+            with open(self.cache_path, "w") as f:
+                f.write(data)
+
+            cache = HashCache(self.cache_path)
+            self.assertEqual(_file_hash(pdb_path, cache),
+                             _probe_file_hash(pdb_path))
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+    def test_log_summary(self):
+        pdb_path = self._copy_symfile("dummyprog.pdb")
+        cache = HashCache(self.cache_path)
+        _file_hash(pdb_path, cache)
+        _file_hash(pdb_path, cache)
+
+        with self.assertLogs("symstore.hashcache", "INFO") as logs:
+            cache.log_summary()
+
+        self.assertEqual(logs.output,
+                         ["INFO:symstore.hashcache:hash cache: "
+                          "1 hits, 1 misses"])
+
+    def test_file_not_found(self):
+        cache = HashCache(self.cache_path)
+        self.assertRaises(FileNotFound,
+                          _file_hash, path.join(self.temp_dir, "nope"), cache)
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+from os import path
+from unittest import mock
+from tests import testcase
+from symstore import symstore
+from symstore.journal import PublishJournal
+
+
+class _Store:
+    _path = "store"
+
+
+class TestPublishJournal(testcase.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.journal = PublishJournal(path.join(self.temp_dir,
+                                                "journal.jsonl"))
+
+        self.transaction = symstore.Transaction(
+            _Store(), product="prod", version="1.0", comment="a, \"b\"")
+        for name, compressed in [("foo.pdb", False), ("bar.exe", True)]:
+            self.transaction.add_entry(symstore.TransactionEntry(
+                _Store(), name, "ABC1", path.join("src", name), compressed))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_no_journal(self):
+        self.assertFalse(self.journal.exists())
+        self.assertIsNone(self.journal.load())
+
+    def test_load(self):
+        self.journal.create("0000000042", self.transaction)
+        self.journal.mark_done(1)
+
+        journal = PublishJournal(self.journal.file_path)
+        record, entries = journal.load()
+
+        self.assertEqual(record["id"], "0000000042")
+        self.assertEqual(record["product"], "prod")
+        self.assertEqual(record["version"], "1.0")
+        self.assertEqual(record["comment"], "a, \"b\"")
+        self.assertEqual(
+            entries,
+            [dict(file_name="foo.pdb", file_hash="ABC1",
+                  source_file=path.abspath(path.join("src", "foo.pdb")),
+                  compressed=False),
+             dict(file_name="bar.exe", file_hash="ABC1",
+                  source_file=path.abspath(path.join("src", "bar.exe")),
+                  compressed=True)])
+        self.assertEqual(journal.done, {1})
+
+    def test_truncated_entries(self):
+        """
+        test loading journal, which was not completely written
+        """
+        self.journal.create("0000000001", self.transaction)
+        with open(self.journal.file_path, "r+") as f:
+            f.truncate(len(f.readline()) + 10)
+
+        self.assertIsNone(self.journal.load())
+
+    def test_truncated_done(self):
+        """
+        test loading journal, where last 'done' line is incomplete
+        """
+        self.journal.create("0000000001", self.transaction)
+        self.journal.mark_done(0)
+        with open(self.journal.file_path, "a") as f:
+            f.write("{\"do")
+
+        self.assertIsNotNone(self.journal.load())
+        self.assertEqual(self.journal.done, {0})
+
+    def test_sync_batches(self):
+        """
+        test that entries marked as done are flushed to disk in batches
+        """
+        self.journal.create("0000000001", self.transaction)
+        self.journal.sync_entries = 2
+        self.journal.sync_interval = 3600
+
+        with mock.patch("os.fsync") as fsync_mock:
+            for index in range(5):
+                self.journal.mark_done(index)
+            self.assertEqual(fsync_mock.call_count, 2)
+
+            # the lines are written, even if not synced yet
+            journal = PublishJournal(self.journal.file_path)
+            journal.load()
+            self.assertEqual(journal.done, {0, 1, 2, 3, 4})
+
+            # the rest is synced on close
+            self.journal.close()
+            self.assertEqual(fsync_mock.call_count, 3)
+
+    def test_sync_interval(self):
+        self.journal.create("0000000001", self.transaction)
+        self.journal.sync_interval = 0
+
+        with mock.patch("os.fsync") as fsync_mock:
+            self.journal.mark_done(0)
+            self.journal.mark_done(1)
+            self.journal.close()
+
+        self.assertEqual(fsync_mock.call_count, 2)
+
+    def test_remove(self):
+        self.journal.create("0000000001", self.transaction)
+        self.journal.remove()
+
+        self.assertFalse(self.journal.exists())
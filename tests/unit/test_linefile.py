@@ -0,0 +1,95 @@
+import io
+import unittest
+from unittest import mock
+
+from symstore import linefile
+
+LINES = [b"%.010d,add" % i for i in range(1, 11)]
+
+
+def _file(data):
+    return io.BytesIO(data)
+
+
+class TestIterLines(unittest.TestCase):
+    def test_forward(self):
+        data = b"\n".join(LINES)
+        self.assertEqual([line for _, line in linefile.iter_lines(
+                             _file(data))], LINES)
+
+    def test_offsets(self):
+        data = b"a\r\n\nbb\nc"
+        self.assertEqual(list(linefile.iter_lines(_file(data))),
+                         [(0, b"a"), (4, b"bb"), (7, b"c")])
+        self.assertEqual(list(linefile.iter_lines(_file(data), 4)),
+                         [(4, b"bb"), (7, b"c")])
+
+    @mock.patch("symstore.linefile.BLOCK_SIZE", 7)
+    def test_reversed(self):
+        for data in (b"\n".join(LINES), b"\r\n".join(LINES) + b"\r\n\n"):
+            self.assertEqual(list(linefile.iter_lines_reversed(_file(data))),
+                             LINES[::-1])
+
+    def test_reversed_empty(self):
+        self.assertEqual(list(linefile.iter_lines_reversed(_file(b""))), [])
+
+
+class TestBisectLines(unittest.TestCase):
+    def _bisect(self, data, key):
+        offset = linefile.bisect_lines(_file(data), key)
+        return [line for _, line in linefile.iter_lines(_file(data), offset)]
+
+    def test_bisect(self):
+        data = b"\n".join(LINES)
+        for i in range(0, 11):
+            self.assertEqual(self._bisect(data, b"%.010d" % i), LINES[i:])
+
+    def test_trailing_newline(self):
+        data = b"\n".join(LINES) + b"\n"
+        self.assertEqual(self._bisect(data, b"%.010d" % 9), LINES[9:])
+        self.assertEqual(self._bisect(data, b"%.010d" % 10), [])
+
+    def test_empty(self):
+        self.assertEqual(linefile.bisect_lines(_file(b""), b"1"), 0)
+
+
+class TestSparseLineIndex(unittest.TestCase):
+    def _lookup(self, data, index, line_num):
+        offset, skip = index.locate(line_num)
+        lines = [line for _, line in linefile.iter_lines(_file(data), offset)]
+        return lines[skip]
+
+    def test_locate(self):
+        data = b"\n".join(LINES)
+        index = linefile.SparseLineIndex(step=3)
+        index.update(_file(data))
+
+        self.assertEqual(len(index), len(LINES))
+        for i, line in enumerate(LINES):
+            self.assertEqual(self._lookup(data, index, i), line)
+
+    def test_append(self):
+        """
+        test updating the index after lines are appended to the file
+        """
+        index = linefile.SparseLineIndex(step=3)
+
+        data = b"\n".join(LINES[:4])
+        index.update(_file(data))
+        self.assertEqual(len(index), 4)
+
+        # the last line was not terminated, it's appended as a new line
+        data = b"\n".join(LINES)
+        index.update(_file(data))
+        self.assertEqual(len(index), len(LINES))
+        for i, line in enumerate(LINES):
+            self.assertEqual(self._lookup(data, index, i), line)
+
+    def test_rewritten(self):
+        index = linefile.SparseLineIndex(step=3)
+        index.update(_file(b"\n".join(LINES) + b"\n"))
+
+        data = b"\n".join(LINES[5:])
+        index.update(_file(data))
+        self.assertEqual(len(index), 5)
+        self.assertEqual(self._lookup(data, index, 4), LINES[9])
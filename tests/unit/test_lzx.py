@@ -0,0 +1,101 @@
+import os
+import struct
+import random
+from tests import testcase
+from tests import synth
+from symstore import lzx
+
+
+def _test_data(size):
+    """
+    generate compressible data, followed by some incompressible data
+    """
+    rnd = random.Random(size)
+    words = [bytes(rnd.choice(b"abcdefgh")
+                   for _ in range(rnd.randint(2, 12)))
+             for _ in range(200)]
+
+    data = b""
+    while len(data) < size:
+        data += rnd.choice(words) + b" "
+
+    return data[:size] + os.urandom(4000) + b"z" * 3001
+
+
+def _decompress(frames, size, window_bits):
+    decoder = lzx.LZXDecoder(window_bits)
+    for frame in frames:
+        decoder.feed(frame)
+
+    return b"".join(decoder.decompress(min(lzx.FRAME_SIZE, size - i))
+                    for i in range(0, size, lzx.FRAME_SIZE))
+
+
+class TestDecompress(testcase.TestCase):
+    def _assert_round_trip(self, block_type, window_bits):
+        data = _test_data(150000)
+        frames = synth.lzx_compress(data, window_bits, block_type)
+
+        self.assertEqual(_decompress(frames, len(data), window_bits), data)
+
+    def test_verbatim(self):
+        for window_bits in (15, 16, 21):
+            self._assert_round_trip(lzx.BLOCKTYPE_VERBATIM, window_bits)
+
+    def test_aligned(self):
+        for window_bits in (15, 16, 21):
+            self._assert_round_trip(lzx.BLOCKTYPE_ALIGNED, window_bits)
+
+    def test_uncompressed(self):
+        self._assert_round_trip(lzx.BLOCKTYPE_UNCOMPRESSED, 16)
+
+    def test_read_input(self):
+        """
+        test reading compressed data with the read input callback
+        """
+        data = _test_data(100000)
+        frames = synth.lzx_compress(data, 17)
+        chunks = iter(frames)
+
+        decoder = lzx.LZXDecoder(17, lambda: next(chunks, b""))
+        got = b"".join(decoder.decompress(min(lzx.FRAME_SIZE, len(data) - i))
+                       for i in range(0, len(data), lzx.FRAME_SIZE))
+
+        self.assertEqual(got, data)
+
+    def test_e8_translation(self):
+        # E8 bytes at positions 0, 5 and 12 of the data
+        data = b"\xe8" + struct.pack("<i", 0x10) + \
+            b"\xe8" + struct.pack("<i", 0x100) + \
+            b"ab" + b"\xe8" + struct.pack("<i", -3) + b"\0" * 20
+        frames = synth.lzx_compress(data, 16, intel_filesize=0x1000)
+
+        expected = b"\xe8" + struct.pack("<i", 0x10) + \
+            b"\xe8" + struct.pack("<i", 0x100 - 5) + \
+            b"ab" + b"\xe8" + struct.pack("<i", 0x1000 - 3) + b"\0" * 20
+
+        self.assertEqual(_decompress(frames, len(data), 16), expected)
+
+    def test_unsupported_window(self):
+        self.assertRaisesRegex(lzx.LZXError,
+                               "unsupported window size 22",
+                               lzx.LZXDecoder, 22)
+
+    def test_invalid_block_type(self):
+        decoder = lzx.LZXDecoder(16)
+        # no E8 header bit, followed by block type 7
+        decoder.feed(struct.pack("<H", 0x7000) + b"\0" * 6)
+
+        self.assertRaisesRegex(lzx.LZXError, "invalid block type 7",
+                               decoder.decompress)
+
+    def test_truncated(self):
+        data = _test_data(50000)
+        frames = synth.lzx_compress(data, 16)
+
+        decoder = lzx.LZXDecoder(16)
+        decoder.feed(frames[0][:len(frames[0]) // 2])
+
+        self.assertRaisesRegex(lzx.LZXError,
+                               "unexpected end of compressed data",
+                               decoder.decompress)
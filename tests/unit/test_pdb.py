@@ -1,6 +1,11 @@
+import struct
+import shutil
+import tempfile
+from os import path
 from unittest import mock
 from symstore import pdb
 from tests import testcase
+from tests import synth
 
 NUM_STREAMS = 5
 
@@ -21,3 +26,176 @@ class TestRoot(testcase.TestCase):
         root = pdb.Root(None, None, None)
         self.assertRaisesRegex(IndexError, "stream index to large",
                                root.stream_size, NUM_STREAMS+2)
+
+
+class TestDirectory(testcase.TestCase):
+    """
+    test decoding stream directory of a PDB file
+    """
+    PAGE_SIZE = 512
+
+    def _root(self, streams):
+        data = synth.msf_file(streams, self.PAGE_SIZE)
+        page_size, _, _, root_dir_size, _ = \
+            struct.unpack_from("<IIIII", data, len(pdb.SIGNATURE))
+
+        return pdb.Root(data, page_size, root_dir_size)
+
+    def test_stream_pages(self):
+        """
+        check that page lists of all streams are correctly located
+        """
+        streams = [b"a" * size for size in (0, 10, 512, 513, 2000)] * 50
+        root = self._root(streams)
+
+        self.assertEqual(root.num_streams(), len(streams))
+
+        # data pages are allocated sequentially, starting at page 3
+        next_page = 3
+        for i, stream in enumerate(streams):
+            num_pages = pdb.pages(len(stream), self.PAGE_SIZE)
+            self.assertEqual(root.stream_size(i), len(stream))
+            self.assertEqual(tuple(root.stream_pages(i)),
+                             tuple(range(next_page, next_page + num_pages)))
+            next_page += num_pages
+
+    def test_nil_stream(self):
+        """
+        test that nil streams don't occupy any pages
+        """
+        root = self._root([b"a" * 600, None, b"b" * 10])
+
+        self.assertEqual(tuple(root.stream_pages(0)), (3, 4))
+        self.assertEqual(tuple(root.stream_pages(1)), ())
+        self.assertEqual(tuple(root.stream_pages(2)), (5,))
+
+
+class TestStream(testcase.TestCase):
+    """
+    test reading data via lazy Stream objects
+    """
+    PAGE_SIZE = 512
+
+    def setUp(self):
+        data = bytes(range(256)) * 8
+        # store stream's pages in reverse order
+        self.pages = pdb.Pages(data, self.PAGE_SIZE)
+        self.stream = pdb.Stream(self.pages, 1500, [3, 1, 0])
+        self.expected = data[3*512:4*512] + data[512:1024] + data[:476]
+
+    def test_read_in_page(self):
+        """
+        data inside single page is returned without copying
+        """
+        chunk = self.stream.read(520, 100)
+
+        self.assertIsInstance(chunk, memoryview)
+        self.assertEqual(bytes(chunk), self.expected[520:620])
+
+    def test_read_across_pages(self):
+        self.assertEqual(self.stream.read(100, 1300),
+                         self.expected[100:1400])
+
+    def test_page_beyond_eof(self):
+        stream = pdb.Stream(self.pages, 100, [4])
+        self.assertRaisesRegex(pdb.PDBFormatError,
+                               "page 4 beyond end of file",
+                               stream.read, 0, 4)
+
+    def test_read_beyond_pages(self):
+        """
+        test reading stream data, not covered by stream's page list
+        """
+        stream = pdb.Stream(self.pages, 1500, [3])
+        self.assertRaisesRegex(pdb.PDBFormatError,
+                               "read beyond the pages of the stream",
+                               stream.read, 500, 100)
+
+
+class TestPDBFile(testcase.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _pdb_path(self, contents):
+        pdb_path = path.join(self.temp_dir, "test.pdb")
+        with open(pdb_path, "wb") as f:
+            f.write(contents)
+
+        return pdb_path
+
+    def test_guid_age(self):
+        guid = (0x01020304, 0x0506, 0x0708,
+                b"\x09\x0a\x0b\x0c\x0d\x0e\x0f\x10")
+        pdbfile = pdb.PDBFile(self._pdb_path(
+            synth.pdb_file(guid, age=0x2a, extra_streams=3000,
+                           page_size=512)))
+
+        self.assertEqual(str(pdbfile.guid),
+                         "0102030405060708090A0B0C0D0E0F10")
+        self.assertEqual(pdbfile.age, 0x2a)
+
+    def test_empty_file(self):
+        self.assertRaises(pdb.PDBInvalidSignature,
+                          pdb.PDBFile, self._pdb_path(b""))
+
+    def test_truncated(self):
+        contents = synth.pdb_file()
+        self.assertRaises(pdb.PDBFormatError,
+                          pdb.PDBFile, self._pdb_path(contents[:5000]))
+
+    def test_truncated_pages(self):
+        """
+        test files truncated at each page, and inside the header
+        """
+        contents = synth.pdb_file(page_size=512)
+        for size in [60, 100] + list(range(512, len(contents), 512)):
+            self.assertRaises(pdb.PDBFormatError, pdb.PDBFile,
+                              self._pdb_path(contents[:size]))
+
+    def _with_header(self, contents, page_size=None, root_size=None):
+        """
+        modify the page size or the root stream size in the file header
+        """
+        data = bytearray(contents)
+        header = list(struct.unpack_from("<IIIII", data,
+                                         len(pdb.SIGNATURE)))
+        if page_size is not None:
+            header[0] = page_size
+        if root_size is not None:
+            header[3] = root_size
+        struct.pack_into("<IIIII", data, len(pdb.SIGNATURE), *header)
+
+        return bytes(data)
+
+    def test_invalid_page_size(self):
+        contents = synth.pdb_file()
+        for page_size in [0, len(contents) + 1]:
+            self.assertRaisesRegex(
+                pdb.PDBFormatError, "invalid page size %s" % page_size,
+                pdb.PDBFile,
+                self._pdb_path(self._with_header(contents, page_size)))
+
+    def test_directory_beyond_root(self):
+        """
+        test root stream too small for the stream directory
+        """
+        contents = self._with_header(synth.pdb_file(), root_size=8)
+        self.assertRaisesRegex(pdb.PDBFormatError,
+                               "beyond end of root stream",
+                               pdb.PDBFile, self._pdb_path(contents))
+
+    def test_root_too_large(self):
+        contents = self._with_header(synth.pdb_file(page_size=512),
+                                     root_size=0xFFFFFFF0)
+        self.assertRaisesRegex(pdb.PDBFormatError, "root stream too large",
+                               pdb.PDBFile, self._pdb_path(contents))
+
+    def test_missing_streams(self):
+        contents = synth.msf_file([b"", synth.pdb_stream(1, 2, 3, b"4" * 8,
+                                                         age=1)])
+        self.assertRaisesRegex(pdb.PDBFormatError,
+                               "missing PDB or DBI stream",
+                               pdb.PDBFile, self._pdb_path(contents))
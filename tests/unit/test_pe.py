@@ -1,6 +1,10 @@
+import shutil
+import tempfile
 from os import path
+from unittest import mock
 from unittest.mock import Mock
 from tests import testcase
+from tests import synth
 from tests.cli import util
 from symstore import pe
 from symstore.symstore import _pe_hash
@@ -60,3 +64,79 @@ class TestPEHash(testcase.TestCase):
         """
         pe_hash = _pe_hash(_make_pe_mock(77794544, 2048))
         self.assertEqual("04A30CF00800", pe_hash)
+
+
+class TestHeadersProbe(testcase.TestCase):
+    """
+    test reading PE headers located at different offsets
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _pe_path(self, contents):
+        pe_path = path.join(self.temp_dir, "test.exe")
+        with open(pe_path, "wb") as f:
+            f.write(contents)
+
+        return pe_path
+
+    def _open_counted(self, contents):
+        """
+        parse PE file, while counting the number of read() calls made
+        """
+        reads = []
+
+        def open_rb(filepath):
+            f = open(filepath, "rb")
+            orig_read = f.read
+
+            def read(*args):
+                reads.append(args)
+                return orig_read(*args)
+
+            f.read = read
+            return f
+
+        with mock.patch("symstore.fileio.open_rb", open_rb):
+            pefile = pe.PEFile(self._pe_path(contents))
+
+        return pefile, len(reads)
+
+    def test_single_read(self):
+        pefile, reads = self._open_counted(
+            synth.pe_file(TIME_DATE_STAMP, SIZE_OF_IMAGE, size=10000))
+
+        self.assertEqual(reads, 1)
+        self.assertEqual(pefile.TimeDateStamp, TIME_DATE_STAMP)
+        self.assertEqual(pefile.SizeOfImage, SIZE_OF_IMAGE)
+
+    def test_far_headers(self):
+        """
+        test the case when PE headers are located beyond probed data
+        """
+        pefile, reads = self._open_counted(
+            synth.pe_file(TIME_DATE_STAMP, SIZE_OF_IMAGE,
+                          pe_sig_offset=pe.HEADERS_PROBE_SIZE - 8))
+
+        self.assertEqual(reads, 2)
+        self.assertEqual(pefile.TimeDateStamp, TIME_DATE_STAMP)
+        self.assertEqual(pefile.SizeOfImage, SIZE_OF_IMAGE)
+
+    def test_tiny_file(self):
+        self.assertRaises(pe.PESignatureNotFoundError,
+                          pe.PEFile, self._pe_path(b"MZ"))
+
+    def test_signature_beyond_eof(self):
+        contents = synth.pe_file(TIME_DATE_STAMP, SIZE_OF_IMAGE,
+                                 pe_sig_offset=0x2000, size=0x1000)
+        self.assertRaises(pe.PESignatureNotFoundError,
+                          pe.PEFile, self._pe_path(contents))
+
+    def test_truncated_headers(self):
+        contents = synth.pe_file(TIME_DATE_STAMP, SIZE_OF_IMAGE)
+        self.assertRaisesRegex(pe.PEFormatError,
+                               "data offset 208 beyond end of file 200",
+                               pe.PEFile, self._pe_path(contents[:200]))
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from os import path
+from unittest import mock
+from tests import testcase
+from symstore import policy
+
+
+class TestAdaptiveCompression(testcase.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _file(self, name, data):
+        file_path = path.join(self.temp_dir, name)
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+        return file_path
+
+    def test_compressible(self):
+        adaptive = policy.AdaptiveCompression()
+        file_path = self._file("text.pdb", b"symbols " * 10000)
+
+        with self.assertLogs("symstore.policy", "INFO") as logs:
+            self.assertTrue(adaptive(file_path))
+
+        self.assertRegex(logs.output[0],
+                         "text.pdb: estimated compression ratio "
+                         r"[\d.]+, compressing")
+        self.assertEqual((adaptive.compressed, adaptive.skipped), (1, 0))
+        self.assertEqual(adaptive.saved_time, 0.0)
+
+    def test_incompressible(self):
+        adaptive = policy.AdaptiveCompression(sample_size=64 * 1024)
+        file_path = self._file("random.dll", os.urandom(1024 * 1024))
+
+        with self.assertLogs("symstore.policy", "INFO") as logs:
+            self.assertFalse(adaptive(file_path))
+
+        self.assertRegex(logs.output[0], "not compressing")
+        self.assertEqual((adaptive.compressed, adaptive.skipped), (0, 1))
+        self.assertGreater(adaptive.saved_time, 0.0)
+
+    def test_min_ratio(self):
+        file_path = self._file("text.pdb", b"symbols " * 10000)
+        ratio, _, _ = policy.AdaptiveCompression().estimate(file_path)
+
+        self.assertTrue(policy.AdaptiveCompression(ratio - 0.1)(file_path))
+        self.assertFalse(policy.AdaptiveCompression(ratio + 0.1)(file_path))
+
+    @mock.patch("symstore.policy.SAMPLE_CHUNKS", 4)
+    def test_sample(self):
+        """
+        test that the sample is made of chunks spread over the whole file
+        """
+        data = b"".join(bytes([i]) * 1000 for i in range(10))
+        file_path = self._file("chunks.pdb", data)
+
+        sample, size = policy.AdaptiveCompression(sample_size=400) \
+            ._sample(file_path)
+
+        self.assertEqual(size, len(data))
+        self.assertEqual(sample, b"\0" * 100 + b"\3" * 100 +
+                         b"\6" * 100 + b"\x09" * 100)
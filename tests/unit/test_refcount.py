@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+from os import path
+from unittest import mock
+from tests import testcase
+from symstore import refcount
+from symstore.refcount import RefCountIndex
+
+
+class TestRefCountIndex(testcase.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.index = RefCountIndex(path.join(self.temp_dir, "refcount.txt"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _lines(self):
+        with open(self.index.file_path) as f:
+            return f.read().splitlines()
+
+    def test_add_remove(self):
+        self.index.add(["a b.pdb\\1", "c.dll\\2"], "0000000001")
+        self.index.add(["a b.pdb\\1"], "0000000002")
+
+        self.assertEqual(self.index.load(),
+                         {"a b.pdb\\1": 2, "c.dll\\2": 1})
+        self.assertEqual(self.index.last_id(), "0000000002")
+
+        self.index.remove(["a b.pdb\\1", "c.dll\\2"], "0000000003")
+        self.assertEqual(self.index.load(), {"a b.pdb\\1": 1})
+        self.assertEqual(self.index.last_id(), "0000000003")
+
+        # the markers record the number of lines
+        self.assertEqual(self._lines()[-1], "@0000000003 8 0")
+
+    def test_load_keys(self):
+        """
+        test loading the counts of some of the files
+        """
+        self.index.add(["a.pdb\\1", "b.pdb\\2", "c.dll\\3"], "0000000001")
+        self.index.add(["a.pdb\\1", "c.dll\\3"], "0000000002")
+
+        self.assertEqual(self.index.load({"a.pdb\\1", "b.pdb\\2",
+                                          "d.exe\\4"}),
+                         {"a.pdb\\1": 2, "b.pdb\\2": 1})
+
+    def test_compact(self):
+        self.index.add(["a.pdb\\1", "b.pdb\\2"], "0000000001")
+        self.index.add(["a.pdb\\1"], "0000000002")
+
+        with mock.patch.object(refcount, "COMPACT_MIN_LINES", 4):
+            self.index.remove(["a.pdb\\1"], "0000000003")
+
+        # one line per file, followed by the marker
+        self.assertEqual(self._lines(), [
+            refcount.HEADER.rstrip(),
+            "a.pdb\\1 1",
+            "b.pdb\\2 1",
+            "@0000000003 3 3",
+        ])
+        self.assertEqual(self.index.last_id(), "0000000003")
+
+    def test_compact_ratio(self):
+        """
+        test that the index is rewritten when it grows large compared
+        to it's size after last rewrite
+        """
+        self.index.write({"a.pdb\\1": 1, "b.pdb\\2": 1}, "0000000001")
+
+        with mock.patch.object(refcount, "COMPACT_MIN_LINES", 0), \
+                mock.patch.object(self.index, "write",
+                                  wraps=self.index.write) as write_mock:
+            self.index.add(["c.pdb\\3"], "0000000002")
+            self.index.remove(["c.pdb\\3"], "0000000003")
+            # 7 lines, after rewriting 3 lines
+            write_mock.assert_called_once()
+
+        self.assertEqual(self._lines()[-1], "@0000000003 3 3")
+
+    def test_unknown_lines(self):
+        """
+        test updating index, where markers don't record number of lines
+        """
+        with open(self.index.file_path, "w") as f:
+            f.write(refcount.HEADER)
+            f.write("a.pdb\\1 2\n@0000000001\n")
+
+        self.index.add(["b.pdb\\2"], "0000000002")
+        self.assertEqual(self.index.last_id(), "0000000002")
+
+        # the index is rewritten, when the number of lines is unknown
+        self.index.remove(["a.pdb\\1"], "0000000003")
+        self.assertEqual(self._lines(), [
+            refcount.HEADER.rstrip(),
+            "a.pdb\\1 1",
+            "b.pdb\\2 1",
+            "@0000000003 3 3",
+        ])
+
+    def test_no_index(self):
+        self.assertFalse(self.index.exists())
+        self.assertIsNone(self.index.last_id())
+
+    def test_invalid_index(self):
+        with open(self.index.file_path, "w") as f:
+            f.write("foo\n")
+
+        self.assertRaisesRegex(ValueError, "not a reference count index",
+                               self.index.load)
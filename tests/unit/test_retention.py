@@ -0,0 +1,132 @@
+import json
+import shutil
+import tempfile
+import unittest
+from os import path
+from datetime import datetime
+
+from symstore.retention import RetentionRule, RetentionPolicy
+
+NOW = datetime(2020, 6, 30, 12, 0, 0)
+
+
+class _Transaction:
+    def __init__(self, id, product, version, comment="", day=1):
+        self.id = "%.010d" % id
+        self.product = product
+        self.version = version
+        self.comment = comment
+        self.timestamp = datetime(2020, 6, day, 12, 0, 0)
+
+
+TRANSACTIONS = [
+    _Transaction(1, "app", "1.0", day=1),
+    _Transaction(2, "app", "1.1", day=2),
+    _Transaction(3, "lib", "1.0", "nightly", day=3),
+    _Transaction(4, "app", "1.0", day=10),
+    _Transaction(5, "app", "1.2", "nightly", day=20),
+    _Transaction(6, "lib", "1.1", day=25),
+]
+
+
+def _ids(transaction_ids):
+    return {"%.010d" % i for i in transaction_ids}
+
+
+class TestRetentionRule(unittest.TestCase):
+    def _kept(self, rule):
+        return rule.kept([t for t in TRANSACTIONS if rule.matches(t)], NOW)
+
+    def test_matches(self):
+        rule = RetentionRule(product="app", version=r"1\.[01]")
+        self.assertEqual([t.id for t in TRANSACTIONS if rule.matches(t)],
+                         sorted(_ids([1, 2, 4])))
+
+    def test_matches_whole_value(self):
+        rule = RetentionRule(product="ap")
+        self.assertFalse(rule.matches(TRANSACTIONS[0]))
+
+    def test_matches_comment(self):
+        rule = RetentionRule(comment="night.*")
+        self.assertEqual({t.id for t in TRANSACTIONS if rule.matches(t)},
+                         _ids([3, 5]))
+
+    def test_keep_last(self):
+        """
+        test that the transactions of the most recent versions
+        of each product are kept
+        """
+        # '1.0' was republished after '1.1',
+        # thus '1.1' is the oldest 'app' version
+        self.assertEqual(self._kept(RetentionRule(keep_last=2)),
+                         _ids([1, 3, 4, 5, 6]))
+
+    def test_keep_last_zero(self):
+        self.assertEqual(self._kept(RetentionRule(keep_last=0)), set())
+
+    def test_keep_last_all(self):
+        self.assertEqual(self._kept(RetentionRule(keep_last=10)),
+                         _ids(range(1, 7)))
+
+    def test_keep_days(self):
+        self.assertEqual(self._kept(RetentionRule(keep_days=15)),
+                         _ids([5, 6]))
+
+    def test_keep_nothing(self):
+        self.assertEqual(self._kept(RetentionRule(product="lib")), set())
+
+    def test_invalid_pattern(self):
+        with self.assertRaisesRegex(ValueError, "invalid product pattern"):
+            RetentionRule(product="(")
+
+    def test_invalid_keep_last(self):
+        with self.assertRaisesRegex(ValueError, "invalid keep_last"):
+            RetentionRule(keep_last=-1)
+
+
+class TestRetentionPolicyLoad(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.rules_file = path.join(self.temp_dir, "rules.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _load(self, rules):
+        with open(self.rules_file, "w") as f:
+            json.dump(rules, f)
+
+        return RetentionPolicy.load(self.rules_file)
+
+    def test_load(self):
+        policy = self._load({"rules": [
+            {"product": "app", "keep_last": 5},
+            {"comment": "nightly", "keep_days": 90},
+        ]})
+
+        self.assertEqual(len(policy.rules), 2)
+        self.assertEqual(policy.rules[0].product, "app")
+        self.assertEqual(policy.rules[0].keep_last, 5)
+        self.assertEqual(policy.rules[1].comment, "nightly")
+        self.assertEqual(policy.rules[1].keep_days, 90)
+
+    def test_no_rules(self):
+        with self.assertRaisesRegex(ValueError, "'rules' list"):
+            self._load([])
+
+    def test_unknown_setting(self):
+        with self.assertRaisesRegex(ValueError,
+                                    "rule 2: unknown rule setting 'keep'"):
+            self._load({"rules": [{}, {"keep": 1}]})
+
+    def test_invalid_type(self):
+        with self.assertRaisesRegex(ValueError,
+                                    "keep_days must be an integer"):
+            self._load({"rules": [{"keep_days": "90"}]})
+
+    def test_invalid_json(self):
+        with open(self.rules_file, "w") as f:
+            f.write("{")
+
+        with self.assertRaises(ValueError):
+            RetentionPolicy.load(self.rules_file)
@@ -2,8 +2,16 @@ import unittest
 import tempfile
 import shutil
 from os import path
+from unittest import mock
+from datetime import datetime
 
 import symstore
+from symstore import errs
+from symstore import fileio
+from symstore import linefile
+from symstore.symstore import _file_hash
+from symstore.symstore import _find_sorted_line
+from tests.cli import util
 
 DATA_DIR = path.join(path.dirname(path.abspath(__file__)), "data")
 
@@ -75,3 +83,291 @@ class TestHistoryAdd(unittest.TestCase):
 
         self.assertFileContents(store._history_file,
                                 "original_line\nnew_line")
+
+
+class TestHistoryRead(unittest.TestCase):
+    """
+    test reading the transactions from the history file
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = MockHistStore(path.join(self.temp_dir, "history.txt"))
+
+        # 8 add transactions, followed by 2 delete transactions
+        lines = ['%.010d,add,file,01/02/2020,10:00:00,"prod","%s","",' %
+                 (i, i) for i in range(1, 9)]
+        lines += ["0000000009,del,0000000001", "0000000010,del,0000000002"]
+        with open(self.store._history_file, "w") as f:
+            f.write("\n".join(lines))
+
+        self.history = symstore.History(self.store)
+        self.history._index = linefile.SparseLineIndex(step=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _ids(self, transactions):
+        return [t.id for t in transactions]
+
+    def _expected_ids(self, *ids):
+        return ["%.010d" % i for i in ids]
+
+    def test_iter(self):
+        self.assertEqual(self._ids(self.history),
+                         self._expected_ids(*range(1, 11)))
+
+        transaction = next(iter(self.history))
+        self.assertEqual(transaction.type, "add")
+        self.assertEqual(transaction.version, "1")
+
+    def test_reversed(self):
+        self.assertEqual(self._ids(reversed(self.history)),
+                         self._expected_ids(*range(10, 0, -1)))
+
+    def test_getitem(self):
+        self.assertEqual(len(self.history), 10)
+        for i in range(10):
+            self.assertEqual(self.history[i].id, "%.010d" % (i + 1))
+            self.assertEqual(self.history[-i - 1].id, "%.010d" % (10 - i))
+
+        self.assertEqual(self.history[-1].deleted_id, "0000000002")
+
+        for item in (10, -11):
+            with self.assertRaises(IndexError):
+                self.history[item]
+
+    def test_slice(self):
+        self.assertEqual(self._ids(self.history[2:5]),
+                         self._expected_ids(3, 4, 5))
+        self.assertEqual(self._ids(self.history[-2:]),
+                         self._expected_ids(9, 10))
+
+    def test_add(self):
+        """
+        test reading the history after transactions are added to it
+        """
+        self.assertEqual(len(self.history), 10)
+
+        self.history.add("0000000011,del,0000000003")
+        self.assertEqual(len(self.history), 11)
+        self.assertEqual(self.history[10].deleted_id, "0000000003")
+        self.assertEqual(self.history[9].deleted_id, "0000000002")
+
+    def test_since(self):
+        self.assertEqual(self._ids(self.history.since("0000000007")),
+                         self._expected_ids(8, 9, 10))
+        self.assertEqual(self._ids(self.history.since("0000000000")),
+                         self._expected_ids(*range(1, 11)))
+        self.assertEqual(list(self.history.since("0000000010")), [])
+
+    def test_no_file(self):
+        history = symstore.History(
+            MockHistStore(path.join(self.temp_dir, "missing.txt")))
+
+        self.assertEqual(len(history), 0)
+        self.assertEqual(list(history), [])
+        self.assertEqual(list(reversed(history)), [])
+        self.assertEqual(list(history.since("0000000001")), [])
+        with self.assertRaises(IndexError):
+            history[-1]
+
+
+class TestFileHash(unittest.TestCase):
+    """
+    test detecting file format and computing file's hash
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_file(self, contents):
+        file_path = path.join(self.temp_dir, "some.file")
+        with open(file_path, "wb") as f:
+            f.write(contents)
+
+        return file_path
+
+    def _counted_hash(self, file_path):
+        with mock.patch("symstore.fileio.open_rb",
+                        side_effect=fileio.open_rb) as open_rb:
+            file_hash = _file_hash(file_path)
+
+        return file_hash, open_rb.call_count
+
+    def test_pdb_opened_once(self):
+        file_hash, opens = self._counted_hash(
+            path.join(util.SYMFILES_DIR, "dummyprog.pdb"))
+
+        self.assertEqual(file_hash, "F6301B4562FE4B4DB691192733ECE6B71")
+        self.assertEqual(opens, 1)
+
+    def test_pe_opened_once(self):
+        file_hash, opens = self._counted_hash(
+            path.join(util.SYMFILES_DIR, "dummyprog.exe"))
+
+        self.assertEqual(file_hash, "5617D4FE8000")
+        self.assertEqual(opens, 1)
+
+    def test_unknown_magic(self):
+        self.assertRaises(errs.UnknownFileType,
+                          _file_hash, self._write_file(b"ELF\0" * 100))
+
+    @mock.patch("symstore.symstore._file_formats", [])
+    def test_register_format(self):
+        def probe(fname, file, head):
+            self.assertFalse(file.closed)
+            return head.decode().upper()
+
+        symstore.register_file_format(b"dummy", probe)
+
+        self.assertEqual(_file_hash(self._write_file(b"dummy-more")),
+                         "DUMMY-MORE")
+
+
+class TestFindSortedLine(unittest.TestCase):
+    """
+    test _find_sorted_line() function
+    """
+    LINES = [b"%.10d,add,line %d" % (i, i) for i in range(1, 200, 3)]
+
+    def _find(self, lines, key, line_end=b"\n"):
+        return _find_sorted_line(line_end.join(lines) + line_end, key)
+
+    def test_found(self):
+        for line in self.LINES:
+            key = line.split(b",")[0]
+            self.assertEqual(self._find(self.LINES, key), line)
+            self.assertEqual(self._find(self.LINES, key, b"\r\n"), line)
+
+    def test_not_found(self):
+        for key in [b"0000000000", b"0000000002", b"0000000200"]:
+            self.assertIsNone(self._find(self.LINES, key))
+
+        self.assertIsNone(_find_sorted_line(b"", b"0000000001"))
+
+    def test_no_trailing_newline(self):
+        data = b"\n".join(self.LINES)
+        last = self.LINES[-1]
+
+        self.assertEqual(_find_sorted_line(data, last.split(b",")[0]), last)
+
+    def test_unsorted(self):
+        lines = list(reversed(self.LINES))
+        for line in [lines[0], lines[20], lines[-1]]:
+            key = line.split(b",")[0]
+            self.assertEqual(self._find(lines, key), line)
+
+
+class TestTransactionFromLine(unittest.TestCase):
+    """
+    test transactions created from server and history file lines
+    """
+    LINE = ('0000000042,add,file,01/02/2017,10:11:12,'
+            '"prod","1.0","some comment",')
+
+    def test_lazy(self):
+        transaction = symstore.Transaction.from_line(None, self.LINE + "\n")
+        self.assertEqual(transaction.id, "0000000042")
+        self.assertFalse(hasattr(transaction, "__dict__"))
+
+        with mock.patch("symstore.symstore._split_transaction_line",
+                        wraps=symstore.symstore._split_transaction_line) \
+                as split_mock:
+            # unmodified transaction is written as it was read
+            self.assertEqual(str(transaction), self.LINE)
+            split_mock.assert_not_called()
+
+            self.assertEqual(transaction.type, "add")
+            self.assertEqual(transaction.ref, "file")
+            self.assertEqual(transaction.product, "prod")
+            self.assertEqual(transaction.version, "1.0")
+            self.assertEqual(transaction.comment, "some comment")
+            self.assertIsNone(transaction.deleted_id)
+
+        # the line is decoded once
+        split_mock.assert_called_once()
+
+        self.assertEqual(transaction.timestamp,
+                         datetime(2017, 1, 2, 10, 11, 12))
+        self.assertEqual(transaction.publish_timings, [])
+        self.assertEqual(transaction.bytes_linked, 0)
+        self.assertEqual(transaction.bytes_copied, 0)
+
+    def test_line_dropped(self):
+        """
+        test that only the fields are kept, once the line is decoded
+        """
+        transaction = symstore.Transaction.from_line(None, self.LINE)
+
+        self.assertEqual(transaction.comment, "some comment")
+        self.assertIsNone(transaction._line)
+        self.assertEqual(str(transaction), self.LINE)
+
+    def test_modified(self):
+        transaction = symstore.Transaction.from_line(
+            None, self.LINE + '"extra field"')
+        transaction.comment = "other"
+
+        self.assertEqual(str(transaction),
+                         '0000000042,add,file,01/02/2017,10:11:12,'
+                         '"prod","1.0","other",')
+
+    def test_delete(self):
+        transaction = symstore.Transaction.from_line(
+            None, "0000000043,del,0000000042\r\n")
+
+        self.assertEqual(transaction.id, "0000000043")
+        self.assertEqual(transaction.type, "del")
+        self.assertEqual(transaction.deleted_id, "0000000042")
+        self.assertIsNone(transaction.product)
+
+
+class MockServerStore:
+    def __init__(self, server_file):
+        self._server_file = server_file
+
+
+class TestTransactionsFind(unittest.TestCase):
+    """
+    test Transactions.find() method
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.server_file = path.join(self.temp_dir, "server.txt")
+        self.transactions = symstore.Transactions(
+            MockServerStore(self.server_file))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_server_file(self, num):
+        with open(self.server_file, "w") as f:
+            for i in range(1, num + 1):
+                f.write("%.10d,add,file,01/02/2017,10:11:%.2d,"
+                        "\"prod\",\"%d\",\"comment\",\n" % (i, i % 60, i))
+
+    def test_find(self):
+        self._write_server_file(1000)
+
+        with mock.patch("symstore.symstore._split_transaction_line",
+                        wraps=symstore.symstore._split_transaction_line) \
+                as parse_mock:
+            transaction = self.transactions.find("0000000421")
+            self.assertEqual(transaction.id, "0000000421")
+            self.assertEqual(transaction.version, "421")
+
+        # only the found line should be parsed
+        parse_mock.assert_called_once()
+
+    def test_not_found(self):
+        self._write_server_file(10)
+        self.assertIsNone(self.transactions.find("0000000011"))
+
+    def test_no_server_file(self):
+        self.assertIsNone(self.transactions.find("0000000001"))
+
+    def test_empty_server_file(self):
+        self._write_server_file(0)
+        self.assertIsNone(self.transactions.find("0000000001"))